@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import sys
+
+import aiohttp
+
+# Local test client for async_api.py's alert stream. Logs in, subscribes to the
+# session's alerts and presses the button whenever it is alerted, printing each event.
+#
+# Usage: python3 alert_client.py [base_url]
+
+DEFAULT_BASE_URL = 'http://localhost:8080'
+
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+
+async def read_events(response):
+    """
+    Parses a Server-Sent Events response body, ignoring comments such as keep-alives
+
+    :param aiohttp.ClientResponse response:
+
+    :return async iterator of (string, dict): event name and JSON decoded data
+    """
+    event, data = None, []
+    async for line in response.content:
+        line = line.decode().rstrip('\r\n')
+        if not line:
+            if data:
+                yield event, json.loads('\n'.join(data))
+            event, data = None, []
+        elif line.startswith(':'):
+            continue
+        elif line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data.append(line[len('data:'):].strip())
+
+
+async def play(base_url):
+    async with aiohttp.ClientSession() as client:
+        async with client.post(base_url + '/login', json={}) as response:
+            session = await response.json()
+        print('logged in as {}'.format(session['id']))
+        params = {'session': session['id']}
+        if 'token' in session:
+            params['token'] = session['token']
+        try:
+            async with client.get(
+                    base_url + '/alerts/stream', params=params,
+                    timeout=aiohttp.ClientTimeout(total=None)
+            ) as response:
+                async for event, data in read_events(response):
+                    print('{} {}'.format(event, data))
+                    async with client.post(base_url + '/action', json={
+                        'session': session,
+                        'user_action': create_user_action('BUTTON_PRESS')
+                    }) as action_response:
+                        # Session managers issuing tokens send a new one with every action
+                        session = (await action_response.json()).get('session', session)
+        finally:
+            await client.post(base_url + '/signout', json=session)
+
+
+if __name__ == "__main__":
+    asyncio.run(play(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_BASE_URL))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import random
+import sys
+
+from game_random import random_index, sample_range
+
+class AlertIndex:
+    """
+    Index of a game's users partitioned by alert state, supporting O(1) membership
+    changes and O(k) random picks of k users.
+
+    User ids are kept in a single array split in two: positions [0, num_alerted) hold
+    alerted users and [num_alerted, len) hold unalerted users. Changing a user's alert
+    state swaps it across the boundary and removals swap the last id into the hole, so
+    every operation only touches a constant number of array slots.
+    """
+    def __init__(self):
+        self._ids = []
+        self._pos = {}
+        self._num_alerted = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._pos
+
+    @property
+    def num_alerted(self):
+        """
+        :return int: Number of alerted users
+        """
+        return self._num_alerted
+
+    def size_bytes(self):
+        """
+        :return int: bytes held by the index's array and position map, not counting the
+            user ids, which are shared with the game state
+        """
+        return sys.getsizeof(self._ids) + sys.getsizeof(self._pos)
+
+    def _swap(self, i, j):
+        ids = self._ids
+        id_i, id_j = ids[i], ids[j]
+        ids[i], ids[j] = id_j, id_i
+        self._pos[id_j] = i
+        self._pos[id_i] = j
+
+    def add(self, user_id):
+        """
+        Adds an unalerted user to the index
+
+        :param UUID user_id:
+
+        :return None:
+        """
+        self._pos[user_id] = len(self._ids)
+        self._ids.append(user_id)
+
+    def remove(self, user_id):
+        """
+        Removes a user from the index
+
+        :param UUID user_id:
+
+        :return None:
+
+        :raises KeyError: If user_id is not in the index
+        """
+        self.set_alerted(user_id, False)
+        pos = self._pos.pop(user_id)
+        last_id = self._ids.pop()
+        if pos < len(self._ids):
+            self._ids[pos] = last_id
+            self._pos[last_id] = pos
+
+    def clear(self):
+        """
+        Removes all users from the index
+
+        :return None:
+        """
+        self._ids = []
+        self._pos = {}
+        self._num_alerted = 0
+
+    def is_alerted(self, user_id):
+        """
+        :param UUID user_id:
+
+        :return bool: Whether the user is in the alerted partition
+
+        :raises KeyError: If user_id is not in the index
+        """
+        return self._pos[user_id] < self._num_alerted
+
+    def set_alerted(self, user_id, alerted):
+        """
+        Moves a user into the alerted or unalerted partition
+
+        :param UUID user_id:
+        :param bool alerted:
+
+        :return None:
+
+        :raises KeyError: If user_id is not in the index
+        """
+        pos = self._pos[user_id]
+        if alerted and pos >= self._num_alerted:
+            self._swap(pos, self._num_alerted)
+            self._num_alerted += 1
+        elif not alerted and pos < self._num_alerted:
+            self._num_alerted -= 1
+            self._swap(pos, self._num_alerted)
+
+    def alerted_ids(self):
+        """
+        :return list: Ids of all alerted users
+        """
+        return self._ids[:self._num_alerted]
+
+    def clear_alerts(self):
+        """
+        Moves every user into the unalerted partition. Only the partition boundary moves,
+        so this is O(1).
+
+        :return None:
+        """
+        self._num_alerted = 0
+
+    def sample_unalerted(self, count, exclude_id=None, rng=random):
+        """
+        Picks up to count distinct unalerted users uniformly at random
+
+        :param int count: number of users to pick
+        :param UUID exclude_id: user that must not be picked
+        :param random.Random rng: source of randomness
+
+        :return list: Picked user ids, fewer than count if not enough are unalerted
+        """
+        exclude_pos = self._pos.get(exclude_id, -1)
+        exclude_unalerted = exclude_pos >= self._num_alerted
+        num_to_sample = min(count + exclude_unalerted, len(self._ids) - self._num_alerted)
+        picked = [
+            self._ids[pos]
+            for pos in sample_range(rng, self._num_alerted, len(self._ids), num_to_sample)
+            if pos != exclude_pos
+        ]
+        return picked[:count]
+
+    def random_user(self, exclude_id=None, rng=random):
+        """
+        Picks a user, alerted or not, uniformly at random
+
+        :param UUID exclude_id: user that must not be picked
+        :param random.Random rng: source of randomness
+
+        :return UUID: Picked user id, None if there are no other users
+        """
+        exclude_pos = self._pos.get(exclude_id)
+        num_candidates = len(self._ids) - (exclude_pos is not None)
+        if num_candidates <= 0:
+            return None
+        pos = random_index(rng, num_candidates)
+        if exclude_pos is not None and pos >= exclude_pos:
+            pos += 1
+        return self._ids[pos]
@@ -1,27 +1,68 @@
 #!/usr/bin/env python3
 
-import threading
+import logging
+import time
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_api import status
 
-from game_state import UserDoesntExistError, UserAlreadyExistsError, InvalidUserActionError
+from game_state import (
+    GameFullError, UserDoesntExistError, UserAlreadyExistsError, InvalidUserActionError,
+    USER_ACTION_CODE_SET
+)
+import metrics
+from response_encoder import ResponseEncoder
+from server_config import (
+    GAME_STATE_BACKENDS, SESSION_MANAGER_BACKENDS, check_backends, create_game_state,
+    create_session_manager, event_log_config, game_config, response_config, session_config
+)
 from session import InvalidSessionError, InvalidCredentialsError
 
 app = Flask(__name__)
 
 # TODO session in cookies so GET can be used
 
-# TODO dependency injection
-session_config = {
-    'expiry_timeout_s': 100,
-    'expiry_sliding_window_s': 60
-}
-from stateful_ticket_session import StatefulTicketSessionManager as SessionManager
-session_manager = SessionManager(session_config)
-game_config = {'alert_chance_of_multiply':0.2}
-from stateful_game_state import StatefulGameState as GameState
-game_state = GameState(game_config)
+# Configs and backend registries live in server_config
+check_backends(session_config, game_config)
+session_manager = create_session_manager(session_config)
+game_state = create_game_state(game_config)
+response_encoder = ResponseEncoder(response_config)
+
+metrics_registry = metrics.Registry()
+request_latency = metrics_registry.histogram(
+    'useless_machine_request_seconds', 'Request latency by route and status', ('route', 'status')
+)
+action_phase_latency = metrics_registry.histogram(
+    'useless_machine_action_phase_seconds',
+    'Latency of each phase of /action: expiry_sweep, authenticate, validate and game',
+    ('phase',)
+)
+actions_total = metrics_registry.counter(
+    'useless_machine_actions_total', 'User actions received, by action code', ('code',)
+)
+expired_sessions_per_sweep = metrics_registry.histogram(
+    'useless_machine_expired_sessions_per_sweep', 'Sessions expired by each expiry sweep',
+    buckets=(0, 1, 2, 5, 10, 50, 100, 500, 1000, 5000)
+)
+metrics_registry.gauge(
+    'useless_machine_sessions', 'Sessions held, including expired ones not yet swept',
+    callback=metrics.not_implemented_as_none(session_manager.count_sessions)
+)
+metrics_registry.gauge(
+    'useless_machine_users', 'Users in the game',
+    callback=metrics.not_implemented_as_none(game_state.count_users)
+)
+metrics_registry.gauge(
+    'useless_machine_alerted_users', 'Users currently alerted',
+    callback=metrics.not_implemented_as_none(game_state.count_alerted_users)
+)
+
+from expiry_reaper import ExpiryReaper
+# session_manager and game_state lock internally, so the reaper needs no lock of its own
+expiry_reaper = ExpiryReaper(
+    session_manager, game_state, session_config['expiry_reaper_interval_s'],
+    on_reap=expired_sessions_per_sweep.observe
+)
 
 
 def create_json_error_response(msg, code):
@@ -37,14 +78,113 @@ def create_json_error_response(msg, code):
     return jsonify({'msg': msg}), code
 
 
+def json_response(body):
+    """
+    :param bytes body: encoded JSON
+
+    :return Response: 200 response with a JSON body
+    """
+    return Response(body, content_type='application/json')
+
+
 def parse_json(req):
     return req.get_json(force=True)
 
 
+# Exceptions taking a user action can raise, mapped to responses by map_action_error
+ACTION_ERRORS = (InvalidSessionError, InvalidUserActionError, KeyError, UserDoesntExistError)
+
+
+def map_action_error(error):
+    """
+    Maps an exception raised while taking a user action to an error message and status code
+
+    :param Exception error: one of ACTION_ERRORS
+
+    :return (string, int): error message and status code
+    """
+    if isinstance(error, InvalidSessionError):
+        return 'cant take user action', status.HTTP_401_UNAUTHORIZED
+    if isinstance(error, InvalidUserActionError):
+        return 'invalid user action ' + str(error), status.HTTP_400_BAD_REQUEST
+    if isinstance(error, KeyError):
+        return 'invalid request', status.HTTP_400_BAD_REQUEST
+    return 'unknown error', status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def start_expiry_reaper():
+    """
+    Starts background expiry sweeping, taking it off the request path
+    """
+    expiry_reaper.start()
+
+
+def stop_expiry_reaper():
+    """
+    Stops background expiry sweeping. Requests go back to sweeping inline
+    """
+    expiry_reaper.stop()
+
+
 def check_expired_sessions():
-    expired_sessions = session_manager.check_expired_sessions()
-    for id in expired_sessions.keys():
-        game_state.remove_user(id)
+    if not expiry_reaper.is_running:
+        expiry_reaper.reap()
+
+
+def reissued_session(session_details):
+    """
+    :param dict session_details: as returned by touch_session
+
+    :return dict: session_details if the session manager reissues sessions, so clients
+        get the details they must send from then on, else None
+    """
+    return session_details if session_manager.REISSUES_SESSIONS else None
+
+
+def count_action(user_action):
+    """
+    Counts a user action by its code, counting unknown or missing codes as 'invalid' to
+    bound the number of label values
+    """
+    try:
+        code = user_action['action']['code']
+        if code not in USER_ACTION_CODE_SET:
+            code = 'invalid'
+    except (KeyError, TypeError):
+        code = 'invalid'
+    actions_total.inc((code,))
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request_latency(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    request_latency.observe(
+        time.perf_counter() - g.request_start, (route, str(response.status_code))
+    )
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics_registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Live game statistics, see GameState.get_stats. Cheap enough to poll often: reads
+    aggregates the game state keeps up to date rather than visiting users.
+    """
+    try:
+        return json_response(response_encoder.encode(game_state.get_stats()))
+    except NotImplementedError:
+        return create_json_error_response(
+            'stats not available', status.HTTP_501_NOT_IMPLEMENTED
+        )
 
 @app.route('/login', methods=['POST'])
 def login():
@@ -56,7 +196,10 @@ def login():
         game_state.add_user(result['id'])
     except InvalidCredentialsError as exc:
         return create_json_error_response('failed to login', status.HTTP_401_UNAUTHORIZED)
-    return jsonify(result)
+    except GameFullError:
+        session_manager.destroy_session(result)
+        return create_json_error_response('game is full', status.HTTP_503_SERVICE_UNAVAILABLE)
+    return json_response(response_encoder.encode(result))
 
 @app.route('/session', methods=['POST'])
 def session():
@@ -67,7 +210,7 @@ def session():
         result = session_manager.extend_session(session_details)
     except InvalidSessionError as exc:
         return create_json_error_response('failed to extend session', status.HTTP_401_UNAUTHORIZED)
-    return jsonify(result)
+    return json_response(response_encoder.encode(result))
 
 @app.route('/signout', methods=['POST'])
 def signout():
@@ -75,34 +218,107 @@ def signout():
     try:
         session_details = parse_json(request)
         session_manager.destroy_session(session_details)
-        game_state.remove_user(session_details['id'])
+        # The expiry reaper may already have removed the user of a destroyed session
+        game_state.remove_users([session_details['id']])
     except InvalidSessionError as exc:
         return create_json_error_response('failed to destroy session', status.HTTP_401_UNAUTHORIZED)
-    except UserDoesntExistError:
-        return create_json_error_response('unknown error', status.HTTP_500_INTERNAL_SERVER_ERROR)
     return '', status.HTTP_200_OK
 
 @app.route('/action', methods=['POST'])
 def action():
-    check_expired_sessions()
+    with action_phase_latency.time(('expiry_sweep',)):
+        check_expired_sessions()
     result = None
     try:
         req = parse_json(request)
-        session_manager.authenticate_session(req['session'])
-        req['session'] = session_manager.extend_session(req['session'])
-        result = game_state.user_action(req['session']['id'], req['user_action'])
-    except InvalidSessionError:
-        return create_json_error_response('cant take user action', status.HTTP_401_UNAUTHORIZED)
-    except InvalidUserActionError as error:
-        return create_json_error_response(
-            'invalid user action ' + error.msg,
-            status.HTTP_400_BAD_REQUEST
-        )
-    except KeyError:
+        with action_phase_latency.time(('authenticate',)):
+            # Parse the session id once, for the session manager and the game state
+            session_context = session_manager.resolve_session(req['session'])
+            session_details = session_manager.touch_session(session_context)
+        count_action(req['user_action'])
+        # Validated here, to be timed apart from the game, so the game state needn't
+        with action_phase_latency.time(('validate',)):
+            game_state.validate_user_action(req['user_action'])
+        with action_phase_latency.time(('game',)):
+            result = game_state.user_action(
+                session_context.id, req['user_action'], validated=True
+            )
+    except ACTION_ERRORS as error:
+        return create_json_error_response(*map_action_error(error))
+    return json_response(response_encoder.encode_action_response(
+        result, reissued_session(session_details)
+    ))
+
+def create_action_result(result=None, error=None, session=None):
+    """
+    Creates one item of an /actions response
+
+    :param dict result: user action response, if the action succeeded
+    :param Exception error: one of ACTION_ERRORS, if the action failed
+    :param dict session: refreshed session details to add to a response, if any
+
+    :return dict: {'status': HTTP status code, 'body': response or error body}
+    """
+    if error is None:
+        body = response_encoder.strip_action_response(result)
+        if session is not None:
+            body = dict(body, session=session)
+        return {'status': status.HTTP_200_OK, 'body': body}
+    msg, code = map_action_error(error)
+    return {'status': code, 'body': {'msg': msg}}
+
+@app.route('/actions', methods=['POST'])
+def actions():
+    """
+    Takes a batch of user actions: a JSON array of {'session', 'user_action'} objects as
+    sent to /action. Each distinct session is authenticated and extended once, then the
+    actions are applied in order. Responds with {'results': [...]}, one create_action_result
+    per item, with errors mapped as for /action. As from /action, successful results carry
+    the session's new details if the session manager reissues sessions.
+    """
+    check_expired_sessions()
+    req = parse_json(request)
+    if not isinstance(req, list):
         return create_json_error_response('invalid request', status.HTTP_400_BAD_REQUEST)
-    except UserDoesntExistError:
-        return create_json_error_response('unknown error', status.HTTP_500_INTERNAL_SERVER_ERROR)
-    return jsonify(result)
+    results = [None] * len(req)
+    # Session id -> (extended session, None) or (None, InvalidSessionError)
+    sessions = {}
+    pending = []
+    for index, item in enumerate(req):
+        try:
+            session_id = item['session']['id']
+            if session_id not in sessions:
+                try:
+                    session_context = session_manager.resolve_session(item['session'])
+                    sessions[session_id] = (session_manager.touch_session(session_context), None)
+                except InvalidSessionError as error:
+                    sessions[session_id] = (None, error)
+            session_details, error = sessions[session_id]
+            if error is None:
+                count_action(item['user_action'])
+                pending.append((index, session_details, item['user_action']))
+            else:
+                results[index] = create_action_result(error=error)
+        except (KeyError, TypeError) as error:
+            results[index] = create_action_result(error=KeyError(error))
+    outcomes = game_state.user_actions(
+        [(session_details['id'], user_action) for index, session_details, user_action in pending]
+    )
+    for (index, session_details, user_action), outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            results[index] = create_action_result(error=outcome)
+        else:
+            results[index] = create_action_result(
+                result=outcome, session=reissued_session(session_details)
+            )
+    return json_response(response_encoder.encode({'results': results}))
+
+if session_config['expiry_reaper_interval_s']:
+    start_expiry_reaper()
+
+if event_log_config['level']:
+    from event_log import start_event_log
+    event_log_listener = start_event_log(logging.getLevelName(event_log_config['level']))
 
 if __name__ == "__main__":
     app.run()
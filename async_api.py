@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+
+from aiohttp import web
+
+from expiry_reaper import ExpiryReaper
+from response_encoder import json_default
+from game_state import GameFullError, UserDoesntExistError, InvalidUserActionError
+from session import InvalidSessionError, InvalidCredentialsError
+
+# asyncio alternative to the Flask app in api.py, serving the same routes from the same
+# session manager and game state classes. Replaces repeatedly sending CHECK_IF_ALERTED with
+# /alerts/wait, a long-poll which parks the request until the user is alerted, and
+# /alerts/stream, a Server-Sent Events stream of the user's alerts.
+
+DEFAULT_CONFIG = {
+    # Upper bound on, and default for, how long /alerts/wait parks a request
+    'long_poll_timeout_s': 30,
+    # Seconds between /alerts/stream keep-alives, each of which also extends the session
+    'stream_keepalive_s': 15,
+    # Alerts buffered per stream before further alerts are dropped
+    'stream_queue_size': 16
+}
+
+
+class AlertHub:
+    """
+    Routes alerts to the requests interested in them: futures of parked long-poll requests
+    and queues of open alert streams, both keyed by user UUID. notify may be called from
+    any thread; futures and queues are fed on the event loop.
+    """
+    def __init__(self, loop, queue_size):
+        self.loop = loop
+        self.queue_size = queue_size
+        self._waiters = {}
+        self._subscribers = {}
+
+    def wait(self, user_id):
+        """
+        :param UUID user_id:
+
+        :return asyncio.Future: resolved with True when the user is next alerted
+        """
+        future = self.loop.create_future()
+        self._waiters.setdefault(user_id, set()).add(future)
+        return future
+
+    def discard(self, user_id, future):
+        """
+        Forgets a future returned by wait, e.g. once its request has timed out
+
+        :param UUID user_id:
+        :param asyncio.Future future:
+
+        :return None:
+        """
+        futures = self._waiters.get(user_id)
+        if futures is not None:
+            futures.discard(future)
+            if not futures:
+                del self._waiters[user_id]
+
+    def subscribe(self, user_id):
+        """
+        :param UUID user_id:
+
+        :return asyncio.Queue: receives user_id each time the user is alerted
+        """
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        """
+        Forgets a queue returned by subscribe
+
+        :param UUID user_id:
+        :param asyncio.Queue queue:
+
+        :return None:
+        """
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def notify(self, user_id):
+        """
+        Alert listener: wakes every request parked for user_id and publishes the alert
+        to every stream subscribed to it
+
+        :param UUID user_id:
+
+        :return None:
+        """
+        self.loop.call_soon_threadsafe(self._publish, user_id)
+
+    def _publish(self, user_id):
+        for future in self._waiters.pop(user_id, ()):
+            if not future.done():
+                future.set_result(True)
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(user_id)
+            except asyncio.QueueFull:
+                # The client already has undelivered alerts queued
+                pass
+
+
+# Application key of the app's AlertHub. aiohttp before 3.9 only has string keys
+ALERT_HUB = web.AppKey('alert_hub', AlertHub) if hasattr(web, 'AppKey') else 'alert_hub'
+
+
+def json_response(data, status=200):
+    return web.json_response(
+        data, status=status, dumps=lambda data: json.dumps(data, default=json_default)
+    )
+
+
+def create_json_error_response(msg, code):
+    """
+    Returns aiohttp error response
+
+    :param string msg: error message
+
+    :param int code: HTTP Status Code
+
+    :return web.Response:
+    """
+    return json_response({'msg': msg}, code)
+
+
+def format_alert_event(user_id):
+    """
+    :param UUID user_id:
+
+    :return bytes: Server-Sent Event announcing that the user has been alerted
+    """
+    data = json.dumps({'user_id': user_id, 'alerted': True}, default=json_default)
+    return 'event: alerted\ndata: {}\n\n'.format(data).encode()
+
+
+async def parse_json(request):
+    """
+    :raises web.HTTPBadRequest: If the body is not valid JSON, as Flask does
+    """
+    try:
+        return await request.json(loads=json.loads)
+    except ValueError as error:
+        raise web.HTTPBadRequest() from error
+
+
+def create_app(session_manager, game_state, config):
+    """
+    Creates the aiohttp application
+
+    :param session.SessionManager session_manager:
+    :param game_state.GameState game_state:
+    :param dict config: DEFAULT_CONFIG items plus an optional 'expiry_reaper_interval_s'
+
+    :return web.Application:
+    """
+    config = dict(DEFAULT_CONFIG, **config)
+    app = web.Application()
+    expiry_reaper = ExpiryReaper(
+        session_manager, game_state, config.get('expiry_reaper_interval_s')
+    )
+
+    def check_expired_sessions():
+        if not expiry_reaper.is_running:
+            expiry_reaper.reap()
+
+    def authenticate(session_details):
+        return session_manager.touch_session(session_manager.resolve_session(session_details))
+
+    def with_session(body, session_details):
+        """
+        Adds the session's new details to a response body if the session manager
+        reissues sessions, as api.py does
+        """
+        if session_manager.REISSUES_SESSIONS:
+            return dict(body, session=session_details)
+        return body
+
+    async def login(request):
+        check_expired_sessions()
+        try:
+            credentials = await parse_json(request)
+            result = session_manager.new_session(credentials)
+            game_state.add_user(result['id'])
+        except (InvalidCredentialsError, KeyError):
+            return create_json_error_response('failed to login', 401)
+        except GameFullError:
+            session_manager.destroy_session(result)
+            return create_json_error_response('game is full', 503)
+        return json_response(result)
+
+    async def session(request):
+        check_expired_sessions()
+        try:
+            session_details = await parse_json(request)
+            result = session_manager.extend_session(session_details)
+        except (InvalidSessionError, KeyError):
+            return create_json_error_response('failed to extend session', 401)
+        return json_response(result)
+
+    async def signout(request):
+        check_expired_sessions()
+        try:
+            session_details = await parse_json(request)
+            session_manager.destroy_session(session_details)
+            game_state.remove_users([session_details['id']])
+        except (InvalidSessionError, KeyError):
+            return create_json_error_response('failed to destroy session', 401)
+        return web.Response(status=200)
+
+    async def action(request):
+        check_expired_sessions()
+        try:
+            req = await parse_json(request)
+            session_details = authenticate(req['session'])
+            result = game_state.user_action(session_details['id'], req['user_action'])
+        except InvalidSessionError:
+            return create_json_error_response('cant take user action', 401)
+        except InvalidUserActionError as error:
+            return create_json_error_response('invalid user action ' + str(error), 400)
+        except KeyError:
+            return create_json_error_response('invalid request', 400)
+        except UserDoesntExistError:
+            return create_json_error_response('unknown error', 500)
+        return json_response(with_session(result, session_details))
+
+    async def stats(request):
+        try:
+            return json_response(game_state.get_stats())
+        except NotImplementedError:
+            return create_json_error_response('stats not available', 501)
+
+    async def wait_for_alert(request):
+        """
+        Long-poll for an alert. Body: {'session': session, 'timeout_s': optional float}.
+        Responds as soon as the user is alerted, or with alerted False on timeout.
+        """
+        check_expired_sessions()
+        try:
+            req = await parse_json(request)
+            session_details = authenticate(req['session'])
+            user_id = session_details['id']
+            timeout_s = min(
+                float(req.get('timeout_s', config['long_poll_timeout_s'])),
+                config['long_poll_timeout_s']
+            )
+            # Park before checking so an alert between the check and the wait isn't missed
+            future = app[ALERT_HUB].wait(user_id)
+            alerted = bool(game_state.find_state(user_id)['alert_state'])
+        except InvalidSessionError:
+            return create_json_error_response('cant wait for alert', 401)
+        except (KeyError, TypeError, ValueError):
+            return create_json_error_response('invalid request', 400)
+        except UserDoesntExistError:
+            app[ALERT_HUB].discard(user_id, future)
+            return create_json_error_response('unknown error', 500)
+        if not alerted:
+            try:
+                alerted = await asyncio.wait_for(future, timeout_s)
+            except asyncio.TimeoutError:
+                alerted = False
+        app[ALERT_HUB].discard(user_id, future)
+        return json_response(with_session(
+            {'user_id': user_id, 'response': {'alerted': alerted}}, session_details
+        ))
+
+    async def stream_alerts(request):
+        """
+        Server-Sent Events stream of alerts:
+        GET /alerts/stream?session=<session id>&token=<session token>, the token only for
+        session managers that issue them. Sends an 'alerted' event each time the user is
+        alerted, straight away if they already are. Keep-alives extend the session, going
+        on with any session details reissued for it; the stream ends once it can't be.
+        """
+        check_expired_sessions()
+        hub = app[ALERT_HUB]
+        try:
+            session_details = {'id': request.query['session']}
+            if 'token' in request.query:
+                session_details['token'] = request.query['token']
+            session_details = authenticate(session_details)
+            user_id = session_details['id']
+            queue = hub.subscribe(user_id)
+            alerted = bool(game_state.find_state(user_id)['alert_state'])
+        except InvalidSessionError:
+            return create_json_error_response('cant stream alerts', 401)
+        except KeyError:
+            return create_json_error_response('invalid request', 400)
+        except UserDoesntExistError:
+            hub.unsubscribe(user_id, queue)
+            return create_json_error_response('unknown error', 500)
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache'
+        })
+        try:
+            await response.prepare(request)
+            if alerted:
+                await response.write(format_alert_event(user_id))
+            while True:
+                try:
+                    await asyncio.wait_for(queue.get(), config['stream_keepalive_s'])
+                except asyncio.TimeoutError:
+                    try:
+                        session_details = authenticate(session_details)
+                    except InvalidSessionError:
+                        break
+                    await response.write(b': keep-alive\n\n')
+                    continue
+                await response.write(format_alert_event(user_id))
+        except ConnectionResetError:
+            pass
+        finally:
+            hub.unsubscribe(user_id, queue)
+        return response
+
+    async def on_startup(app):
+        app[ALERT_HUB] = AlertHub(asyncio.get_running_loop(), config['stream_queue_size'])
+        game_state.add_alert_listener(app[ALERT_HUB].notify)
+        if config.get('expiry_reaper_interval_s'):
+            expiry_reaper.start()
+
+    async def on_cleanup(app):
+        game_state.remove_alert_listener(app[ALERT_HUB].notify)
+        expiry_reaper.stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post('/login', login)
+    app.router.add_post('/session', session)
+    app.router.add_post('/signout', signout)
+    app.router.add_post('/action', action)
+    app.router.add_get('/stats', stats)
+    app.router.add_post('/alerts/wait', wait_for_alert)
+    app.router.add_get('/alerts/stream', stream_alerts)
+    return app
+
+
+def main():
+    from server_config import (
+        check_backends, create_game_state, create_session_manager, game_config,
+        session_config
+    )
+    check_backends(session_config, game_config)
+    web.run_app(create_app(
+        create_session_manager(session_config),
+        create_game_state(game_config),
+        session_config
+    ))
+
+
+if __name__ == "__main__":
+    main()
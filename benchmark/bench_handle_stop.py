@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Compares STOP latency of the epoch-based StatefulGameState.handle_stop against
+the previous approach of resetting every user's alert_state.
+
+Usage: python3 benchmark/bench_handle_stop.py
+"""
+
+import os
+import sys
+import timeit
+import uuid
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from stateful_game_state import StatefulGameState
+
+USER_COUNTS = [10000, 100000]
+ALERTED_USERS = 100
+REPEATS = 50
+
+STOP_ACTION = {'api': {'name': 'stateful', 'version': 1}, 'action': {'code': 'STOP'}}
+
+
+def create_game(num_users):
+    gs = StatefulGameState({})
+    ids = [uuid.uuid4() for i in range(num_users)]
+    for id in ids:
+        gs.add_user(id)
+    return gs, ids
+
+
+def alert_users(gs, ids):
+    for id in ids[:ALERTED_USERS]:
+        gs._set_alert_state(id, gs.state[id], True)
+
+
+def full_scan_stop(gs):
+    # STOP as implemented before alert epochs: visit every user record
+    for id, state in gs.state.items():
+        state['alert_state'] = False
+
+
+def time_stop(gs, ids, stop):
+    total = 0
+    for i in range(REPEATS):
+        alert_users(gs, ids)
+        total += timeit.timeit(stop, number=1)
+    return total / REPEATS
+
+
+def main():
+    print('{:>8} {:>16} {:>16}'.format('users', 'full scan (us)', 'epoch (us)'))
+    for num_users in USER_COUNTS:
+        gs, ids = create_game(num_users)
+        scan_s = time_stop(gs, ids, lambda: full_scan_stop(gs))
+        epoch_s = time_stop(gs, ids, lambda: gs.handle_stop(ids[0], STOP_ACTION))
+        print('{:>8} {:>16.1f} {:>16.1f}'.format(num_users, scan_s * 1e6, epoch_s * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Measures how long JournaledGameState and JournaledSessionManager take to recover on
+startup, from a snapshot alone and from a journal alone.
+
+Usage: python3 benchmark/bench_recovery.py [num_users]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from journaled_game_state import JournaledGameState
+from journaled_session import JournaledSessionManager
+
+DEFAULT_NUM_USERS = 1000000
+
+
+def populate(directory, num_users, snapshot):
+    def create_config(name):
+        return {
+            'expiry_timeout_s': 100,
+            'expiry_sliding_window_s': 60,
+            'journal_path': os.path.join(directory, name + '.journal'),
+            'snapshot_path': os.path.join(directory, name + '.snapshot'),
+            # Snapshots are only taken explicitly
+            'snapshot_every': float('inf')
+        }
+    sm = JournaledSessionManager(create_config('sessions'))
+    gs = JournaledGameState(create_config('game_state'))
+    for i in range(num_users):
+        gs.add_user(sm.new_session({})['id'])
+    if snapshot:
+        sm.snapshot()
+        gs.snapshot()
+    sm.close()
+    gs.close()
+    return sm.config, gs.config
+
+
+def time_recovery(cls, config):
+    start = time.perf_counter()
+    recovered = cls(config)
+    elapsed = time.perf_counter() - start
+    recovered.close()
+    return elapsed
+
+
+def main():
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUM_USERS
+    print('{:>10} {:>14} {:>14}'.format('from', 'sessions (s)', 'game (s)'))
+    for source, snapshot in (('snapshot', True), ('journal', False)):
+        directory = tempfile.mkdtemp()
+        try:
+            sm_config, gs_config = populate(directory, num_users, snapshot)
+            print('{:>10} {:>14.2f} {:>14.2f}'.format(
+                source,
+                time_recovery(JournaledSessionManager, sm_config),
+                time_recovery(JournaledGameState, gs_config)
+            ))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency suite. Drives StatefulGameState and StatefulTicketSessionManager
+directly, then api.py's Flask app through its test client and through a real local
+server, covering login storms, action mixes, expiry-heavy workloads and large user
+counts. Writes JSON with ops/sec and p50/p99 latency per workload, which
+benchmark/compare.py compares across runs.
+
+Usage: python3 benchmark/bench_suite.py [--users N] [--ops N] [--only SUBSTRING]
+                                        [--seed N] [--output FILE]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from clock import ManualClock
+import game_random
+from harness import environment, measure, summarise
+import session
+from stateful_game_state import StatefulGameState
+from stateful_ticket_session import StatefulTicketSessionManager
+
+# Relative frequency of each action code in action mixes: mostly polling, as clients do
+ACTION_MIX = (
+    ('CHECK_IF_ALERTED', 70),
+    ('BUTTON_PRESS', 25),
+    ('START', 4),
+    ('STOP', 1)
+)
+# Sessions created between expiry sweeps in the expiry-heavy workload
+EXPIRY_BATCH = 1000
+SESSION_CONFIG = {'expiry_timeout_s': 100, 'expiry_sliding_window_s': 60}
+
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+
+def choose_codes(rng, count):
+    codes, weights = zip(*ACTION_MIX)
+    return rng.choices(codes, weights, k=count)
+
+
+#### Direct workloads ####
+
+def direct_login_storm(args, rng):
+    sm = StatefulTicketSessionManager(SESSION_CONFIG)
+    return measure('direct.session.login_storm', sm.new_session, [({},)] * args.ops)
+
+
+def direct_authenticate_extend(args, rng):
+    sm = StatefulTicketSessionManager(SESSION_CONFIG)
+    sessions = [{'id': sm.new_session({})['id']} for i in range(args.users)]
+    def operation(session):
+        sm.authenticate_session(session)
+        sm.extend_session(session)
+    return measure(
+        'direct.session.authenticate_extend', operation,
+        [(rng.choice(sessions),) for i in range(args.ops)], sessions=args.users
+    )
+
+
+def direct_touch(args, rng):
+    sm = StatefulTicketSessionManager(SESSION_CONFIG)
+    sessions = [{'id': sm.new_session({})['id']} for i in range(args.users)]
+    return measure(
+        'direct.session.touch', sm.touch_session,
+        [(rng.choice(sessions),) for i in range(args.ops)], sessions=args.users
+    )
+
+
+def direct_expiry_sweep(args, rng):
+    sm = StatefulTicketSessionManager(SESSION_CONFIG)
+    # Live sessions the sweeps should not have to visit
+    for i in range(args.users):
+        sm.new_session({})
+    latencies_ns = []
+    start = time.perf_counter_ns()
+    for i in range(max(1, args.ops // EXPIRY_BATCH)):
+        for j in range(EXPIRY_BATCH):
+            sm.destroy_session(sm.new_session({}))
+        sweep_start = time.perf_counter_ns()
+        expired = sm.check_expired_sessions()
+        latencies_ns.append(time.perf_counter_ns() - sweep_start)
+        assert len(expired) == EXPIRY_BATCH
+    return summarise(
+        'direct.session.expiry_sweep', latencies_ns, time.perf_counter_ns() - start,
+        live_sessions=args.users, expired_per_sweep=EXPIRY_BATCH
+    )
+
+
+def direct_expiry_churn(args, rng):
+    # Simulated time: every simulated second logs in a batch of sessions, extends a
+    # batch of random live ones and sweeps, so sessions keep expiring for hours
+    clock = ManualClock()
+    sm = StatefulTicketSessionManager(dict(SESSION_CONFIG, clock=clock))
+    live = [{'id': sm.new_session({})['id']} for i in range(args.users)]
+    latencies_ns = []
+    start = time.perf_counter_ns()
+    for second in range(max(1, args.ops // EXPIRY_BATCH)):
+        clock.advance(1)
+        live.extend({'id': sm.new_session({})['id']} for i in range(EXPIRY_BATCH // 2))
+        for i in range(EXPIRY_BATCH // 2):
+            try:
+                sm.extend_session(rng.choice(live))
+            except session.InvalidSessionError:
+                pass
+        sweep_start = time.perf_counter_ns()
+        sm.check_expired_sessions()
+        latencies_ns.append(time.perf_counter_ns() - sweep_start)
+        # Drop expired sessions from the live list from time to time
+        if second % 60 == 0:
+            live = [{'id': s['id']} for s in sm.sessions.values()]
+    return summarise(
+        'direct.session.expiry_churn', latencies_ns, time.perf_counter_ns() - start,
+        live_sessions=sm.count_sessions(), simulated_s=len(latencies_ns)
+    )
+
+
+def direct_add_users(args, rng):
+    gs = StatefulGameState({'rng_seed': args.seed})
+    return measure(
+        'direct.game.add_users', gs.add_user,
+        [(uuid.UUID(int=rng.getrandbits(128)),) for i in range(args.users)]
+    )
+
+
+def direct_action_mix(args, rng):
+    gs = StatefulGameState({'rng_seed': args.seed})
+    ids = [uuid.UUID(int=rng.getrandbits(128)) for i in range(args.users)]
+    for id in ids:
+        gs.add_user(id)
+    actions = {code: create_user_action(code) for code, weight in ACTION_MIX}
+    return measure(
+        'direct.game.action_mix', gs.user_action,
+        [(rng.choice(ids), actions[code]) for code in choose_codes(rng, args.ops)],
+        users=args.users
+    )
+
+
+def direct_button_press(args, rng):
+    results = []
+    workloads = [('direct.game.button_press', 0)]
+    # Batched generation needs numpy
+    if game_random.numpy is not None:
+        workloads.append(('direct.game.button_press_batched', 4096))
+    for name, batch_size in workloads:
+        gs = StatefulGameState({'rng_seed': args.seed, 'rng_batch_size': batch_size})
+        ids = [uuid.UUID(int=rng.getrandbits(128)) for i in range(args.users)]
+        for id in ids:
+            gs.add_user(id)
+        action = create_user_action('BUTTON_PRESS')
+        results.append(measure(
+            name, gs.handle_button_press,
+            [(rng.choice(ids), action) for i in range(args.ops)], users=args.users
+        ))
+    return results
+
+
+#### Flask test client workloads ####
+
+def flask_login_storm(args, rng):
+    import api
+    client = api.app.test_client()
+    return measure('flask.login_storm', lambda: client.post('/login', json={}),
+                   [()] * args.ops)
+
+
+def flask_action_mix(args, rng):
+    import api
+    client = api.app.test_client()
+    sessions = [
+        {'id': client.post('/login', json={}).get_json()['id']}
+        for i in range(args.sessions)
+    ]
+    def operation(session, code):
+        response = client.post('/action', json={
+            'session': session, 'user_action': create_user_action(code)
+        })
+        assert response.status_code == 200
+    return measure(
+        'flask.action_mix', operation,
+        [(rng.choice(sessions), code) for code in choose_codes(rng, args.ops)],
+        sessions=args.sessions
+    )
+
+
+#### Real server workloads ####
+
+class LocalServer:
+    """
+    Serves api.py's app from a threaded werkzeug server on an ephemeral port
+    """
+    def __init__(self):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        import api
+        class QuietRequestHandler(WSGIRequestHandler):
+            def log_request(self, *args):
+                pass
+        self.server = make_server(
+            '127.0.0.1', 0, api.app, threaded=True, request_handler=QuietRequestHandler
+        )
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.thread.join()
+
+    def connect(self):
+        return http.client.HTTPConnection('127.0.0.1', self.port)
+
+
+def post_json(connection, path, body):
+    connection.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    data = response.read()
+    assert response.status == 200, data
+    return data
+
+
+def server_workloads(args, rng):
+    with LocalServer() as server:
+        connection = server.connect()
+        login = measure(
+            'server.login_storm', lambda: post_json(connection, '/login', {}),
+            [()] * (args.ops // 4)
+        )
+        sessions = [
+            {'id': json.loads(post_json(connection, '/login', {}))['id']}
+            for i in range(args.sessions)
+        ]
+        def operation(session, code):
+            post_json(connection, '/action', {
+                'session': session, 'user_action': create_user_action(code)
+            })
+        action_mix = measure(
+            'server.action_mix', operation,
+            [(rng.choice(sessions), code) for code in choose_codes(rng, args.ops // 4)],
+            sessions=args.sessions
+        )
+        connection.close()
+    return [login, action_mix]
+
+
+WORKLOADS = (
+    direct_login_storm,
+    direct_authenticate_extend,
+    direct_touch,
+    direct_expiry_sweep,
+    direct_expiry_churn,
+    direct_add_users,
+    direct_action_mix,
+    direct_button_press,
+    flask_login_storm,
+    flask_action_mix,
+    server_workloads
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=100000,
+                        help='users or sessions already present in large workloads')
+    parser.add_argument('--sessions', type=int, default=1000,
+                        help='sessions logged in for Flask and server action mixes')
+    parser.add_argument('--ops', type=int, default=20000, help='operations per workload')
+    parser.add_argument('--only', default='', help='only run workloads containing this')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write JSON results to, default stdout')
+    args = parser.parse_args()
+
+    results = []
+    for workload in WORKLOADS:
+        if args.only not in workload.__name__:
+            continue
+        # Games are seeded through their 'rng_seed' config, the workload choices here
+        random.seed(args.seed)
+        result = workload(args, random.Random(args.seed))
+        if not isinstance(result, list):
+            result = [result]
+        results.extend(result)
+        for item in result:
+            print('{:<40} {:>12} ops/s  p50 {:>10} us  p99 {:>10} us'.format(
+                item['name'], item['ops_per_s'], item['p50_us'], item['p99_us']
+            ), file=sys.stderr)
+    report = {
+        'environment': environment(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
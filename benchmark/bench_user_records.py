@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Measures StatefulGameState memory use per user for each user record type.
+
+Usage: python3 benchmark/bench_user_records.py [num_users]
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from stateful_game_state import StatefulGameState
+from user_record import USER_RECORD_FACTORIES
+
+DEFAULT_NUM_USERS = 1000000
+
+
+def measure(record_type, ids):
+    gc.collect()
+    tracemalloc.start()
+    gs = StatefulGameState({'user_records': record_type})
+    for id in ids:
+        gs.add_user(id)
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated
+
+
+def main():
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUM_USERS
+    # Ids are allocated up front so only game state is measured
+    ids = [uuid.uuid4() for i in range(num_users)]
+    print('{:>8} {:>12} {:>14}'.format('records', 'total (MB)', 'per user (B)'))
+    for record_type in USER_RECORD_FACTORIES:
+        allocated = measure(record_type, ids)
+        print('{:>8} {:>12.1f} {:>14.1f}'.format(
+            record_type, allocated / 2**20, allocated / num_users
+        ))
+
+
+if __name__ == '__main__':
+    main()
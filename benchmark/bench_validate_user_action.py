@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Compares the per-call cost of GameState.validate_user_action against validating
+with the jsonschema Draft4Validator it replaces on the hot path.
+
+Usage: python3 benchmark/bench_validate_user_action.py
+"""
+
+import os
+import sys
+import timeit
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from game_state import GameState, USER_ACTION_VALIDATOR
+
+NUMBER = 100000
+
+USER_ACTION = {
+    'api': {'name': 'stateful', 'version': 1},
+    'action': {'code': 'CHECK_IF_ALERTED', 'data': {}}
+}
+
+
+def main():
+    draft4_s = timeit.timeit(lambda: USER_ACTION_VALIDATOR.validate(USER_ACTION), number=NUMBER)
+    fast_s = timeit.timeit(lambda: GameState.validate_user_action(USER_ACTION), number=NUMBER)
+    print('{:>16} {:>12}'.format('validator', 'us/call'))
+    print('{:>16} {:>12.2f}'.format('Draft4Validator', draft4_s / NUMBER * 1e6))
+    print('{:>16} {:>12.2f}'.format('specialised', fast_s / NUMBER * 1e6))
+    print('speedup: {:.1f}x'.format(draft4_s / fast_s))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Compares two bench_suite.py JSON reports workload by workload, e.g. from two commits.
+Exits with status 1 if any workload's throughput dropped, or p99 latency rose, by more
+than the threshold.
+
+Usage: python3 benchmark/compare.py BASELINE.json CANDIDATE.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as report_file:
+        report = json.load(report_file)
+    return report['environment'].get('commit'), {
+        result['name']: result for result in report['results']
+    }
+
+
+def ratio(candidate, baseline):
+    if not baseline or candidate is None:
+        return None
+    return candidate / baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fractional change counted as a regression')
+    args = parser.parse_args()
+
+    baseline_commit, baseline = load_results(args.baseline)
+    candidate_commit, candidate = load_results(args.candidate)
+    print('baseline {}  candidate {}'.format(baseline_commit, candidate_commit))
+    print('{:<40} {:>12} {:>12}  {}'.format('workload', 'ops/s ratio', 'p99 ratio', ''))
+    regressed = False
+    for name in sorted(set(baseline) & set(candidate)):
+        ops_ratio = ratio(candidate[name]['ops_per_s'], baseline[name]['ops_per_s'])
+        p99_ratio = ratio(candidate[name]['p99_us'], baseline[name]['p99_us'])
+        flag = ''
+        if (ops_ratio is not None and ops_ratio < 1 - args.threshold) or (
+                p99_ratio is not None and p99_ratio > 1 + args.threshold
+        ):
+            flag = 'REGRESSION'
+            regressed = True
+        print('{:<40} {:>12} {:>12}  {}'.format(
+            name,
+            '-' if ops_ratio is None else '{:.2f}'.format(ops_ratio),
+            '-' if p99_ratio is None else '{:.2f}'.format(p99_ratio),
+            flag
+        ))
+    for name in sorted(set(baseline) ^ set(candidate)):
+        print('{:<40} only in {}'.format(name, 'baseline' if name in baseline else 'candidate'))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Shared measurement helpers for the benchmark suite: timing each operation and
+summarising throughput and latency percentiles as JSON-ready dicts.
+"""
+
+import platform
+import subprocess
+import sys
+import time
+
+
+def percentile(sorted_values, fraction):
+    """
+    :param list sorted_values: ascending
+    :param float fraction: e.g. 0.99
+
+    :return: nearest-rank percentile, or None if there are no values
+    """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarise(name, latencies_ns, elapsed_ns, **extra):
+    """
+    :param string name: workload name
+    :param list latencies_ns: per-operation latencies
+    :param int elapsed_ns: wall time of the whole run, including any work between
+        operations
+    :param extra: further fields to report, e.g. the user count
+
+    :return dict: ops, seconds, ops_per_s, p50_us, p99_us and max_us
+    """
+    latencies_ns = sorted(latencies_ns)
+    def to_us(value):
+        return None if value is None else round(value / 1000, 3)
+    result = {
+        'name': name,
+        'ops': len(latencies_ns),
+        'seconds': round(elapsed_ns / 1e9, 6),
+        'ops_per_s': round(len(latencies_ns) / (elapsed_ns / 1e9), 1) if elapsed_ns else None,
+        'p50_us': to_us(percentile(latencies_ns, 0.5)),
+        'p99_us': to_us(percentile(latencies_ns, 0.99)),
+        'max_us': to_us(latencies_ns[-1] if latencies_ns else None)
+    }
+    result.update(extra)
+    return result
+
+
+def measure(name, operation, args_list, **extra):
+    """
+    Calls operation once per item of args_list, timing each call
+
+    :param string name: workload name
+    :param callable operation:
+    :param list args_list: argument tuples, built before timing starts
+    :param extra: further fields to report
+
+    :return dict: as returned by summarise
+    """
+    perf_counter_ns = time.perf_counter_ns
+    latencies_ns = []
+    append = latencies_ns.append
+    start = perf_counter_ns()
+    for args in args_list:
+        op_start = perf_counter_ns()
+        operation(*args)
+        append(perf_counter_ns() - op_start)
+    return summarise(name, latencies_ns, perf_counter_ns() - start, **extra)
+
+
+def environment():
+    """
+    :return dict: what the results were measured on, for comparing runs
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
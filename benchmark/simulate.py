@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Capacity planning simulator. simulate runs a synthetic player population against
+StatefulGameState on a virtual clock and reports alert dynamics, state size over time
+and the cost of each operation; --record writes the actions it took as an action log.
+replay applies an action log, recorded here or taken from a game's event log, to each
+given game state backend in turn for comparison.
+
+Usage: python3 benchmark/simulate.py simulate [--users N] [--duration S] [--rate R]
+                                              [--distribution D] [--multiply P]
+                                              [--login-rate R] [--session-length S]
+                                              [--seed N] [--record LOG] [--output FILE]
+       python3 benchmark/simulate.py replay LOG [--backends NAME ...] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import uuid
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from harness import environment, summarise
+from server_config import GAME_STATE_BACKENDS, create_game_state
+from simulation import RATE_DISTRIBUTIONS, Simulation, read_action_log, replay
+
+GAME_CONFIG = {'alert_chance_of_multiply': 0.2, 'max_room_size': 1000, 'rng_seed': 0}
+
+
+def summarise_operations(prefix, operations, **extra):
+    """
+    :param string prefix: prepended to each operation name
+    :param dict operations: operation name -> latencies in ns
+
+    :return list: a harness.summarise dict per operation, timed over its own latencies
+    """
+    return [
+        summarise(prefix + name, latencies_ns, sum(latencies_ns), **extra)
+        for name, latencies_ns in sorted(operations.items())
+    ]
+
+
+def write_report(report, path):
+    if path:
+        with open(path, 'w') as output:
+            json.dump(report, output, indent=2, default=str)
+    else:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+
+
+def print_results(results):
+    for item in results:
+        print('{:<40} {:>12} ops/s  p50 {:>10} us  p99 {:>10} us'.format(
+            item['name'], item['ops_per_s'], item['p50_us'], item['p99_us']
+        ), file=sys.stderr)
+
+
+#### Simulate ####
+
+def simulate(args):
+    config = {
+        'users': args.users,
+        'duration_s': args.duration,
+        'mean_action_rate_per_s': args.rate,
+        'rate_distribution': args.distribution,
+        'login_rate_per_s': args.login_rate,
+        'mean_session_s': args.session_length,
+        'seed': args.seed,
+        'game_config': {'alert_chance_of_multiply': args.multiply}
+    }
+    record_file = open(args.record, 'w') if args.record else None
+    def record(event):
+        record_file.write(json.dumps(event) + '\n')
+    try:
+        result = Simulation(config, record=record if record_file else None).run()
+    finally:
+        if record_file is not None:
+            record_file.close()
+    results = summarise_operations('simulate:', result.pop('operations'))
+    print_results(results)
+    print('{virtual_s} virtual s in {wall_s:.2f} s, totals {totals}'.format(**result),
+          file=sys.stderr)
+    write_report({
+        'environment': environment(),
+        'config': config,
+        'simulation': result,
+        'results': results
+    }, args.output)
+
+
+#### Replay ####
+
+def create_backend(name, directory):
+    """
+    Creates a game state backend for replay, keeping any files it writes in directory
+
+    :return (game_state.GameState, callable): backend and a function cleaning it up
+    """
+    config = dict(GAME_CONFIG, backend=name)
+    if name == 'journaled':
+        config['journal_path'] = os.path.join(directory, 'game_state.journal')
+        config['snapshot_path'] = os.path.join(directory, 'game_state.snapshot')
+    elif name == 'shared_memory':
+        config['shm_name'] = 'useless_machine_replay_' + uuid.uuid4().hex[:8]
+        config['shm_lock_path'] = os.path.join(directory, 'shm.lock')
+    game_state = create_game_state(config)
+    def clean_up():
+        if name == 'shared_memory':
+            game_state.close()
+            game_state.unlink()
+        elif hasattr(game_state, 'close'):
+            game_state.close()
+        else:
+            game_state.clean_up()
+    return game_state, clean_up
+
+
+def replay_log(args):
+    events = list(read_action_log(args.log))
+    results = []
+    for name in args.backends:
+        with tempfile.TemporaryDirectory() as directory:
+            game_state, clean_up = create_backend(name, directory)
+            try:
+                result = replay(events, game_state)
+            finally:
+                clean_up()
+        latencies_ns = [
+            latency for operation in result['operations'].values() for latency in operation
+        ]
+        results.append(summarise(
+            'replay:{}'.format(name), latencies_ns, result['elapsed_ns'],
+            errors=result['errors']
+        ))
+        results.extend(summarise_operations(
+            'replay:{}:'.format(name), result['operations']
+        ))
+    print_results(results)
+    write_report({
+        'environment': environment(),
+        'config': {'log': args.log, 'events': len(events), 'backends': args.backends},
+        'results': results
+    }, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    simulate_parser = commands.add_parser('simulate', help='simulate a player population')
+    simulate_parser.add_argument('--users', type=int, default=1000,
+                                 help='players logged in at the start')
+    simulate_parser.add_argument('--duration', type=float, default=600,
+                                 help='virtual seconds to simulate')
+    simulate_parser.add_argument('--rate', type=float, default=0.5,
+                                 help='mean actions per second per player')
+    simulate_parser.add_argument('--distribution', choices=RATE_DISTRIBUTIONS,
+                                 default='exponential',
+                                 help='distribution of action rates across players')
+    simulate_parser.add_argument('--multiply', type=float, default=0.2,
+                                 help='alert_chance_of_multiply')
+    simulate_parser.add_argument('--login-rate', type=float, default=0,
+                                 help='players arriving per second after the start')
+    simulate_parser.add_argument('--session-length', type=float, default=None,
+                                 help='mean seconds players stay, default forever')
+    simulate_parser.add_argument('--seed', type=int, default=0)
+    simulate_parser.add_argument('--record', help='file to write the action log to')
+    simulate_parser.add_argument('--output',
+                                 help='file to write JSON results to, default stdout')
+    simulate_parser.set_defaults(run=simulate)
+
+    replay_parser = commands.add_parser('replay', help='replay an action log')
+    replay_parser.add_argument('log', help='action log or event log, as JSON lines')
+    replay_parser.add_argument('--backends', nargs='+', choices=sorted(GAME_STATE_BACKENDS),
+                               default=['stateful', 'rooms'],
+                               help='game state backends to replay against')
+    replay_parser.add_argument('--output',
+                               help='file to write JSON results to, default stdout')
+    replay_parser.set_defaults(run=replay_log)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import threading
+import time
+
+from helpers import raise_not_implemented_error
+
+SECOND_NS = 1000000000
+
+
+def seconds_to_ns(seconds):
+    """
+    :param float seconds:
+
+    :return int: nanoseconds
+    """
+    return int(seconds * SECOND_NS)
+
+
+class Clock:
+    """
+    Source of integer nanosecond timestamps for expiry arithmetic. Timestamps only
+    increase and are unaffected by wall clock changes; they are converted to wall clock
+    values only where they leave the process, through a fixed offset.
+    """
+    def __init__(self, wall_offset_ns):
+        """
+        :param int wall_offset_ns: wall clock time, in nanoseconds since the epoch, at
+            timestamp 0
+        """
+        self.wall_offset_ns = wall_offset_ns
+
+    def now_ns(self):
+        """
+        :return int: current timestamp in nanoseconds
+        """
+        raise_not_implemented_error(self.now_ns.__name__)
+
+    def to_timestamp(self, ns):
+        """
+        :param int ns: timestamp from this clock
+
+        :return float: wall clock time in seconds since the epoch
+        """
+        return (ns + self.wall_offset_ns) / SECOND_NS
+
+    def from_timestamp(self, timestamp):
+        """
+        :param float timestamp: wall clock time in seconds since the epoch
+
+        :return int: timestamp on this clock
+        """
+        return seconds_to_ns(timestamp) - self.wall_offset_ns
+
+    def to_datetime(self, ns):
+        """
+        :param int ns: timestamp from this clock
+
+        :return datetime: local wall clock time
+        """
+        return datetime.fromtimestamp(self.to_timestamp(ns))
+
+
+class MonotonicClock(Clock):
+    """
+    Clock reading time.monotonic_ns, its wall clock offset fixed when created
+    """
+    def __init__(self):
+        super().__init__(time.time_ns() - time.monotonic_ns())
+
+    now_ns = staticmethod(time.monotonic_ns)
+
+
+class ManualClock(Clock):
+    """
+    Clock that only moves when told to, so tests and benchmarks can simulate any amount
+    of time passing instantly
+    """
+    def __init__(self, start_ns=0, wall_offset_ns=None):
+        """
+        :param int start_ns: initial timestamp
+        :param int wall_offset_ns: see Clock, by default the current wall clock time
+        """
+        super().__init__(time.time_ns() if wall_offset_ns is None else wall_offset_ns)
+        self._now_ns = start_ns
+        self._lock = threading.Lock()
+
+    def now_ns(self):
+        """
+        Overrides Clock.now_ns
+        """
+        return self._now_ns
+
+    def advance_to(self, ns):
+        """
+        :param int ns: timestamp to move to, no earlier than the current one
+
+        :return None:
+
+        :raises ValueError: If ns is earlier than the current timestamp
+        """
+        with self._lock:
+            if ns < self._now_ns:
+                raise ValueError('ManualClock cannot move backwards')
+            self._now_ns = ns
+
+    def advance(self, seconds):
+        """
+        :param float seconds: time to move forward by
+
+        :return int: new timestamp
+        """
+        with self._lock:
+            self._now_ns += seconds_to_ns(seconds)
+            return self._now_ns
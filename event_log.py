@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+# Structured game event logging. Events are logging records whose message is the event
+# name and whose fields ride along unformatted on the record, so an event that is
+# filtered out by level or sampling costs one cached level check and is never
+# formatted. Formatting and writing happen on a QueueListener thread, off the request
+# path.
+
+# Parent logger of every event logger
+EVENT_LOGGER_NAME = 'useless_machine.events'
+
+
+class EventLog:
+    """
+    Emits structured events to the logger EVENT_LOGGER_NAME.<name>. Events are logged at
+    DEBUG, which loggers are not enabled for unless start_event_log has been called with
+    that level, so by default every event is dropped by the level check.
+    """
+    def __init__(self, name, sample_rate=1.0, level=logging.DEBUG):
+        """
+        :param string name: event source, e.g. a module name
+        :param float sample_rate: fraction of enabled events to keep
+        :param int level: logging level events are emitted at
+        """
+        self.logger = logging.getLogger('{}.{}'.format(EVENT_LOGGER_NAME, name))
+        self.sample_rate = sample_rate
+        self.level = level
+
+    @property
+    def enabled(self):
+        """
+        :return bool: Whether events will be emitted at all, for callers that need to do
+            work to build event fields
+        """
+        return self.logger.isEnabledFor(self.level)
+
+    def event(self, name, **fields):
+        """
+        Emits an event, subject to level and sampling. Field values are formatted by the
+        handler, not here.
+
+        :param string name: event name
+        :param fields: JSON-encodable (or str-able) event fields
+
+        :return None:
+        """
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.logger.log(self.level, name, extra={'event_fields': fields})
+
+
+class EventFormatter(logging.Formatter):
+    """
+    Formats event records as one JSON object per line: time, source, event and fields
+    """
+    def format(self, record):
+        event = {
+            'time': record.created,
+            'source': record.name,
+            'event': record.getMessage()
+        }
+        event.update(getattr(record, 'event_fields', {}))
+        return json.dumps(event, default=str)
+
+
+def start_event_log(level=logging.DEBUG, handler=None):
+    """
+    Enables events at level and above, queueing them to a background QueueListener which
+    formats and writes them with handler.
+
+    :param int level: e.g. logging.DEBUG for every event
+    :param logging.Handler handler: defaults to a stderr StreamHandler
+
+    :return logging.handlers.QueueListener: pass to stop_event_log
+    """
+    if handler is None:
+        handler = logging.StreamHandler()
+    handler.setFormatter(EventFormatter())
+    event_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(event_queue, handler)
+    logger = logging.getLogger(EVENT_LOGGER_NAME)
+    logger.addHandler(logging.handlers.QueueHandler(event_queue))
+    logger.setLevel(level)
+    # Events are structured, so don't repeat them through the root logger's handlers
+    logger.propagate = False
+    listener.start()
+    return listener
+
+
+def stop_event_log(listener):
+    """
+    Disables events and flushes those still queued
+
+    :param logging.handlers.QueueListener listener: as returned by start_event_log
+
+    :return None:
+    """
+    logger = logging.getLogger(EVENT_LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    logger.setLevel(logging.NOTSET)
+    logger.propagate = True
+    listener.stop()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import threading
+
+class ExpiryReaper:
+    """
+    Drains expired sessions from a session manager and removes their users from a game
+    state. Can either be driven manually through reap() or run on a background thread
+    every interval_s seconds, keeping expiry work off the request path.
+    """
+    def __init__(self, session_manager, game_state, interval_s, on_reap=None):
+        """
+        :param session.SessionManager session_manager:
+        :param game_state.GameState game_state:
+        :param float interval_s: seconds between background sweeps
+        :param on_reap: optional function called with the number of sessions each sweep
+            expired, e.g. to record metrics
+        """
+        self.session_manager = session_manager
+        self.game_state = game_state
+        self.interval_s = interval_s
+        self.on_reap = on_reap
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_running(self):
+        """
+        :return bool: Whether the background sweeping thread is running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def reap(self):
+        """
+        Runs a single sweep: removes expired sessions and their users.
+
+        :return dict: expired sessions, as returned by check_expired_sessions
+        """
+        expired_sessions = self.session_manager.check_expired_sessions()
+        if expired_sessions:
+            self.game_state.remove_users(expired_sessions.keys())
+        if self.on_reap is not None:
+            self.on_reap(len(expired_sessions))
+        return expired_sessions
+
+    def start(self):
+        """
+        Starts sweeping on a background daemon thread. Does nothing if already running.
+
+        :return None:
+        """
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='expiry-reaper', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the background thread and waits for it to finish its current sweep.
+
+        :param float timeout: seconds to wait for the thread to exit
+
+        :return None:
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_s):
+            self.reap()
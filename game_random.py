@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import itertools
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Game config items choosing each game's random number generator
+DEFAULT_RNG_CONFIG = {
+    # Seed for the game's own generator. None seeds it from the operating system
+    'rng_seed': None,
+    # Floats pre-generated per block by a BatchedRandom, which needs numpy. 0 draws them
+    # one at a time
+    'rng_batch_size': 0
+}
+
+
+def create_game_rng(config):
+    """
+    Creates the random number generator for one game, rather than sharing the random
+    module's global one. Batched generation needs numpy: pure Python blocks cost more
+    per float than random.Random's own C generator.
+
+    :param dict config: game config, see DEFAULT_RNG_CONFIG
+
+    :return random.Random:
+
+    :raises ValueError: If 'rng_batch_size' is set but numpy is not installed
+    """
+    config = dict(DEFAULT_RNG_CONFIG, **config)
+    if config['rng_batch_size']:
+        if numpy is None:
+            raise ValueError('rng_batch_size needs numpy, which is not installed')
+        return BatchedRandom(config['rng_seed'], config['rng_batch_size'])
+    return random.Random(config['rng_seed'])
+
+
+def derive_seed(rng):
+    """
+    :param random.Random rng:
+
+    :return int: seed for another generator, e.g. one room's, drawn from rng
+    """
+    return rng.getrandbits(64)
+
+
+def random_index(rng, n):
+    """
+    Picks an integer in [0, n) uniformly at random from a single float draw. Cheaper than
+    rng.randrange, at a bias of at most n / 2**53.
+
+    :param random.Random rng:
+    :param int n: positive
+
+    :return int:
+    """
+    return int(rng.random() * n)
+
+
+def sample_range(rng, start, stop, count):
+    """
+    Picks count distinct integers in [start, stop) uniformly at random, in random order.
+    Does the few draws needed when handing out alerts directly rather than through
+    rng.sample: redraws collisions when count is small next to the range, else shuffles
+    the first count places of the range, which is then short.
+
+    :param random.Random rng:
+    :param int start:
+    :param int stop:
+    :param int count: at most stop - start
+
+    :return list:
+    """
+    n = stop - start
+    draw = rng.random
+    if count * 4 > n:
+        pool = list(range(start, stop))
+        for i in range(count):
+            j = i + int(draw() * (n - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:count]
+    picked = []
+    while len(picked) < count:
+        value = start + int(draw() * n)
+        if value not in picked:
+            picked.append(value)
+    return picked
+
+
+class BatchedRandom(random.Random):
+    """
+    random.Random whose floats are generated in blocks of batch_size. Each instance's
+    random is the __next__ of an itertools.chain over the blocks, so single draws run
+    no Python code and a block is only refilled once per batch_size draws. Blocks come
+    from numpy's vectorised generator if numpy is installed, so a seed gives different
+    sequences with and without numpy.
+
+    Every distribution method built on random() draws from the blocks; getrandbits does
+    not. getstate and setstate ignore the blocks.
+    """
+    def __init__(self, seed=None, batch_size=4096):
+        """
+        :param seed: as for random.Random
+        :param int batch_size: floats generated per block
+        """
+        self.batch_size = batch_size
+        super().__init__(seed)
+
+    def seed(self, a=None, version=2):
+        """
+        Overrides random.Random.seed, discarding any pre-generated floats
+        """
+        super().seed(a, version)
+        self._generator = None
+        if numpy is not None:
+            self._generator = numpy.random.default_rng(derive_seed(self))
+        # Shadows the random method: draws come straight from the chained blocks
+        self.random = itertools.chain.from_iterable(iter(self._next_block, None)).__next__
+
+    def _next_block(self):
+        if self._generator is not None:
+            return self._generator.random(self.batch_size).tolist()
+        draw = super().random
+        return [draw() for i in range(self.batch_size)]
+
+    def random(self):
+        """
+        Overrides random.Random.random. Only reached before seeding: instances draw
+        through the chained blocks set up by seed.
+
+        :return float: in [0, 1)
+        """
+        return super().random()
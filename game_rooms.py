@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+import threading
+
+from game_state import (
+    GameState, InvalidUserActionError, UserAlreadyExistsError, UserDoesntExistError
+)
+from game_random import create_game_rng, derive_seed
+from game_stats import GameStats
+from stateful_game_state import StatefulGameState
+
+class GameRoomManager(GameState):
+    """
+    Implementation of game_state.GameState that partitions users into independent game
+    rooms of at most 'max_room_size' users each. Users are assigned to a room with free
+    capacity when added and their actions are routed to that room, so alert propagation
+    and STOP only ever involve the players of one room.
+
+    Safe to share between threads. Each room has its own lock, held for every call into
+    the room, so actions in different rooms run concurrently. A manager-wide lock only
+    guards room assignment and is always taken before a room lock.
+
+    Every room is created with a game_stats.GameStats of its own as its 'stats' config
+    item, whose parent is the manager's GameStats, so each action updates the game-wide
+    totals once and get_stats reads them in O(1). With 'rng_seed' set, each room is given its own seed drawn from it, so rooms don't repeat
+    each other's draws.
+    """
+    DEFAULT_CONFIG = {
+        'max_room_size': 1000
+    }
+
+    def __init__(self, config, room_factory=StatefulGameState):
+        """
+        :param dict config: game config, also passed to each room
+        :param callable room_factory: (config) -> game_state.GameState, creates a room
+        """
+        super().__init__(dict(self.__class__.DEFAULT_CONFIG, **config))
+        self.room_factory = room_factory
+        self.rooms = {}
+        self.room_sizes = {}
+        self.room_locks = {}
+        self._next_room_id = 0
+        self._open_room_ids = {}
+        self._user_rooms = {}
+        self._lock = threading.Lock()
+        self.stats = GameStats()
+        self._seed_rng = create_game_rng({'rng_seed': self.config.get('rng_seed')})
+
+    _convert_uuid = staticmethod(StatefulGameState._convert_uuid)
+
+    def _open_room(self):
+        """
+        Returns a room with free capacity, creating one if every room is full.
+        Must be called with the manager lock held.
+
+        :return int: room id
+        """
+        for room_id in self._open_room_ids:
+            return room_id
+        room_id = self._next_room_id
+        self._next_room_id += 1
+        room_stats = GameStats(rate_window_s=self.stats.rate_window_s, parent=self.stats)
+        room_config = dict(self.config, stats=room_stats)
+        if self.config.get('rng_seed') is not None:
+            room_config['rng_seed'] = derive_seed(self._seed_rng)
+        self.rooms[room_id] = self.room_factory(room_config)
+        self.rooms[room_id].add_alert_listener(self.notify_alerted)
+        self.room_sizes[room_id] = 0
+        self.room_locks[room_id] = threading.RLock()
+        self._open_room_ids[room_id] = None
+        return room_id
+
+    def _find_room(self, user_id):
+        """
+        :param UUID user_id:
+
+        :return (int, GameState, RLock): room id, room and room lock
+
+        :raises UserDoesntExistError:
+        """
+        try:
+            return self._user_rooms[user_id]
+        except KeyError as error:
+            raise UserDoesntExistError() from error
+
+    def find_room(self, user_id):
+        """
+        Finds the room a user has been assigned to
+
+        :param string/UUID user_id:
+
+        :return (int, GameState): room id and room
+
+        :raises UserDoesntExistError:
+        """
+        room_id, room, lock = self._find_room(self.__class__._convert_uuid(user_id))
+        return room_id, room
+
+    def user_action(self, user_id, user_action, validated=False):
+        """
+        Handle user action in the user's room.
+
+        Overrides GameState.user_action
+        """
+        try:
+            room_id, room, lock = self._find_room(self.__class__._convert_uuid(user_id))
+        except UserDoesntExistError:
+            # Invalid actions take precedence, as they do within a room
+            if not validated:
+                self.__class__.validate_user_action(user_action)
+            raise
+        with lock:
+            return room.user_action(user_id, user_action, validated)
+
+    def user_actions(self, actions):
+        """
+        Handle a batch of user actions, in order. A room's lock is held across consecutive
+        actions in that room rather than retaken for each one.
+
+        Overrides GameState.user_actions
+        """
+        results = []
+        held_lock = None
+        try:
+            for user_id, user_action in actions:
+                try:
+                    try:
+                        room_id, room, lock = self._find_room(
+                            self.__class__._convert_uuid(user_id)
+                        )
+                    except UserDoesntExistError:
+                        self.__class__.validate_user_action(user_action)
+                        raise
+                    if lock is not held_lock:
+                        if held_lock is not None:
+                            held_lock.release()
+                            held_lock = None
+                        lock.acquire()
+                        held_lock = lock
+                    results.append(room.user_action(user_id, user_action))
+                except (InvalidUserActionError, UserDoesntExistError) as error:
+                    results.append(error)
+        finally:
+            if held_lock is not None:
+                held_lock.release()
+        return results
+
+    def add_user(self, user_id):
+        """
+        Add new user to a room with free capacity.
+        Raises UserAlreadyExistsError if user is already added to game
+
+        Overrides GameState.add_user
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        with self._lock:
+            if user_id in self._user_rooms:
+                raise UserAlreadyExistsError()
+            room_id = self._open_room()
+            room, lock = self.rooms[room_id], self.room_locks[room_id]
+            with lock:
+                room.add_user(user_id)
+            self._user_rooms[user_id] = (room_id, room, lock)
+            self.room_sizes[room_id] += 1
+            if self.room_sizes[room_id] >= self.config['max_room_size']:
+                del self._open_room_ids[room_id]
+
+    def remove_user(self, user_id):
+        """
+        Remove user from their room, closing the room if it is left empty.
+        Raises UserDoesntExistError if user has not been added to game
+
+        Overrides GameState.remove_user
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        with self._lock:
+            room_id, room, lock = self._find_room(user_id)
+            with lock:
+                room.remove_user(user_id)
+            self._remove_from_room(user_id, room_id)
+
+    def remove_users(self, user_ids):
+        """
+        Remove several users from game, skipping any that have not been added. Each
+        affected room is locked once for all of its users.
+
+        Overrides GameState.remove_users
+        """
+        room_users = {}
+        with self._lock:
+            for user_id in user_ids:
+                user_id = self.__class__._convert_uuid(user_id)
+                if user_id in self._user_rooms:
+                    room_users.setdefault(self._user_rooms[user_id][0], []).append(user_id)
+            for room_id, room_user_ids in room_users.items():
+                with self.room_locks[room_id]:
+                    self.rooms[room_id].remove_users(room_user_ids)
+                for user_id in room_user_ids:
+                    self._remove_from_room(user_id, room_id)
+
+    def _remove_from_room(self, user_id, room_id):
+        """
+        Updates room assignment after a user has left a room, closing the room if it is
+        left empty. Must be called with the manager lock held.
+        """
+        del self._user_rooms[user_id]
+        self.room_sizes[room_id] -= 1
+        if self.room_sizes[room_id] == 0:
+            del self.rooms[room_id]
+            del self.room_sizes[room_id]
+            del self.room_locks[room_id]
+            self._open_room_ids.pop(room_id, None)
+        else:
+            self._open_room_ids[room_id] = None
+
+    def clean_up(self):
+        """
+        Clears game state, closing every room.
+
+        Overrides GameState.clean_up
+        """
+        with self._lock:
+            self.rooms = {}
+            self.room_sizes = {}
+            self.room_locks = {}
+            self._open_room_ids = {}
+            self._user_rooms = {}
+            self.stats.clear_users()
+
+    def count_users(self):
+        """
+        Overrides GameState.count_users
+        """
+        return len(self._user_rooms)
+
+    def count_alerted_users(self):
+        """
+        Sums the alerted users of every room, locking each room in turn.
+
+        Overrides GameState.count_alerted_users
+        """
+        with self._lock:
+            rooms = [(self.rooms[room_id], self.room_locks[room_id]) for room_id in self.rooms]
+        total = 0
+        for room, lock in rooms:
+            with lock:
+                total += room.count_alerted_users()
+        return total
+
+    def get_stats(self):
+        """
+        Reads the game-wide totals every room's statistics add to.
+
+        Overrides GameState.get_stats
+        """
+        return self.stats.to_dict()
+
+    def find_state(self, user_id):
+        """
+        Searches the user's room for their state
+        :param string/UUID user_id:
+
+        :return state dict:
+
+        :raises UserDoesntExistError:
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        room_id, room, lock = self._find_room(user_id)
+        with lock:
+            return room.find_state(user_id)
@@ -32,6 +32,42 @@ USER_ACTION = {
     'required': ['api', 'action']
 }
 USER_ACTION_VALIDATOR = Draft4Validator(USER_ACTION)
+USER_ACTION_CODE_SET = frozenset(USER_ACTION_CODES)
+
+#### Functions ####
+
+def is_valid_user_action(user_action):
+    """
+    Hand-specialised equivalent of USER_ACTION_VALIDATOR.is_valid, accepting exactly the
+    same inputs for a fraction of the cost. Must be kept in step with USER_ACTION.
+
+    :param user_action:
+
+    :return bool: Whether user_action meets the USER_ACTION schema
+    """
+    if not isinstance(user_action, dict):
+        return False
+    try:
+        api = user_action['api']
+        action = user_action['action']
+    except KeyError:
+        return False
+    if not isinstance(api, dict) or not isinstance(action, dict):
+        return False
+    try:
+        name = api['name']
+        version = api['version']
+        code = action['code']
+    except KeyError:
+        return False
+    # Draft 4 integers exclude booleans and floats, even integral ones
+    if not isinstance(name, str) or not isinstance(version, int) or isinstance(version, bool):
+        return False
+    if not isinstance(code, str) or code not in USER_ACTION_CODE_SET:
+        return False
+    if 'data' in action and not isinstance(action['data'], dict):
+        return False
+    return True
 
 #### Classes ####
 
@@ -54,6 +90,13 @@ class UserDoesntExistError(Exception):
     """
     pass
 
+class GameFullError(Exception):
+    """
+    Raised on adding a user to a game state with room for no more users, e.g. a
+    shared_memory_game_state.SharedMemoryGameState with no free slots
+    """
+    pass
+
 class GameState:
     """
     Abstract implementation of game state and its control.
@@ -62,11 +105,14 @@ class GameState:
 
     def __init__(self, config):
         self.config = config
+        self.alert_listeners = []
 
     @staticmethod
     def validate_user_action(user_action):
         """
-        Validate user_action dictionary against USER_ACTION schema
+        Validate user_action dictionary against USER_ACTION schema. Valid actions are
+        checked by is_valid_user_action alone; the jsonschema validator only runs on
+        invalid ones, to explain why they failed.
 
         :param user_action:
 
@@ -74,10 +120,13 @@ class GameState:
 
         :raises InvalidUserActionError:
         """
+        if is_valid_user_action(user_action):
+            return
         try:
             USER_ACTION_VALIDATOR.validate(user_action)
         except ValidationError as error:
             raise InvalidUserActionError('user action does not meet the JSON schema') from error
+        raise InvalidUserActionError('user action does not meet the JSON schema')
 
     @staticmethod
     def create_user_button_press_response(user_id, user_action, success):
@@ -133,12 +182,14 @@ class GameState:
             }
         }
     
-    def user_action(self, user_id, user_action):
+    def user_action(self, user_id, user_action, validated=False):
         """
         Handle user action
 
         :param string/uuid.UUID user_id: user UUID
         :param dict user_action: This must follow the USER_ACTION schema
+        :param bool validated: whether the caller has already checked user_action with
+            validate_user_action, so it needn't be checked again
 
         :return dict: user action response
 
@@ -147,6 +198,24 @@ class GameState:
         """
         raise_not_implemented_error(self.user_action.__name__)
 
+    def user_actions(self, actions):
+        """
+        Handle a batch of user actions, in order. Concrete implementations may override
+        this to share work between actions.
+
+        :param list actions: (string/uuid.UUID user_id, dict user_action) pairs
+
+        :return list: for each action, its response or the InvalidUserActionError or
+            UserDoesntExistError it raised
+        """
+        results = []
+        for user_id, user_action in actions:
+            try:
+                results.append(self.user_action(user_id, user_action))
+            except (InvalidUserActionError, UserDoesntExistError) as error:
+                results.append(error)
+        return results
+
     def add_user(self, user_id):
         """
         Add new user to game
@@ -156,6 +225,7 @@ class GameState:
         :return None:
 
         :raises UserAlreadyExistsError: If user is already added to game
+        :raises GameFullError: If the game has room for no more users
         """
         raise_not_implemented_error(self.add_user.__name__)
 
@@ -171,6 +241,90 @@ class GameState:
         """
         raise_not_implemented_error(self.remove_user.__name__)
 
+    def remove_users(self, user_ids):
+        """
+        Remove several users from game, skipping any that have not been added. Used to drop
+        the users of a batch of expired sessions. Concrete implementations may override this
+        with a cheaper bulk removal.
+
+        :param iterable user_ids: string/uuid.UUID user UUIDs
+
+        :return None:
+        """
+        for user_id in user_ids:
+            try:
+                self.remove_user(user_id)
+            except UserDoesntExistError:
+                pass
+
+    def count_users(self):
+        """
+        :return int: number of users in the game
+
+        :raises NotImplementedError: If the backend can't count its users
+        """
+        raise_not_implemented_error(self.count_users.__name__)
+
+    def count_alerted_users(self):
+        """
+        :return int: number of users currently alerted
+
+        :raises NotImplementedError: If the backend can't count its alerted users
+        """
+        raise_not_implemented_error(self.count_alerted_users.__name__)
+
+    def get_stats(self):
+        """
+        Live game statistics for dashboards. Concrete implementations keeping
+        game_stats.GameStats should override this to also report button presses.
+
+        :return dict: as game_stats.GameStats.to_dict, with press statistics None if
+            the backend doesn't keep them
+
+        :raises NotImplementedError: If the backend can't count its users
+        """
+        return {
+            'users': self.count_users(),
+            'alerted_users': self.count_alerted_users(),
+            'presses': None,
+            'presses_per_s': None,
+            'last_press': None,
+            'seconds_since_last_press': None
+        }
+
+    def add_alert_listener(self, listener):
+        """
+        Registers a function to be called with a user's UUID whenever that user is alerted.
+        Listeners are called synchronously from inside game state updates, possibly on
+        another thread, so must be quick and must not call back into the game state.
+
+        :param callable listener: (uuid.UUID) -> None
+
+        :return None:
+        """
+        self.alert_listeners.append(listener)
+
+    def remove_alert_listener(self, listener):
+        """
+        Unregisters a function registered with add_alert_listener
+
+        :param callable listener:
+
+        :return None:
+        """
+        self.alert_listeners.remove(listener)
+
+    def notify_alerted(self, user_id):
+        """
+        Calls every alert listener for a newly alerted user
+
+        :param uuid.UUID user_id: user UUID
+
+        :return None:
+        """
+        for listener in self.alert_listeners:
+            listener(user_id)
+
     def clean_up(self):
         """
         Clears game state.
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import threading
+
+from clock import MonotonicClock, SECOND_NS
+
+class GameStats:
+    """
+    Game-wide aggregates kept up to date by the game state as it changes, so reading
+    them never scans users: user and alerted user counts, button presses in total and
+    per second, and the time of the last press.
+
+    Presses per second are counted in one bucket per second over the last
+    'rate_window_s' seconds. Safe to share between threads.
+
+    A GameStats with a parent passes every update on to it, in one call, so the parent
+    totals the stats of several games, e.g. the rooms of a game_rooms.GameRoomManager,
+    and reading the totals stays O(1).
+    """
+    def __init__(self, clock=None, rate_window_s=10, parent=None):
+        """
+        :param clock.Clock clock: defaults to the parent's clock, else a
+            clock.MonotonicClock
+        :param int rate_window_s: seconds presses per second are averaged over
+        :param GameStats parent: also updated by every update, if set
+        """
+        self.clock = clock or (parent.clock if parent is not None else MonotonicClock())
+        self.rate_window_s = rate_window_s
+        self.parent = parent
+        self.users = 0
+        self.alerted_users = 0
+        self.presses = 0
+        self.last_press_ns = None
+        # Ring of per-second press counts, with the second each bucket is counting
+        self._press_buckets = [0] * rate_window_s
+        self._bucket_seconds = [None] * rate_window_s
+        self._lock = threading.Lock()
+
+    def add_users(self, delta, alerted_delta=0):
+        """
+        :param int delta: change in the number of users
+        :param int alerted_delta: change in the number of alerted users
+
+        :return None:
+        """
+        with self._lock:
+            self.users += delta
+            self.alerted_users += alerted_delta
+        if self.parent is not None:
+            self.parent.add_users(delta, alerted_delta)
+
+    def add_alerted_users(self, delta):
+        """
+        :param int delta: change in the number of alerted users
+
+        :return None:
+        """
+        if delta:
+            with self._lock:
+                self.alerted_users += delta
+            if self.parent is not None:
+                self.parent.add_alerted_users(delta)
+
+    def clear_users(self):
+        """
+        Zeroes the user and alerted user counts, e.g. when the game is cleared. Press
+        counts are kept. Not passed on to the parent.
+
+        :return None:
+        """
+        with self._lock:
+            self.users = 0
+            self.alerted_users = 0
+
+    def record_press(self, alerted_delta=0):
+        """
+        Counts a button press, now, along with the alerts it changed
+
+        :param int alerted_delta: change in the number of alerted users
+
+        :return None:
+        """
+        self._record_press(self.clock.now_ns(), alerted_delta)
+
+    def _record_press(self, now, alerted_delta):
+        second = now // SECOND_NS
+        index = second % self.rate_window_s
+        with self._lock:
+            self.presses += 1
+            self.alerted_users += alerted_delta
+            self.last_press_ns = now
+            if self._bucket_seconds[index] != second:
+                self._bucket_seconds[index] = second
+                self._press_buckets[index] = 0
+            self._press_buckets[index] += 1
+        if self.parent is not None:
+            self.parent._record_press(now, alerted_delta)
+
+    def presses_per_s(self):
+        """
+        :return float: mean presses per second over the last 'rate_window_s' seconds,
+            including the current one
+        """
+        oldest_second = self.clock.now_ns() // SECOND_NS - self.rate_window_s
+        with self._lock:
+            presses = sum(
+                count for second, count in zip(self._bucket_seconds, self._press_buckets)
+                if second is not None and second > oldest_second
+            )
+        return presses / self.rate_window_s
+
+    def to_dict(self):
+        """
+        :return dict: users, alerted_users, presses, presses_per_s, last_press (datetime
+            or None) and seconds_since_last_press (float or None)
+        """
+        now = self.clock.now_ns()
+        last_press_ns = self.last_press_ns
+        return {
+            'users': self.users,
+            'alerted_users': self.alerted_users,
+            'presses': self.presses,
+            'presses_per_s': self.presses_per_s(),
+            'last_press': (
+                None if last_press_ns is None else self.clock.to_datetime(last_press_ns)
+            ),
+            'seconds_since_last_press': (
+                None if last_press_ns is None else (now - last_press_ns) / SECOND_NS
+            )
+        }
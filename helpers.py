@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 
+import importlib
+import operator
+import uuid
+
 def raise_not_implemented_error(func_name):
     """
     Raises
@@ -8,3 +12,46 @@ def raise_not_implemented_error(func_name):
         Raises NotImplementedError with a message string containing the function name
     """
     raise NotImplementedError('Please implement concrete version of {}'.format(func_name))
+
+def import_class(path):
+    """
+    Imports a class from its dotted path, e.g. 'game_rooms.GameRoomManager'. Lets optional
+    backends be selected by config without importing their dependencies up front.
+
+    Returns
+    -------
+    type
+        The class named by path
+    """
+    module_name, class_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+def _identity(value):
+    return value
+
+def _uuid_from_int(key):
+    return uuid.UUID(int=key)
+
+# Ways of keying dictionaries by UUID: (UUID -> key, key -> UUID) pairs. 'int' keys hash
+# in C, where hashing a UUID calls UUID.__hash__ in Python on every lookup
+ID_KEY_CODECS = {
+    'uuid': (_identity, _identity),
+    'int': (operator.attrgetter('int'), _uuid_from_int)
+}
+
+def get_id_key_codec(name):
+    """
+    Returns
+    -------
+    (callable, callable)
+        Functions converting a UUID to the named key type and back
+
+    Raises
+    ------
+    ValueError
+        If name is not a key of ID_KEY_CODECS
+    """
+    try:
+        return ID_KEY_CODECS[name]
+    except KeyError as error:
+        raise ValueError('unknown id key type {}'.format(name)) from error
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+import math
+import mmap
+import os
+import shutil
+import struct
+import threading
+
+# Every journal record is one opcode byte, a 16 byte UUID and a float value, e.g. a
+# timestamp. Fixed size records let a torn record at the end of a crashed journal be
+# detected and dropped.
+JOURNAL_RECORD = struct.Struct('<B16sd')
+
+SNAPSHOT_MAGIC = b'UMSS'
+
+
+def rotated_journal_path(path):
+    """
+    :param string path: journal file
+
+    :return string: file holding the journal's records from before its last rotation
+    """
+    return path + '.rotated'
+
+
+def timestamp_or_nan(value):
+    """
+    :param datetime value: or None
+
+    :return float: POSIX timestamp, NaN standing in for None
+    """
+    return math.nan if value is None else value.timestamp()
+
+
+class Journal:
+    """
+    Append-only binary log of fixed size JOURNAL_RECORDs. Appends only add to an in-memory
+    buffer; a background thread group-commits the buffer, writing and fsyncing it every
+    flush_interval_s, so callers never wait on the disk. Records appended within the
+    last flush interval can be lost in a crash.
+
+    rotate moves the records so far aside to rotated_journal_path(path), so a snapshot
+    covering them can be written while appends carry on into an empty journal.
+    """
+    def __init__(self, path, flush_interval_s):
+        """
+        :param string path: journal file, appended to if it already exists
+        :param float flush_interval_s: seconds between group commits
+        """
+        self.path = path
+        self.rotated_path = rotated_journal_path(path)
+        self.flush_interval_s = flush_interval_s
+        self.num_records = 0
+        self._file = open(path, 'ab')
+        self._buffer = bytearray()
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='journal-flusher', daemon=True)
+        self._thread.start()
+
+    def append(self, opcode, id, value=math.nan):
+        """
+        Buffers a record for the next group commit
+
+        :param int opcode:
+        :param UUID id:
+        :param float value:
+
+        :return None:
+        """
+        record = JOURNAL_RECORD.pack(opcode, id.bytes, value)
+        with self._buffer_lock:
+            self._buffer += record
+            self.num_records += 1
+
+    def flush(self):
+        """
+        Writes and fsyncs every buffered record
+
+        :return None:
+        """
+        with self._write_lock:
+            with self._buffer_lock:
+                buffer, self._buffer = self._buffer, bytearray()
+            if buffer:
+                self._file.write(buffer)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def truncate(self):
+        """
+        Discards every record, e.g. once they are all covered by a snapshot. Callers must
+        stop appends while truncating.
+
+        :return None:
+        """
+        with self._write_lock:
+            with self._buffer_lock:
+                self._buffer = bytearray()
+                self.num_records = 0
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def rotate(self):
+        """
+        Moves every record to rotated_path and starts an empty journal, e.g. when the
+        state a snapshot will cover is captured. If rotated_path is still there, because
+        the snapshot for an earlier rotation was never written, the records are appended
+        to it. Callers must stop appends while rotating.
+
+        :return None:
+        """
+        with self._write_lock:
+            with self._buffer_lock:
+                buffer, self._buffer = self._buffer, bytearray()
+                self.num_records = 0
+            self._file.write(buffer)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            if os.path.exists(self.rotated_path):
+                with open(self.path, 'rb') as journal_file:
+                    with open(self.rotated_path, 'ab') as rotated_file:
+                        shutil.copyfileobj(journal_file, rotated_file)
+                        rotated_file.flush()
+                        os.fsync(rotated_file.fileno())
+                self._file = open(self.path, 'wb')
+            else:
+                os.replace(self.path, self.rotated_path)
+                self._file = open(self.path, 'ab')
+
+    def discard_rotated(self):
+        """
+        Deletes the records moved aside by rotate, once a snapshot covers them
+
+        :return None:
+        """
+        try:
+            os.remove(self.rotated_path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """
+        Stops the flushing thread, then flushes and closes the journal
+
+        :return None:
+        """
+        self._stop_event.set()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval_s):
+            self.flush()
+
+
+def read_journal(path):
+    """
+    Reads a journal written by Journal, including any records it rotated aside, dropping
+    any torn record at the end of each file
+
+    :param string path:
+
+    :return iterator of (int, bytes, float): opcode, UUID bytes and value of each record
+    """
+    for file_path in (rotated_journal_path(path), path):
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, 'rb') as journal_file:
+            data = journal_file.read()
+        end = len(data) - len(data) % JOURNAL_RECORD.size
+        yield from JOURNAL_RECORD.iter_unpack(memoryview(data)[:end])
+
+
+class SnapshotWriter:
+    """
+    Takes snapshots of a journaled store without holding up its callers for the write.
+    While the store's mutations are paused, the records to snapshot are captured and the
+    journal is rotated; the snapshot is then written, inline or on a background thread,
+    and the rotated journal deleted. A crash at any point leaves the last snapshot and
+    journal records from before and after the rotation, which recovery replays in turn.
+    One snapshot is taken at a time.
+    """
+    def __init__(self, journal, pause, capture, write):
+        """
+        :param Journal journal:
+        :param callable pause: returns a context manager stopping the store's mutations
+        :param callable capture: returns the records to snapshot, called while paused
+        :param callable write: writes captured records to the snapshot
+        """
+        self.journal = journal
+        self.pause = pause
+        self.capture = capture
+        self.write = write
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def snapshot(self, background=False):
+        """
+        :param bool background: write on a background thread, and do nothing if a snapshot
+            is already being taken. Otherwise waits for any snapshot being taken, then
+            takes one
+
+        :return bool: whether a snapshot was started
+        """
+        if not self._lock.acquire(blocking=not background):
+            return False
+        try:
+            with self.pause():
+                records = self.capture()
+                self.journal.rotate()
+        except BaseException:
+            self._lock.release()
+            raise
+        if background:
+            self._thread = threading.Thread(
+                target=self._write, args=(records,), name='snapshot-writer', daemon=True
+            )
+            self._thread.start()
+        else:
+            self._write(records)
+        return True
+
+    def _write(self, records):
+        try:
+            self.write(records)
+            self.journal.discard_rotated()
+        finally:
+            self._lock.release()
+
+    def wait(self):
+        """
+        Waits for any background snapshot to be written
+
+        :return None:
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+
+def write_snapshot(path, header_struct, header, record_struct, records):
+    """
+    Atomically replaces path with a binary snapshot: SNAPSHOT_MAGIC, a header, a record
+    count and fixed size records.
+
+    :param string path:
+    :param struct.Struct header_struct:
+    :param tuple header: values packed with header_struct
+    :param struct.Struct record_struct:
+    :param list records: tuples packed with record_struct
+
+    :return None:
+    """
+    pack = record_struct.pack
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as snapshot_file:
+        snapshot_file.write(SNAPSHOT_MAGIC)
+        snapshot_file.write(header_struct.pack(*header))
+        snapshot_file.write(struct.pack('<Q', len(records)))
+        snapshot_file.write(b''.join([pack(*record) for record in records]))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path, header_struct, record_struct):
+    """
+    Reads a snapshot written by write_snapshot. The file is memory-mapped and records are
+    unpacked straight from the mapping.
+
+    :param string path:
+    :param struct.Struct header_struct:
+    :param struct.Struct record_struct:
+
+    :return iterator: the header tuple, then a tuple for each record. Empty if there is
+        no snapshot
+
+    :raises ValueError: If the file is not a snapshot
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as snapshot_file:
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            if mapping[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError('{} is not a snapshot'.format(path))
+            offset = len(SNAPSHOT_MAGIC)
+            yield header_struct.unpack_from(mapping, offset)
+            offset += header_struct.size
+            count, = struct.unpack_from('<Q', mapping, offset)
+            offset += 8
+            view = memoryview(mapping)[offset:offset + count * record_struct.size]
+            records = record_struct.iter_unpack(view)
+            try:
+                yield from records
+            finally:
+                # Exports of the mapping must end before it can close
+                del records
+                view.release()
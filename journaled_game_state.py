@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import math
+import struct
+import threading
+import uuid
+
+from journal import (
+    Journal, SnapshotWriter, read_journal, read_snapshot, timestamp_or_nan, write_snapshot
+)
+from stateful_game_state import StatefulGameState
+
+# Journal opcodes. Outcomes are journaled rather than actions, so replay never draws
+# random numbers: a button press is its PRESS plus the ALERT/UNALERT of each user it
+# changed.
+OP_ADD_USER = 1
+OP_REMOVE_USER = 2
+OP_PRESS = 3
+OP_ALERT = 4
+OP_UNALERT = 5
+OP_STOP = 6
+OP_CLEAN_UP = 7
+
+# Snapshot header: format version. Records: user UUID, last_pressed timestamp (NaN for
+# None) and alert_state (-1 for None)
+SNAPSHOT_HEADER = struct.Struct('<I')
+SNAPSHOT_RECORD = struct.Struct('<16sdb')
+SNAPSHOT_VERSION = 1
+
+class JournaledGameState(StatefulGameState):
+    """
+    StatefulGameState that survives restarts. Every mutation is appended to a
+    journal.Journal, which group-commits in the background, and every 'snapshot_every'
+    journal records the whole state is written to a compact binary snapshot and the
+    journal is emptied. Only copying the state holds up callers: the snapshot is written
+    by a journal.SnapshotWriter on a background thread. On construction the snapshot is
+    loaded and the journal replayed on top of it.
+
+    Replaying a journal over the snapshot it led to gives that snapshot again, so a crash
+    between writing a snapshot and deleting the rotated journal is harmless.
+
+    Unlike StatefulGameState, calls are serialised with a lock of its own, as snapshots
+    must not interleave with mutations.
+    """
+    DEFAULT_CONFIG = dict(StatefulGameState.DEFAULT_CONFIG, **{
+        'journal_path': 'game_state.journal',
+        'snapshot_path': 'game_state.snapshot',
+        'journal_flush_interval_s': 0.01,
+        'snapshot_every': 100000
+    })
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.lock = threading.RLock()
+        self.journal = None
+        self.recover()
+        self.journal = Journal(
+            self.config['journal_path'], self.config['journal_flush_interval_s']
+        )
+        self.snapshot_writer = SnapshotWriter(
+            self.journal, lambda: self.lock, self._capture_snapshot, self._write_snapshot
+        )
+
+    #### Recovery ####
+
+    def recover(self):
+        """
+        Loads the snapshot, if any, then replays the journal on top of it
+
+        :return None:
+        """
+        num_users, num_alerted = len(self.state), self.alert_index.num_alerted
+        self.state = {}
+        self.alert_index.clear()
+        self.alert_epoch = 0
+        self._load_snapshot()
+        self._replay_journal()
+        self.stats.add_users(len(self.state) - num_users)
+        self.stats.add_alerted_users(self.alert_index.num_alerted - num_alerted)
+
+    def _restore_user(self, user_id, last_pressed, alert_state):
+        record = self._create_user_record(user_id, self.alert_epoch)
+        record['last_pressed'] = last_pressed
+        record['alert_state'] = alert_state
+        key = self._to_key(user_id)
+        self.state[key] = record
+        self.alert_index.add(key)
+        if alert_state:
+            self.alert_index.set_alerted(key, True)
+
+    def _load_snapshot(self):
+        records = read_snapshot(self.config['snapshot_path'], SNAPSHOT_HEADER, SNAPSHOT_RECORD)
+        header = next(records, None)
+        if header is None:
+            return
+        if header[0] != SNAPSHOT_VERSION:
+            raise ValueError('unsupported game state snapshot version {}'.format(header[0]))
+        restore_user = self._restore_user
+        fromtimestamp = datetime.fromtimestamp
+        isnan = math.isnan
+        for id_bytes, last_pressed, alert_state in records:
+            restore_user(
+                uuid.UUID(bytes=id_bytes),
+                None if isnan(last_pressed) else fromtimestamp(last_pressed),
+                None if alert_state < 0 else bool(alert_state)
+            )
+
+    def _replay_journal(self):
+        for opcode, id_bytes, value in read_journal(self.config['journal_path']):
+            user_id = uuid.UUID(bytes=id_bytes)
+            key = self._to_key(user_id)
+            if opcode == OP_ADD_USER:
+                if key not in self.state:
+                    self._restore_user(user_id, None, None)
+            elif opcode == OP_REMOVE_USER:
+                if key in self.state:
+                    del self.state[key]
+                    self.alert_index.remove(key)
+            elif opcode == OP_PRESS:
+                if key in self.state:
+                    self.state[key]['last_pressed'] = datetime.fromtimestamp(value)
+            elif opcode in (OP_ALERT, OP_UNALERT):
+                if key in self.state:
+                    alert_state = opcode == OP_ALERT
+                    self.state[key]['alert_state'] = alert_state
+                    self.state[key]['alert_epoch'] = self.alert_epoch
+                    self.alert_index.set_alerted(key, alert_state)
+            elif opcode == OP_STOP:
+                self.alert_epoch += 1
+                self.alert_index.clear_alerts()
+            elif opcode == OP_CLEAN_UP:
+                self.state = {}
+                self.alert_index.clear()
+
+    #### Snapshots ####
+
+    def _capture_snapshot(self):
+        """
+        :return list: (user UUID, last_pressed, alert_state) of every user. Must be called
+            with the lock held
+        """
+        alert_epoch = self.alert_epoch
+        return [
+            (
+                record['user_id'], record['last_pressed'],
+                record['alert_state'] if record['alert_epoch'] == alert_epoch else False
+            )
+            for record in self.state.values()
+        ]
+
+    def _write_snapshot(self, users):
+        write_snapshot(
+            self.config['snapshot_path'], SNAPSHOT_HEADER, (SNAPSHOT_VERSION,),
+            SNAPSHOT_RECORD,
+            [
+                (
+                    user_id.bytes, timestamp_or_nan(last_pressed),
+                    -1 if alert_state is None else int(alert_state)
+                )
+                for user_id, last_pressed, alert_state in users
+            ]
+        )
+
+    def snapshot(self):
+        """
+        Writes every user's state to the snapshot and empties the journal, waiting for
+        the write
+
+        :return None:
+        """
+        self.snapshot_writer.snapshot()
+
+    def _maybe_snapshot(self):
+        if self.journal.num_records >= self.config['snapshot_every']:
+            self.snapshot_writer.snapshot(background=True)
+
+    def close(self):
+        """
+        Waits for any snapshot being written, then flushes and closes the journal
+
+        :return None:
+        """
+        self.snapshot_writer.wait()
+        self.journal.close()
+
+    #### Journaled mutations ####
+
+    def user_action(self, user_id, user_action, validated=False):
+        """
+        Overrides StatefulGameState.user_action, serialising actions and snapshotting
+        when due
+        """
+        with self.lock:
+            result = super().user_action(user_id, user_action, validated)
+            self._maybe_snapshot()
+            return result
+
+    def add_user(self, user_id):
+        """
+        Overrides StatefulGameState.add_user, journaling the new user
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        with self.lock:
+            super().add_user(user_id)
+            self.journal.append(OP_ADD_USER, user_id)
+            self._maybe_snapshot()
+
+    def remove_user(self, user_id):
+        """
+        Overrides StatefulGameState.remove_user, journaling the removal
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        with self.lock:
+            super().remove_user(user_id)
+            self.journal.append(OP_REMOVE_USER, user_id)
+            self._maybe_snapshot()
+
+    def remove_users(self, user_ids):
+        """
+        Overrides GameState.remove_users, holding the lock for the whole batch
+        """
+        with self.lock:
+            super().remove_users(user_ids)
+
+    def clean_up(self):
+        """
+        Overrides StatefulGameState.clean_up, journaling the reset
+        """
+        with self.lock:
+            super().clean_up()
+            if self.journal is not None:
+                self.journal.append(OP_CLEAN_UP, uuid.UUID(int=0))
+
+    def _set_alert_state(self, user_id, state, alert_state):
+        """
+        Overrides StatefulGameState._set_alert_state, journaling the outcome
+        """
+        super()._set_alert_state(user_id, state, alert_state)
+        self.journal.append(OP_ALERT if alert_state else OP_UNALERT, user_id)
+
+    def handle_button_press(self, user_id, user_action):
+        """
+        Overrides StatefulGameState.handle_button_press, journaling the press time
+        """
+        result = super().handle_button_press(user_id, user_action)
+        self.journal.append(OP_PRESS, user_id, self.find_state(user_id)['last_pressed'].timestamp())
+        return result
+
+    def handle_stop(self, user_id, user_action):
+        """
+        Overrides StatefulGameState.handle_stop, journaling the new alert epoch
+        """
+        result = super().handle_stop(user_id, user_action)
+        self.journal.append(OP_STOP, uuid.UUID(int=0))
+        return result
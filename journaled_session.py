@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+from contextlib import ExitStack
+from datetime import datetime
+import struct
+import uuid
+
+from journal import Journal, SnapshotWriter, read_journal, read_snapshot, write_snapshot
+from stateful_ticket_session import StatefulTicketSessionManager
+
+# Journal opcodes. Every expiry change, including creation and destruction, is one
+# SET_EXPIRY record; sessions handed out by check_expired_sessions are REMOVEd.
+OP_SET_EXPIRY = 1
+OP_REMOVE = 2
+
+# Snapshot header: format version. Records: session UUID and expiry timestamp
+SNAPSHOT_HEADER = struct.Struct('<I')
+SNAPSHOT_RECORD = struct.Struct('<16sd')
+SNAPSHOT_VERSION = 1
+
+class JournaledSessionManager(StatefulTicketSessionManager):
+    """
+    StatefulTicketSessionManager whose sessions survive restarts. Journals and
+    snapshots sessions in the same way journaled_game_state.JournaledGameState does
+    game state.
+    """
+    DEFAULT_CONFIG = dict(StatefulTicketSessionManager.DEFAULT_CONFIG, **{
+        'journal_path': 'sessions.journal',
+        'snapshot_path': 'sessions.snapshot',
+        'journal_flush_interval_s': 0.01,
+        'snapshot_every': 100000
+    })
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.recover()
+        self.journal = Journal(
+            self.config['journal_path'], self.config['journal_flush_interval_s']
+        )
+        self.snapshot_writer = SnapshotWriter(
+            self.journal, self._pause, self._capture_snapshot, self._write_snapshot
+        )
+
+    #### Recovery ####
+
+    def _restore_session(self, id, timestamp):
+        key = self._to_key(id)
+        stripe = self._stripe(key)
+        stripe.sessions[key] = {'id': id, 'expiry': datetime.fromtimestamp(timestamp)}
+        StatefulTicketSessionManager._index_expiry(
+            self, stripe, key, self.clock.from_timestamp(timestamp)
+        )
+
+    def recover(self):
+        """
+        Loads the snapshot, if any, then replays the journal on top of it
+
+        :return None:
+        """
+        for stripe in self._stripes:
+            stripe.sessions.clear()
+            stripe.expiries.clear()
+            stripe.expiry_heap = []
+        records = read_snapshot(self.config['snapshot_path'], SNAPSHOT_HEADER, SNAPSHOT_RECORD)
+        header = next(records, None)
+        if header is not None:
+            if header[0] != SNAPSHOT_VERSION:
+                raise ValueError('unsupported session snapshot version {}'.format(header[0]))
+            for id_bytes, timestamp in records:
+                self._restore_session(uuid.UUID(bytes=id_bytes), timestamp)
+        for opcode, id_bytes, value in read_journal(self.config['journal_path']):
+            id = uuid.UUID(bytes=id_bytes)
+            if opcode == OP_SET_EXPIRY:
+                self._restore_session(id, value)
+            elif opcode == OP_REMOVE:
+                key = self._to_key(id)
+                stripe = self._stripe(key)
+                stripe.sessions.pop(key, None)
+                stripe.expiries.pop(key, None)
+
+    #### Snapshots ####
+
+    def _pause(self):
+        """
+        :return ExitStack: holding every stripe's lock
+        """
+        stack = ExitStack()
+        for stripe in self._stripes:
+            stack.enter_context(stripe.lock)
+        return stack
+
+    def _capture_snapshot(self):
+        """
+        :return list: (key, expiry) of every session. Must be called with every stripe's
+            lock held
+        """
+        return [item for stripe in self._stripes for item in stripe.expiries.items()]
+
+    def _write_snapshot(self, expiries):
+        from_key, to_timestamp = self._from_key, self.clock.to_timestamp
+        write_snapshot(
+            self.config['snapshot_path'], SNAPSHOT_HEADER, (SNAPSHOT_VERSION,),
+            SNAPSHOT_RECORD,
+            [(from_key(key).bytes, to_timestamp(expiry)) for key, expiry in expiries]
+        )
+
+    def snapshot(self):
+        """
+        Writes every session to the snapshot and empties the journal, waiting for the
+        write. Holds every stripe's lock only while copying the sessions.
+
+        :return None:
+        """
+        self.snapshot_writer.snapshot()
+
+    def _maybe_snapshot(self):
+        if self.journal.num_records >= self.config['snapshot_every']:
+            self.snapshot_writer.snapshot(background=True)
+
+    def close(self):
+        """
+        Waits for any snapshot being written, then flushes and closes the journal
+
+        :return None:
+        """
+        self.snapshot_writer.wait()
+        self.journal.close()
+
+    #### Journaled mutations ####
+
+    def _index_expiry(self, stripe, key, expiry):
+        """
+        Overrides StatefulTicketSessionManager._index_expiry, journaling the new expiry
+        while the stripe's lock is still held, so records of one session stay in order
+        """
+        super()._index_expiry(stripe, key, expiry)
+        self.journal.append(OP_SET_EXPIRY, self._from_key(key), self.clock.to_timestamp(expiry))
+
+    def new_session(self, credentials):
+        """
+        Overrides StatefulTicketSessionManager.new_session, snapshotting when due
+        """
+        result = super().new_session(credentials)
+        self._maybe_snapshot()
+        return result
+
+    def check_expired_sessions(self):
+        """
+        Overrides StatefulTicketSessionManager.check_expired_sessions, journaling the
+        removal of expired sessions
+        """
+        expired = super().check_expired_sessions()
+        for id in expired:
+            self.journal.append(OP_REMOVE, id)
+        self._maybe_snapshot()
+        return expired
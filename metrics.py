@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+# In-process metrics rendered in the Prometheus text exposition format. Recording a
+# sample is a dict update under a per-metric lock, cheap enough to leave on for every
+# request. Label values are passed as tuples matching the metric's label names.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, from tens of microseconds for in-process game logic up to
+# a second for a slow request
+LATENCY_BUCKETS_S = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+    0.5, 1.0
+)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        )
+        for name, value in pairs
+    ) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base of the metric types. Keeps one value per label value tuple.
+    """
+    TYPE = None
+
+    def __init__(self, name, help, label_names=()):
+        """
+        :param string name: Prometheus metric name
+        :param string help: HELP text
+        :param tuple label_names:
+        """
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        """
+        :return list: exposition format lines, including HELP and TYPE
+        """
+        lines = [
+            '# HELP {} {}'.format(self.name, self.help),
+            '# TYPE {} {}'.format(self.name, self.TYPE)
+        ]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            lines.extend(self._render_value(labels, value))
+        return lines
+
+    def _render_value(self, labels, value):
+        return ['{}{} {}'.format(
+            self.name, format_labels(self.label_names, labels), format_value(value)
+        )]
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count
+    """
+    TYPE = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    """
+    Value that goes up and down. Either set explicitly or, if created with a callback,
+    read from the callback at scrape time so nothing is recorded per request.
+    """
+    TYPE = 'gauge'
+
+    def __init__(self, name, help, label_names=(), callback=None):
+        """
+        :param callback: function returning the unlabelled value, or None to leave the
+            gauge unreported, e.g. when a backend can't provide it
+        """
+        super().__init__(name, help, label_names)
+        self.callback = callback
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, labels=()):
+        if self.callback is not None:
+            return self.callback()
+        return self._values.get(labels)
+
+    def render(self):
+        if self.callback is not None:
+            value = self.callback()
+            with self._lock:
+                if value is None:
+                    self._values.pop((), None)
+                else:
+                    self._values[()] = value
+        return super().render()
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over fixed buckets. Each label value tuple keeps
+    a count per bucket, plus the sum and count of observations.
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS_S):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, labels=()):
+        """
+        Observes the wall time spent in the with block, in seconds
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+    def count(self, labels=()):
+        entry = self._values.get(labels)
+        return 0 if entry is None else entry[2]
+
+    def _render_value(self, labels, value):
+        bucket_counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            lines.append('{}_bucket{} {}'.format(
+                self.name,
+                format_labels(self.label_names, labels, [('le', format_value(bound))]),
+                cumulative
+            ))
+        label_text = format_labels(self.label_names, labels)
+        lines.append('{}_sum{} {}'.format(self.name, label_text, format_value(total)))
+        lines.append('{}_count{} {}'.format(self.name, label_text, count))
+        return lines
+
+
+class Registry:
+    """
+    Collection of metrics rendered together
+    """
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        :param Metric metric:
+
+        :return Metric: metric, for chaining
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        """
+        :return string: every metric in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def not_implemented_as_none(func):
+    """
+    Wraps a gauge callback so a backend raising NotImplementedError leaves the gauge
+    unreported
+    """
+    def callback():
+        try:
+            return func()
+        except NotImplementedError:
+            return None
+    return callback
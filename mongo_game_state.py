@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timezone
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+from game_random import DEFAULT_RNG_CONFIG, create_game_rng
+from game_state import (
+    GameState, InvalidUserActionError, UserAlreadyExistsError, UserDoesntExistError
+)
+from mongo_helpers import MONGO_DEFAULT_CONFIG, get_mongo_database
+from stateful_game_state import StatefulGameState, validate_user_action_api
+
+class MongoGameState(GameState):
+    """
+    MongoDB backed implementation of game_state.GameState. Game state survives restarts and
+    can be shared by several server processes. Each user is one document keyed by their
+    UUID string, and alert_state is indexed so alerted and unalerted users can be found
+    and updated server-side.
+    """
+    DEFAULT_CONFIG = dict(MONGO_DEFAULT_CONFIG, **DEFAULT_RNG_CONFIG, **{
+        'alert_chance_of_multiply': 0.2,
+        'mongo_game_collection': 'game_users'
+    })
+
+    def __init__(self, config, client=None):
+        """
+        :param dict config:
+        :param client: MongoClient to use instead of the shared one, e.g. a mongomock client
+        """
+        super().__init__(dict(self.__class__.DEFAULT_CONFIG, **config))
+        self.collection = get_mongo_database(self.config, client)[
+            self.config['mongo_game_collection']
+        ]
+        self.collection.create_index('alert_state')
+        # Users to alert are sampled server-side; this only decides how many
+        self.rng = create_game_rng(self.config)
+
+    _convert_uuid = staticmethod(StatefulGameState._convert_uuid)
+
+    @staticmethod
+    def _doc_to_state(doc):
+        return {
+            'user_id': uuid.UUID(doc['_id']),
+            'last_pressed': doc['last_pressed'],
+            'alert_state': doc['alert_state']
+        }
+
+    def _sample_user_ids(self, count, exclude_id, unalerted_only):
+        """
+        Picks up to count distinct random users server-side
+
+        :param int count:
+        :param string exclude_id: user id string that must not be picked
+        :param bool unalerted_only: only pick users that are not alerted
+
+        :return list: picked user id strings
+        """
+        match = {'_id': {'$ne': exclude_id}}
+        if unalerted_only:
+            match['alert_state'] = {'$ne': True}
+        return [doc['_id'] for doc in self.collection.aggregate([
+            {'$match': match},
+            {'$sample': {'size': count}},
+            {'$project': {'_id': 1}}
+        ])]
+
+    def _alert_users(self, user_ids):
+        """
+        Alerts users with one bulk update and notifies alert listeners
+
+        :param list user_ids: user id strings
+
+        :return None:
+        """
+        if not user_ids:
+            return
+        self.collection.update_many({'_id': {'$in': user_ids}}, {'$set': {'alert_state': True}})
+        if self.alert_listeners:
+            for user_id in user_ids:
+                self.notify_alerted(uuid.UUID(user_id))
+
+    def user_action(self, user_id, user_action, validated=False):
+        """
+        Handle user action. Updates stored state and responds with user response.
+        Raises UserDoesntExistError if user has not been added to game
+        Raises InvalidUserActionError if an invalid action is supplied
+
+        Overrides GameState.user_action
+        """
+        if not validated:
+            self.__class__.validate_user_action(user_action)
+        user_id = self.__class__._convert_uuid(user_id)
+        validate_user_action_api(user_action)
+        code = user_action['action']['code']
+        if code == 'BUTTON_PRESS':
+            return self.handle_button_press(user_id, user_action)
+        elif code == 'CHECK_IF_ALERTED':
+            return self.handle_check_if_alerted(user_id, user_action)
+        elif code == 'START':
+            return self.handle_start(user_id, user_action)
+        elif code == 'STOP':
+            return self.handle_stop(user_id, user_action)
+        raise InvalidUserActionError('{} is not a valid action'.format(code))
+
+    def add_user(self, user_id):
+        """
+        Add new user to game. Inserts a user document.
+        Raises UserAlreadyExistsError if user is already added to game
+
+        Overrides GameState.add_user
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        try:
+            self.collection.insert_one({
+                '_id': str(user_id),
+                'last_pressed': None,
+                'alert_state': None
+            })
+        except DuplicateKeyError as error:
+            raise UserAlreadyExistsError() from error
+
+    def remove_user(self, user_id):
+        """
+        Remove user from game. Deletes the user document.
+        Raises UserDoesntExistError if user has not been added to game
+
+        Overrides GameState.remove_user
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        if self.collection.delete_one({'_id': str(user_id)}).deleted_count == 0:
+            raise UserDoesntExistError()
+
+    def remove_users(self, user_ids):
+        """
+        Remove several users from game with one bulk delete, skipping any that have not
+        been added.
+
+        Overrides GameState.remove_users
+        """
+        user_ids = [str(self.__class__._convert_uuid(user_id)) for user_id in user_ids]
+        if user_ids:
+            self.collection.delete_many({'_id': {'$in': user_ids}})
+
+    def clean_up(self):
+        """
+        Clears game state. Deletes every user document.
+
+        Overrides GameState.clean_up
+        """
+        self.collection.delete_many({})
+
+    def count_users(self):
+        """
+        Overrides GameState.count_users
+        """
+        return self.collection.count_documents({})
+
+    def count_alerted_users(self):
+        """
+        Counts alerted users through the alert_state index.
+
+        Overrides GameState.count_alerted_users
+        """
+        return self.collection.count_documents({'alert_state': True})
+
+    def find_state(self, user_id):
+        """
+        Fetches state for user_id. The returned dictionary is a copy, so changes to it
+        are not stored.
+        :param UUID user_id:
+
+        :return state dict:
+
+        :raises UserDoesntExistError:
+        """
+        doc = self.collection.find_one({'_id': str(user_id)})
+        if doc is None:
+            raise UserDoesntExistError()
+        return self.__class__._doc_to_state(doc)
+
+    def handle_button_press(self, user_id, user_action):
+        """
+        Handles button press user action. Updates stored state, removing alert, alerting
+        others and updating last_pressed time.
+
+        :param UUID user_id:
+        :param dict user_action:
+
+        :return dict: user action response
+
+        :raises UserDoesntExistError:
+        """
+        result = self.collection.update_one(
+            {'_id': str(user_id)},
+            {'$set': {'last_pressed': datetime.now(timezone.utc), 'alert_state': False}}
+        )
+        if result.matched_count == 0:
+            raise UserDoesntExistError()
+        # Alerts can be passed from the current user to one other user
+        # OR to two users, based on the 'alert_chance_of_multiply' config item
+        num_ids_to_alert = 1 + (self.rng.random() > (1 - self.config['alert_chance_of_multiply']))
+        self._alert_users(self._sample_user_ids(num_ids_to_alert, str(user_id), True))
+        return self.__class__.create_user_button_press_response(user_id, user_action, True)
+
+    def handle_check_if_alerted(self, user_id, user_action):
+        """
+        Handles check if alerted user action press. Returns whether user is alerted
+
+        :param UUID user_id:
+        :param dict user_action:
+
+        :return dict: user action response
+
+        :raises UserDoesntExistError:
+        """
+        return self.__class__.create_user_check_if_alerted_response(
+            user_id,
+            user_action,
+            self.find_state(user_id)['alert_state'] or False
+        )
+
+    def handle_start(self, user_id, user_action):
+        """
+        Handles 'start' user action press. Sets an alert on one random other user.
+        Unsuccessful if there are no other users to alert.
+
+        :param UUID user_id:
+        :param dict user_action:
+
+        :return dict: user action response
+        """
+        other_ids = self._sample_user_ids(1, str(user_id), False)
+        self._alert_users(other_ids)
+        return self.__class__.create_user_start_stop_response(
+            user_id,
+            user_action,
+            bool(other_ids)
+        )
+
+    def handle_stop(self, user_id, user_action):
+        """
+        Handles 'stop' user action press. Removes all user alerts with one bulk update.
+
+        :param UUID user_id:
+        :param dict user_action:
+
+        :return dict: user action response
+        """
+        self.collection.update_many({'alert_state': True}, {'$set': {'alert_state': False}})
+        return self.__class__.create_user_start_stop_response(
+            user_id,
+            user_action,
+            True
+        )
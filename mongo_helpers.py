@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import threading
+
+import pymongo
+
+MONGO_DEFAULT_CONFIG = {
+    'mongo_uri': 'mongodb://localhost:27017',
+    'mongo_database': 'useless_machine',
+    'mongo_max_pool_size': 100
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_mongo_client(config):
+    """
+    Returns a MongoClient for config's URI and pool size. Clients, and so their connection
+    pools, are shared by every game state and session manager in the process. Clients are
+    tz_aware, returning stored datetimes as UTC.
+
+    :param dict config: MONGO_DEFAULT_CONFIG items
+
+    :return pymongo.MongoClient:
+    """
+    key = (config['mongo_uri'], config['mongo_max_pool_size'])
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = pymongo.MongoClient(
+                key[0], maxPoolSize=key[1], connect=False, tz_aware=True
+            )
+        return _clients[key]
+
+
+def get_mongo_database(config, client=None):
+    """
+    :param dict config: MONGO_DEFAULT_CONFIG items
+    :param client: MongoClient to use instead of a shared one, e.g. a mongomock client
+
+    :return pymongo.database.Database:
+    """
+    if client is None:
+        client = get_mongo_client(config)
+    return client[config['mongo_database']]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timedelta, timezone
+import uuid
+
+from pymongo import ReturnDocument
+
+from mongo_helpers import MONGO_DEFAULT_CONFIG, get_mongo_database
+import session
+from stateful_ticket_session import StatefulTicketSessionManager
+
+class MongoSessionManager(session.SessionManager):
+    """
+    Session manager that creates unauthenticated session tickets, like
+    StatefulTicketSessionManager, but stores them in MongoDB so they survive restarts and
+    are shared by every server process. Sessions are keyed by their UUID string and
+    indexed by expiry.
+    """
+    DEFAULT_CONFIG = dict(MONGO_DEFAULT_CONFIG, **{
+        'mongo_session_collection': 'sessions',
+        # The expiry index is a TTL index: MongoDB deletes sessions this long after they
+        # expire, as a backstop for any never picked up by check_expired_sessions
+        'mongo_session_ttl_grace_s': 3600,
+        # Expired sessions claimed by a check_expired_sessions that hasn't deleted them
+        # this long after are claimed again, e.g. if its process died
+        'mongo_session_claim_timeout_s': 60
+    })
+
+    def __init__(self, config, client=None):
+        """
+        :param dict config:
+        :param client: MongoClient to use instead of the shared one, e.g. a mongomock client
+        """
+        super().__init__(dict(self.__class__.DEFAULT_CONFIG, **config))
+        self.collection = get_mongo_database(self.config, client)[
+            self.config['mongo_session_collection']
+        ]
+        self.collection.create_index(
+            'expiry', expireAfterSeconds=self.config['mongo_session_ttl_grace_s']
+        )
+
+    @staticmethod
+    def _now():
+        """
+        Expiries are stored as UTC: MongoDB, and so its TTL index, reads naive datetimes
+        as UTC
+
+        :return datetime: timezone-aware
+        """
+        return datetime.now(timezone.utc)
+
+    @staticmethod
+    def _as_utc(value):
+        """
+        :param datetime value: stored expiry, naive UTC unless the client is tz_aware
+
+        :return datetime: timezone-aware
+        """
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+    _extract_session_id_from_session_obj = staticmethod(
+        StatefulTicketSessionManager._extract_session_id_from_session_obj
+    )
+
+    @classmethod
+    def _doc_to_session(cls, doc):
+        return {'id': uuid.UUID(doc['_id']), 'expiry': cls._as_utc(doc['expiry'])}
+
+    def _raise_invalid_session(self, id):
+        """
+        Raises session.InvalidSessionError saying whether the session is unknown or expired
+
+        :param UUID id:
+
+        :raises session.InvalidSessionError:
+        """
+        if self.collection.find_one({'_id': str(id)}, {'_id': 1}) is None:
+            raise session.InvalidSessionError('Unknown session')
+        raise session.InvalidSessionError('Session has expired')
+
+    def new_session(self, credentials):
+        """
+        Creates new session. Inserts a new session ticket *without any authentication*.
+
+        Overrides SessionManager.new_session
+        """
+        session_result = {
+            'id': uuid.uuid4(),
+            'expiry': (
+                self.__class__._now()
+                + timedelta(seconds=self.config['expiry_timeout_s'])
+            )
+        }
+        self.collection.insert_one({
+            '_id': str(session_result['id']),
+            'expiry': session_result['expiry']
+        })
+        return session_result
+
+    def extend_session(self, session_details):
+        """
+        Extends existing session. Atomically checks the stored session has not expired and
+        moves its expiry time on. Raises session.InvalidSessionError if it does not exist
+        or has expired.
+
+        Overrides SessionManager.extend_session
+        """
+        id = self.__class__._extract_session_id_from_session_obj(session_details)
+        now = self.__class__._now()
+        doc = self.collection.find_one_and_update(
+            {'_id': str(id), 'expiry': {'$gte': now}},
+            {'$set': {
+                'expiry': now + timedelta(seconds=self.config['expiry_sliding_window_s'])
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            self._raise_invalid_session(id)
+        return self.__class__._doc_to_session(doc)
+
+    def destroy_session(self, session_details):
+        """
+        Destroys existing session. Updates stored session with an in-the-past expiry time.
+        Raises session.InvalidSessionError if it does not exist.
+
+        Overrides SessionManager.destroy_session
+        """
+        id = self.__class__._extract_session_id_from_session_obj(session_details)
+        # MongoDB stores milliseconds, so step back one to be sure the expiry has passed
+        result = self.collection.update_one(
+            {'_id': str(id)}, {'$set': {'expiry': self.__class__._now() - timedelta(milliseconds=1)}}
+        )
+        if result.matched_count == 0:
+            raise session.InvalidSessionError('Unknown session')
+
+    def authenticate_session(self, session_details):
+        """
+        Authenticates existing session. Checks the stored session exists and is within
+        expiry time. Raises session.InvalidSessionError if it isn't.
+
+        Overrides SessionManager.authenticate_session
+        """
+        id = self.__class__._extract_session_id_from_session_obj(session_details)
+        doc = self.collection.find_one({'_id': str(id)})
+        if doc is None:
+            raise session.InvalidSessionError('Unknown session')
+        if self.__class__._now() > self.__class__._as_utc(doc['expiry']):
+            raise session.InvalidSessionError('Session has expired')
+
+    def touch_session(self, session_details):
+        """
+        extend_session already checks the session has not expired, so touching is one
+        round trip.
+
+        Overrides SessionManager.touch_session
+        """
+        return self.extend_session(session_details)
+
+    def count_sessions(self):
+        """
+        Overrides SessionManager.count_sessions
+        """
+        return self.collection.count_documents({})
+
+    def check_expired_sessions(self):
+        """
+        Returns all sessions that have expired since the last call to
+        check_expired_sessions, in three round trips however many there are. Expired
+        sessions are claimed with a 'reaper' token of this call in one update_many, read
+        back, then deleted in one delete_many. Each session is claimed atomically and
+        expired sessions can't be extended, so a session another process extends in
+        between is never claimed, and concurrent calls never report the same session.
+
+        Overrides SessionManager.check_expired_sessions
+        """
+        now = self.__class__._now()
+        reaper = str(uuid.uuid4())
+        self.collection.update_many(
+            {
+                'expiry': {'$lt': now},
+                '$or': [
+                    {'reaper': {'$exists': False}},
+                    {'claimed': {'$lt': now - timedelta(
+                        seconds=self.config['mongo_session_claim_timeout_s']
+                    )}}
+                ]
+            },
+            {'$set': {'reaper': reaper, 'claimed': now}}
+        )
+        expired = {}
+        for doc in self.collection.find({'reaper': reaper}, {'expiry': 1}):
+            session_result = self.__class__._doc_to_session(doc)
+            expired[session_result['id']] = session_result
+        if expired:
+            self.collection.delete_many({'reaper': reaper})
+        return expired
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import calendar
+from datetime import datetime
+from email.utils import formatdate
+import json
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Response bodies of each action code: the key of their single 'response' item. Action
+# responses are assembled from a precomputed template for each code and value.
+ACTION_RESPONSE_KEYS = {
+    'BUTTON_PRESS': 'success',
+    'CHECK_IF_ALERTED': 'alerted',
+    'START': 'success',
+    'STOP': 'success'
+}
+
+
+def json_default(obj):
+    """
+    Encodes the non-JSON types found in responses the same way as Flask's jsonify
+    """
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return formatdate(calendar.timegm(obj.utctimetuple()), usegmt=True)
+    raise TypeError('{} is not JSON serializable'.format(type(obj).__name__))
+
+
+class ResponseEncoder:
+    """
+    Encodes response bodies to JSON bytes, with orjson if it is installed and allowed by
+    'json_library', else the standard library. UUIDs and datetimes are encoded as
+    Flask's jsonify does.
+
+    Action responses are assembled from per-code templates rather than encoded from
+    scratch. With 'echo_user_action' off, the user_action that clients sent is left out
+    of responses, which for CHECK_IF_ALERTED is most of the body.
+    """
+    DEFAULT_CONFIG = {
+        # 'auto' uses orjson if installed, 'orjson' requires it, 'json' never uses it
+        'json_library': 'auto',
+        'echo_user_action': True
+    }
+
+    def __init__(self, config):
+        self.config = dict(self.__class__.DEFAULT_CONFIG, **config)
+        library = self.config['json_library']
+        if library == 'orjson' and orjson is None:
+            raise ValueError('json_library orjson is not installed')
+        if library not in ('auto', 'orjson', 'json'):
+            raise ValueError('unknown json_library {}'.format(library))
+        self.uses_orjson = orjson is not None and library != 'json'
+        self.echo_user_action = self.config['echo_user_action']
+        # (code, (response key, value)) -> body suffix following the user id
+        self._templates = {
+            (code, (key, value)): (
+                '","response":{' + json.dumps(key) + ':' + json.dumps(value) + '}}'
+            ).encode()
+            for code, key in ACTION_RESPONSE_KEYS.items()
+            for value in (True, False)
+        }
+
+    def encode(self, obj):
+        """
+        :param obj: JSON-encodable object, which may contain UUIDs and datetimes
+
+        :return bytes:
+        """
+        if self.uses_orjson:
+            try:
+                return orjson.dumps(
+                    obj, default=json_default, option=orjson.OPT_PASSTHROUGH_DATETIME
+                )
+            except TypeError:
+                # orjson rejects what the standard library accepts, e.g. integers
+                # beyond 64 bits in an action's data
+                pass
+        return json.dumps(obj, default=json_default, separators=(',', ':')).encode()
+
+    def strip_action_response(self, response):
+        """
+        :param dict response: as created by GameState.create_user_*_response
+
+        :return dict: response without its user_action, unless 'echo_user_action' is set
+        """
+        if self.echo_user_action:
+            return response
+        return {key: value for key, value in response.items() if key != 'user_action'}
+
+    def encode_action_response(self, response, session=None):
+        """
+        :param dict response: as created by GameState.create_user_*_response
+        :param dict session: refreshed session details to hand back to the client, if any
+
+        :return bytes:
+        """
+        if session is not None:
+            return self.encode(dict(self.strip_action_response(response), session=session))
+        try:
+            template = self._templates[(
+                response['user_action']['action']['code'],
+                *response['response'].items()
+            )]
+        except (KeyError, TypeError):
+            # Not shaped like a known action response
+            return self.encode(self.strip_action_response(response))
+        user_id = response['user_id']
+        if not isinstance(user_id, uuid.UUID):
+            return self.encode(self.strip_action_response(response))
+        if not self.echo_user_action:
+            return b'{"user_id":"' + str(user_id).encode() + template
+        return (
+            b'{"user_action":' + self.encode(response['user_action'])
+            + b',"user_id":"' + str(user_id).encode() + template
+        )
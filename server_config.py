@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+from helpers import import_class
+
+# Server configuration and the backends it can select, shared by api.py, async_api.py
+# and the benchmarks. Importing this module builds nothing: servers create their session
+# manager and game state with create_session_manager and create_game_state.
+
+# Backends selectable through the 'backend' config items
+SESSION_MANAGER_BACKENDS = {
+    'stateful_ticket': 'stateful_ticket_session.StatefulTicketSessionManager',
+    'mongo': 'mongo_session.MongoSessionManager',
+    # Survives restarts through a local journal and snapshot
+    'journaled': 'journaled_session.JournaledSessionManager',
+    # Stateless HMAC-signed tokens; set 'token_secret' to share them between processes.
+    # Expired sessions are only swept with 'token_track_expiries', for single processes,
+    # so they can't serve a shared_memory game
+    'signed_token': 'signed_token_session.SignedTokenSessionManager'
+}
+GAME_STATE_BACKENDS = {
+    'rooms': 'game_rooms.GameRoomManager',
+    'stateful': 'stateful_game_state.StatefulGameState',
+    'mongo': 'mongo_game_state.MongoGameState',
+    'journaled': 'journaled_game_state.JournaledGameState',
+    # One game shared by every worker process on the machine, e.g. under gunicorn
+    'shared_memory': 'shared_memory_game_state.SharedMemoryGameState'
+}
+# Game state backends serving one game from several worker processes, which need
+# sessions every worker can see, and whose expiries every worker's expiry sweeps see, so
+# users of abandoned sessions leave the fixed-size game: Mongo. stateful_ticket and
+# journaled sessions live in one process's memory, and signed tokens only report the
+# expiries of one process's sessions, if any
+SHARED_GAME_STATE_BACKENDS = {'shared_memory'}
+SHARED_SESSION_BACKENDS = {'mongo'}
+
+
+def check_backends(session_config, game_config):
+    """
+    :param dict session_config:
+    :param dict game_config:
+
+    :raises ValueError: If the game state is shared between processes but sessions, or
+        their expiries, are not
+    """
+    if game_config['backend'] not in SHARED_GAME_STATE_BACKENDS:
+        return
+    if session_config['backend'] not in SHARED_SESSION_BACKENDS:
+        raise ValueError('{} game state needs one of the {} session backends'.format(
+            game_config['backend'], ', '.join(sorted(SHARED_SESSION_BACKENDS))
+        ))
+
+
+session_config = {
+    'backend': 'stateful_ticket',
+    'expiry_timeout_s': 100,
+    'expiry_sliding_window_s': 60,
+    # Skip extending sessions on actions that would move their expiry on by less than this
+    'extend_coalesce_ms': 0,
+    # Seconds between background expiry sweeps. None sweeps inline on every request
+    'expiry_reaper_interval_s': None
+}
+# 'rng_seed' seeds the game's own random number generator, for reproducible runs
+game_config = {
+    'backend': 'rooms', 'alert_chance_of_multiply':0.2, 'max_room_size': 1000, 'rng_seed': None
+}
+# Response encoding. 'json_library': 'auto' uses orjson if installed. Turning
+# 'echo_user_action' off leaves the request's user_action out of action responses
+response_config = {'json_library': 'auto', 'echo_user_action': True}
+# Level of structured game events to log, e.g. 'DEBUG' for all. None logs no events
+event_log_config = {'level': None}
+
+
+def create_session_manager(config):
+    """
+    :param dict config: session config, its 'backend' one of SESSION_MANAGER_BACKENDS
+
+    :return session.SessionManager:
+    """
+    return import_class(SESSION_MANAGER_BACKENDS[config['backend']])(config)
+
+
+def create_game_state(config):
+    """
+    :param dict config: game config, its 'backend' one of GAME_STATE_BACKENDS
+
+    :return game_state.GameState:
+    """
+    return import_class(GAME_STATE_BACKENDS[config['backend']])(config)
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import uuid
+
 from helpers import raise_not_implemented_error
 
 class InvalidCredentialsError(Exception):
@@ -16,15 +18,77 @@ class InvalidSessionError(Exception):
     """
     pass
 
+class SessionContext:
+    """
+    Session details resolved once per request: the details as sent, plus their id already
+    parsed to a UUID. Accepted wherever session details are, so a request authenticating
+    and extending the same session only parses its id once.
+    """
+    __slots__ = ('id', 'details', 'parsed')
+
+    def __init__(self, id, details, parsed=None):
+        """
+        :param UUID id: parsed session id
+        :param dict details: session details as sent
+        :param parsed: anything else the session manager resolved from the details, e.g.
+            a checked token, for its own use
+        """
+        self.id = id
+        self.details = details
+        self.parsed = parsed
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        return self.details[key]
+
+def extract_session_id(session_details):
+    """
+    :param dict session_details: As returned by new_session, id as a string or UUID, or
+        a SessionContext
+
+    :return UUID: session id
+
+    :raises InvalidSessionError: If there is no valid id field
+    """
+    if type(session_details) is SessionContext:
+        return session_details.id
+    id = None
+    try:
+        id = session_details['id']
+        if not isinstance(id, uuid.UUID):
+            id = uuid.UUID(id)
+    except (KeyError, TypeError, AttributeError) as error:
+        raise InvalidSessionError('no id field in session object') from error
+    except ValueError as error:
+        raise InvalidSessionError('invalid id field in session object') from error
+    return id
+
 class SessionManager:
     """
     Abstract implementation. Concrete implementations of this class are responsible for
     managing, authenticating and closing user sessions
     """
+    # Whether extend_session and touch_session return new session details, e.g. a
+    # re-signed token, which clients must send from then on. If so, the APIs hand the
+    # new details back with every action.
+    REISSUES_SESSIONS = False
 
     def __init__(self, config):
         self.config = config
     
+    def resolve_session(self, session_details):
+        """
+        Parses session details once, for passing to the other methods in their place
+
+        :param dict session_details: As returned by new_session
+
+        :return SessionContext:
+
+        :raises InvalidSessionError: If there is no valid id field
+        """
+        return SessionContext(extract_session_id(session_details), session_details)
+
     def new_session(self, credentials):
         """
         Creates new session based on credentials
@@ -72,6 +136,33 @@ class SessionManager:
         """
         raise_not_implemented_error(self.authenticate_session.__name__)
 
+    def touch_session(self, session_details):
+        """
+        Authenticates session details and extends the session's expiry time in one step,
+        as done for every user action. As with extend_session, the session then expires
+        'expiry_sliding_window_s' from now, which may be sooner than before, e.g. just
+        after new_session. Backends may skip extensions that would move the expiry by no
+        more than 'extend_coalesce_ms'. Backends able to do both with a single lookup
+        should override this.
+
+        :param dict session_details: As returned by new_session
+
+        :return dict: session_details
+
+        :raises InvalidSessionError:
+        """
+        self.authenticate_session(session_details)
+        return self.extend_session(session_details)
+
+    def count_sessions(self):
+        """
+        :return int: number of sessions held, including expired ones not yet removed by
+            check_expired_sessions
+
+        :raises NotImplementedError: If the backend can't count its sessions
+        """
+        raise_not_implemented_error(self.count_sessions.__name__)
+
     def set_expired_sessions_handler(self, func):
         """
         Returns all sessions that have expired since the last call to
@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import fcntl
+import math
+import os
+import threading
+import time
+import uuid
+import weakref
+
+from multiprocessing import shared_memory
+
+from game_random import DEFAULT_RNG_CONFIG, create_game_rng, random_index, sample_range
+from game_state import (
+    GameFullError, GameState, InvalidUserActionError, UserAlreadyExistsError,
+    UserDoesntExistError
+)
+from stateful_game_state import StatefulGameState, validate_user_action_api
+
+#### Constants ####
+SEGMENT_MAGIC = 0x554d4753  # 'UMGS'
+
+# Header fields, stored as signed 64-bit integers at the start of the segment
+(
+    HEADER_MAGIC, HEADER_CAPACITY, HEADER_NUM_USERS, HEADER_NUM_ALERTED,
+    HEADER_ALERT_EPOCH, HEADER_FREE_TOP, HEADER_TOMBSTONES
+) = range(7)
+HEADER_FIELDS = 8
+
+# UUID-to-slot table entries that are not slot numbers
+TABLE_EMPTY = -1
+TABLE_TOMBSTONE = -2
+
+ALERT_STATE_NONE = -1
+
+#### Classes ####
+
+class ProcessLock:
+    """
+    Lock excluding other threads and other processes, using flock on a lock file. The lock
+    file is reopened after a fork, since a forked child shares its parent's flock.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+            self._pid = os.getpid()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+class SharedMemoryGameState(GameState):
+    """
+    Implementation of game_state.GameState keeping all state in a named
+    multiprocessing.shared_memory segment, so every worker process on a machine, e.g.
+    prefork server workers, serves the same game. Requires Python 3.8+.
+
+    The segment holds 'shm_capacity' user slots as parallel arrays (UUID bytes,
+    last_pressed timestamp, alert_state, alert_epoch), a free list of slots, an
+    open-addressed UUID-to-slot hash table and an array of occupied slots partitioned by
+    alert state, as in alert_index.AlertIndex. STOP bumps an alert epoch, as in
+    StatefulGameState. All access is serialised by a ProcessLock on 'shm_lock_path'.
+
+    The first process to construct the game state creates and initialises the segment;
+    later ones attach to it. The segment lives until unlink is called. Every attached
+    process holds a shared flock on '<shm_lock_path>.attached' until it closes or exits,
+    so a process attaching to a segment no other process is attached to knows the segment
+    was left over by an earlier server run. Its users are then cleared if
+    'shm_clear_stale_users' is set, as their sessions are gone unless the session backend
+    outlives the server.
+
+    Sessions must be shared by every process serving the game, or a session created by
+    one worker is unknown to the next, and their expiries must be seen by every
+    process's expiry sweeps, or users of abandoned sessions fill the game until add_user
+    raises GameFullError. See server_config.SHARED_SESSION_BACKENDS.
+    """
+    DEFAULT_CONFIG = dict(DEFAULT_RNG_CONFIG, **{
+        'alert_chance_of_multiply': 0.2,
+        'shm_name': 'useless_machine_game',
+        'shm_capacity': 65536,
+        'shm_lock_path': None,
+        'shm_clear_stale_users': True
+    })
+
+    def __init__(self, config):
+        super().__init__(dict(self.__class__.DEFAULT_CONFIG, **config))
+        # Each process draws from its own generator. Unseeded ones are reseeded in forked
+        # children, as the random module does, so workers don't repeat each other's draws
+        self.rng = create_game_rng(self.config)
+        if self.config['rng_seed'] is None:
+            rng_ref = weakref.ref(self.rng)
+            os.register_at_fork(after_in_child=lambda: rng_ref() and rng_ref().seed())
+        name = self.config['shm_name']
+        self.lock = ProcessLock(
+            self.config['shm_lock_path'] or os.path.join('/tmp', name + '.lock')
+        )
+        self._attach_fd = None
+        with self.lock:
+            capacity = self.config['shm_capacity']
+            try:
+                self.shm = self._open_segment(
+                    name, True, self.__class__._segment_size(capacity)
+                )
+                created = True
+            except FileExistsError:
+                self.shm = self._open_segment(name, False, 0)
+                created = False
+            if not created:
+                header = self.shm.buf[:8 * HEADER_FIELDS].cast('q')
+                capacity = header[HEADER_CAPACITY]
+                header.release()
+            self._map_arrays(capacity)
+            if created:
+                self._initialise()
+            elif self._header[HEADER_MAGIC] != SEGMENT_MAGIC:
+                raise ValueError('shared memory segment {} is not a game state'.format(name))
+            if not self._attach() and not created and self.config['shm_clear_stale_users']:
+                self._reset()
+
+    def _attach(self):
+        """
+        Takes a shared flock on the attach file, held until close. Must be called with
+        the lock held.
+
+        :return bool: whether other processes were already attached
+        """
+        self._attach_fd = os.open(self.lock.path + '.attached', os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(self._attach_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            others_attached = False
+        except BlockingIOError:
+            others_attached = True
+        fcntl.flock(self._attach_fd, fcntl.LOCK_SH)
+        return others_attached
+
+    def _open_segment(self, name, create, size):
+        # The resource tracker would unlink the segment when this process exits, ending
+        # the game for every other process
+        try:
+            self._unregistered = False
+            return shared_memory.SharedMemory(name, create, size, track=False)
+        except TypeError:
+            # Before Python 3.13 tracking can't be turned off, only undone
+            shm = shared_memory.SharedMemory(name, create, size)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            self._unregistered = True
+            return shm
+
+    @staticmethod
+    def _table_size(capacity):
+        return 1 << max(1, math.ceil(math.log2(capacity * 2)))
+
+    @staticmethod
+    def _segment_size(capacity):
+        return (
+            8 * HEADER_FIELDS
+            + capacity * (8 + 16 + 4 + 4 + 4 + 4 + 1)
+            + 4 * SharedMemoryGameState._table_size(capacity)
+        )
+
+    def _map_arrays(self, capacity):
+        """
+        Creates typed views of the segment's arrays. Wider types come first to keep
+        every array aligned.
+        """
+        buf = self.shm.buf
+        offset = 0
+        def view(fmt, item_size, count):
+            nonlocal offset
+            array = buf[offset:offset + item_size * count].cast(fmt)
+            offset += item_size * count
+            return array
+        self.capacity = capacity
+        self.table_size = self.__class__._table_size(capacity)
+        self._header = view('q', 8, HEADER_FIELDS)
+        self._last_pressed = view('d', 8, capacity)
+        self._uuids = view('B', 16, capacity)
+        self._alert_epochs = view('I', 4, capacity)
+        self._order = view('i', 4, capacity)
+        self._order_pos = view('i', 4, capacity)
+        self._free = view('i', 4, capacity)
+        self._table = view('i', 4, self.table_size)
+        self._alert_states = view('b', 1, capacity)
+
+    def _initialise(self):
+        header = self._header
+        header[HEADER_MAGIC] = SEGMENT_MAGIC
+        header[HEADER_CAPACITY] = self.capacity
+        self._reset()
+
+    def _reset(self):
+        header = self._header
+        header[HEADER_NUM_USERS] = 0
+        header[HEADER_NUM_ALERTED] = 0
+        header[HEADER_ALERT_EPOCH] = 0
+        header[HEADER_TOMBSTONES] = 0
+        header[HEADER_FREE_TOP] = self.capacity
+        for i in range(self.capacity):
+            self._free[i] = self.capacity - 1 - i
+        for i in range(self.table_size):
+            self._table[i] = TABLE_EMPTY
+
+    def close(self):
+        """
+        Detaches this process from the segment
+
+        :return None:
+        """
+        for name in (
+                '_header', '_last_pressed', '_uuids', '_alert_epochs', '_order',
+                '_order_pos', '_free', '_table', '_alert_states'
+        ):
+            getattr(self, name).release()
+        self.shm.close()
+        if self._attach_fd is not None:
+            os.close(self._attach_fd)
+            self._attach_fd = None
+
+    def unlink(self):
+        """
+        Destroys the segment once every process has closed it
+
+        :return None:
+        """
+        if self._unregistered:
+            # SharedMemory.unlink before Python 3.13 unregisters from the resource tracker
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+    _convert_uuid = staticmethod(StatefulGameState._convert_uuid)
+
+    #### Slot table ####
+
+    def _uuid_bytes(self, slot):
+        return self._uuids[slot * 16:(slot + 1) * 16].tobytes()
+
+    def _find_slot(self, user_id):
+        """
+        :param UUID user_id:
+
+        :return (int, int): user's slot, or -1 if absent, and the table position probed last
+        """
+        mask = self.table_size - 1
+        key = user_id.bytes
+        pos = user_id.int & mask
+        while True:
+            entry = self._table[pos]
+            if entry == TABLE_EMPTY:
+                return -1, pos
+            if entry != TABLE_TOMBSTONE and self._uuid_bytes(entry) == key:
+                return entry, pos
+            pos = (pos + 1) & mask
+
+    def _table_insert(self, user_id, slot):
+        mask = self.table_size - 1
+        pos = user_id.int & mask
+        while self._table[pos] >= 0:
+            pos = (pos + 1) & mask
+        if self._table[pos] == TABLE_TOMBSTONE:
+            self._header[HEADER_TOMBSTONES] -= 1
+        self._table[pos] = slot
+
+    def _rebuild_table(self):
+        for i in range(self.table_size):
+            self._table[i] = TABLE_EMPTY
+        self._header[HEADER_TOMBSTONES] = 0
+        for pos in range(self._header[HEADER_NUM_USERS]):
+            slot = self._order[pos]
+            self._table_insert(uuid.UUID(bytes=self._uuid_bytes(slot)), slot)
+
+    def _lookup(self, user_id):
+        """
+        :param UUID user_id:
+
+        :return int: user's slot
+
+        :raises UserDoesntExistError:
+        """
+        slot, pos = self._find_slot(user_id)
+        if slot < 0:
+            raise UserDoesntExistError()
+        return slot
+
+    #### Alert partition ####
+
+    def _swap_order(self, i, j):
+        order, order_pos = self._order, self._order_pos
+        slot_i, slot_j = order[i], order[j]
+        order[i], order[j] = slot_j, slot_i
+        order_pos[slot_j] = i
+        order_pos[slot_i] = j
+
+    def _alert_state(self, slot):
+        """
+        :return bool/None: slot's alert state, False if set before the last STOP
+        """
+        if self._alert_epochs[slot] != self._header[HEADER_ALERT_EPOCH]:
+            return False
+        alert_state = self._alert_states[slot]
+        return None if alert_state == ALERT_STATE_NONE else bool(alert_state)
+
+    def _set_alert_state(self, slot, alert_state):
+        header = self._header
+        self._alert_states[slot] = int(alert_state)
+        self._alert_epochs[slot] = header[HEADER_ALERT_EPOCH]
+        pos = self._order_pos[slot]
+        num_alerted = header[HEADER_NUM_ALERTED]
+        if alert_state and pos >= num_alerted:
+            self._swap_order(pos, num_alerted)
+            header[HEADER_NUM_ALERTED] = num_alerted + 1
+        elif not alert_state and pos < num_alerted:
+            header[HEADER_NUM_ALERTED] = num_alerted - 1
+            self._swap_order(pos, num_alerted - 1)
+
+    def _slot_user_id(self, slot):
+        return uuid.UUID(bytes=self._uuid_bytes(slot))
+
+    #### GameState ####
+
+    def user_action(self, user_id, user_action, validated=False):
+        """
+        Handle user action. Updates shared state and responds with user response.
+        Raises UserDoesntExistError if user has not been added to game
+        Raises InvalidUserActionError if an invalid action is supplied
+
+        Overrides GameState.user_action
+        """
+        if not validated:
+            self.__class__.validate_user_action(user_action)
+        user_id = self.__class__._convert_uuid(user_id)
+        validate_user_action_api(user_action)
+        code = user_action['action']['code']
+        alerted_ids = []
+        with self.lock:
+            if code == 'BUTTON_PRESS':
+                result = self.handle_button_press(user_id, user_action, alerted_ids)
+            elif code == 'CHECK_IF_ALERTED':
+                result = self.handle_check_if_alerted(user_id, user_action)
+            elif code == 'START':
+                result = self.handle_start(user_id, user_action, alerted_ids)
+            elif code == 'STOP':
+                result = self.handle_stop(user_id, user_action)
+            else:
+                raise InvalidUserActionError('{} is not a valid action'.format(code))
+        # Listeners are only told about alerts made by this process
+        for alerted_id in alerted_ids:
+            self.notify_alerted(alerted_id)
+        return result
+
+    def add_user(self, user_id):
+        """
+        Add new user to game, taking a free slot.
+        Raises UserAlreadyExistsError if user is already added to game
+        Raises GameFullError if there are no free slots
+
+        Overrides GameState.add_user
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        with self.lock:
+            header = self._header
+            if self._find_slot(user_id)[0] >= 0:
+                raise UserAlreadyExistsError()
+            if header[HEADER_FREE_TOP] == 0:
+                raise GameFullError()
+            header[HEADER_FREE_TOP] -= 1
+            slot = self._free[header[HEADER_FREE_TOP]]
+            self._uuids[slot * 16:(slot + 1) * 16] = user_id.bytes
+            self._last_pressed[slot] = math.nan
+            self._alert_states[slot] = ALERT_STATE_NONE
+            self._alert_epochs[slot] = header[HEADER_ALERT_EPOCH]
+            self._table_insert(user_id, slot)
+            num_users = header[HEADER_NUM_USERS]
+            self._order[num_users] = slot
+            self._order_pos[slot] = num_users
+            header[HEADER_NUM_USERS] = num_users + 1
+
+    def _remove_slot(self, slot, table_pos):
+        header = self._header
+        self._set_alert_state(slot, False)
+        # Swap-remove from the (unalerted end of the) occupied slot array
+        last = header[HEADER_NUM_USERS] - 1
+        self._swap_order(self._order_pos[slot], last)
+        header[HEADER_NUM_USERS] = last
+        self._table[table_pos] = TABLE_TOMBSTONE
+        header[HEADER_TOMBSTONES] += 1
+        self._free[header[HEADER_FREE_TOP]] = slot
+        header[HEADER_FREE_TOP] += 1
+        if header[HEADER_TOMBSTONES] > self.table_size // 4:
+            self._rebuild_table()
+
+    def remove_user(self, user_id):
+        """
+        Remove user from game, freeing their slot.
+        Raises UserDoesntExistError if user has not been added to game
+
+        Overrides GameState.remove_user
+        """
+        user_id = self.__class__._convert_uuid(user_id)
+        with self.lock:
+            slot, table_pos = self._find_slot(user_id)
+            if slot < 0:
+                raise UserDoesntExistError()
+            self._remove_slot(slot, table_pos)
+
+    def remove_users(self, user_ids):
+        """
+        Remove several users from game under one lock acquisition, skipping any that have
+        not been added.
+
+        Overrides GameState.remove_users
+        """
+        user_ids = [self.__class__._convert_uuid(user_id) for user_id in user_ids]
+        with self.lock:
+            for user_id in user_ids:
+                slot, table_pos = self._find_slot(user_id)
+                if slot >= 0:
+                    self._remove_slot(slot, table_pos)
+
+    def clean_up(self):
+        """
+        Clears game state, freeing every slot.
+
+        Overrides GameState.clean_up
+        """
+        with self.lock:
+            self._reset()
+
+    def count_users(self):
+        """
+        Overrides GameState.count_users
+        """
+        return self._header[HEADER_NUM_USERS]
+
+    def count_alerted_users(self):
+        """
+        Overrides GameState.count_alerted_users
+        """
+        return self._header[HEADER_NUM_ALERTED]
+
+    def find_state(self, user_id):
+        """
+        Reads state for user_id. The returned dictionary is a copy, so changes to it are
+        not stored.
+        :param UUID user_id:
+
+        :return state dict:
+
+        :raises UserDoesntExistError:
+        """
+        with self.lock:
+            slot = self._lookup(user_id)
+            last_pressed = self._last_pressed[slot]
+            return {
+                'user_id': user_id,
+                'last_pressed': (
+                    None if math.isnan(last_pressed) else datetime.fromtimestamp(last_pressed)
+                ),
+                'alert_state': self._alert_state(slot)
+            }
+
+    def handle_button_press(self, user_id, user_action, alerted_ids):
+        """
+        Handles button press user action. Updates shared state, removing alert, alerting
+        others and updating last_pressed time. Must be called with the lock held.
+
+        :param UUID user_id:
+        :param dict user_action:
+        :param list alerted_ids: appended with the UUIDs of newly alerted users
+
+        :return dict: user action response
+
+        :raises UserDoesntExistError:
+        """
+        slot = self._lookup(user_id)
+        self._last_pressed[slot] = time.time()
+        self._set_alert_state(slot, False)
+        # Alerts can be passed from the current user to one other user
+        # OR to two users, based on the 'alert_chance_of_multiply' config item
+        num_ids_to_alert = 1 + (self.rng.random() > (1 - self.config['alert_chance_of_multiply']))
+        header = self._header
+        # Own slot was just moved into the unalerted range, so sample one extra to skip it
+        num_alerted, num_users = header[HEADER_NUM_ALERTED], header[HEADER_NUM_USERS]
+        picked = [
+            self._order[pos]
+            for pos in sample_range(
+                self.rng, num_alerted, num_users,
+                min(num_ids_to_alert + 1, num_users - num_alerted)
+            )
+        ]
+        for other_slot in [other for other in picked if other != slot][:num_ids_to_alert]:
+            self._set_alert_state(other_slot, True)
+            alerted_ids.append(self._slot_user_id(other_slot))
+        return self.__class__.create_user_button_press_response(user_id, user_action, True)
+
+    def handle_check_if_alerted(self, user_id, user_action):
+        """
+        Handles check if alerted user action press. Must be called with the lock held.
+
+        :param UUID user_id:
+        :param dict user_action:
+
+        :return dict: user action response
+
+        :raises UserDoesntExistError:
+        """
+        return self.__class__.create_user_check_if_alerted_response(
+            user_id,
+            user_action,
+            self._alert_state(self._lookup(user_id)) or False
+        )
+
+    def handle_start(self, user_id, user_action, alerted_ids):
+        """
+        Handles 'start' user action press. Sets an alert on one random other user.
+        Unsuccessful if there are no other users to alert. Must be called with the lock held.
+
+        :param UUID user_id:
+        :param dict user_action:
+        :param list alerted_ids: appended with the UUID of the newly alerted user
+
+        :return dict: user action response
+        """
+        slot = self._find_slot(user_id)[0]
+        num_users = self._header[HEADER_NUM_USERS]
+        num_candidates = num_users - (slot >= 0)
+        if num_candidates <= 0:
+            return self.__class__.create_user_start_stop_response(user_id, user_action, False)
+        pos = random_index(self.rng, num_candidates)
+        if slot >= 0 and pos >= self._order_pos[slot]:
+            pos += 1
+        other_slot = self._order[pos]
+        self._set_alert_state(other_slot, True)
+        alerted_ids.append(self._slot_user_id(other_slot))
+        return self.__class__.create_user_start_stop_response(user_id, user_action, True)
+
+    def handle_stop(self, user_id, user_action):
+        """
+        Handles 'stop' user action press. O(1): starts a new alert epoch, invalidating
+        every earlier alert. Must be called with the lock held.
+
+        :param UUID user_id:
+        :param dict user_action:
+
+        :return dict: user action response
+        """
+        self._header[HEADER_ALERT_EPOCH] += 1
+        self._header[HEADER_NUM_ALERTED] = 0
+        return self.__class__.create_user_start_stop_response(user_id, user_action, True)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+import base64
+import binascii
+from datetime import datetime, timedelta
+import hashlib
+import heapq
+import hmac
+import secrets
+import struct
+import threading
+import uuid
+
+import session
+
+# Token payload: session UUID and expiry in milliseconds since the epoch
+TOKEN_PAYLOAD = struct.Struct('>16sQ')
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class SignedTokenSessionManager(session.SessionManager):
+    """
+    Session manager issuing self-contained, HMAC-signed session tokens which embed the
+    session id and expiry. Sessions are {'id', 'expiry', 'token'} dicts and clients must
+    send the token back. authenticate_session is a pure CPU check of the token, so any
+    process sharing 'token_secret' can authenticate any session without shared storage;
+    extend_session and touch_session re-sign the token with a later expiry, so the APIs
+    return the new token with every action.
+
+    destroy_session adds the session id to a revocation set, kept until every token
+    issued for the session before its destruction has expired. The revocation set is
+    local to this manager.
+
+    check_expired_sessions only reports expiries if 'token_track_expiries' is set, which
+    must not be done when several processes serve one game: this manager only knows the
+    sessions it created or extended, so it would report sessions another process has
+    since extended, and an expiry_reaper.ExpiryReaper would remove their users from the
+    game. Without tracking, users of abandoned sessions stay in the game.
+
+    'token_secret' defaults to a random secret, so tokens are only valid within one
+    process unless a secret is configured.
+    """
+    REISSUES_SESSIONS = True
+
+    DEFAULT_CONFIG = {
+        'token_secret': None,
+        'token_digest': 'sha256',
+        'token_track_expiries': False
+    }
+
+    def __init__(self, config):
+        super().__init__(dict(self.__class__.DEFAULT_CONFIG, **config))
+        secret = self.config['token_secret']
+        if secret is None:
+            secret = secrets.token_bytes(32)
+        elif isinstance(secret, str):
+            secret = secret.encode()
+        self._secret = secret
+        self._digest = getattr(hashlib, self.config['token_digest'])
+        self._track_expiries = self.config['token_track_expiries']
+        # Longest any token can live, bounding how long revocations must be kept
+        self._max_token_lifetime = timedelta(seconds=max(
+            self.config['expiry_timeout_s'], self.config['expiry_sliding_window_s'], 0
+        ))
+        self._lock = threading.Lock()
+        # id -> when its revocation may be forgotten
+        self._revoked = {}
+        self._revoked_heap = []
+        # id -> latest expiry issued, with a heap of (expiry, id) for expiry sweeps
+        self._expiries = {}
+        self._expiry_heap = []
+
+    #### Tokens ####
+
+    def _sign(self, payload):
+        return hmac.new(self._secret, payload, self._digest).digest()
+
+    def create_token(self, id, expiry):
+        """
+        :param UUID id:
+        :param datetime expiry:
+
+        :return string: signed token
+        """
+        payload = TOKEN_PAYLOAD.pack(id.bytes, int(expiry.timestamp() * 1000))
+        return _b64encode(payload) + '.' + _b64encode(self._sign(payload))
+
+    def parse_token(self, token):
+        """
+        Checks a token's signature and decodes it
+
+        :param string token:
+
+        :return (UUID, datetime): session id and expiry
+
+        :raises session.InvalidSessionError: If the token is malformed or its signature
+            does not match
+        """
+        try:
+            payload_text, signature_text = token.split('.')
+            payload = _b64decode(payload_text)
+            signature = _b64decode(signature_text)
+            id_bytes, expiry_ms = TOKEN_PAYLOAD.unpack(payload)
+        except (AttributeError, ValueError, binascii.Error, struct.error) as error:
+            raise session.InvalidSessionError('invalid session token') from error
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise session.InvalidSessionError('invalid session token signature')
+        return uuid.UUID(bytes=id_bytes), datetime.fromtimestamp(expiry_ms / 1000)
+
+    def _parse_session_token(self, session_details):
+        """
+        :param dict session_details: As returned by new_session, or a SessionContext
+
+        :return (UUID, datetime): session id and expiry
+
+        :raises session.InvalidSessionError: If there is no valid token, or the session
+            details carry a different id
+        """
+        if type(session_details) is session.SessionContext and session_details.parsed:
+            # Checked by resolve_session
+            return session_details.parsed
+        try:
+            token = session_details['token']
+        except (KeyError, TypeError) as error:
+            raise session.InvalidSessionError('no token field in session object') from error
+        id, expiry = self.parse_token(token)
+        if type(session_details) is session.SessionContext:
+            if session_details.id != id:
+                raise session.InvalidSessionError('session id does not match token')
+        elif 'id' in session_details and session.extract_session_id(session_details) != id:
+            raise session.InvalidSessionError('session id does not match token')
+        return id, expiry
+
+    def _issue(self, id, expiry):
+        """
+        Creates session details with a freshly signed token, tracking the expiry for
+        check_expired_sessions if 'token_track_expiries' is set
+
+        :return dict: session details
+        """
+        token = self.create_token(id, expiry)
+        # The token only holds milliseconds
+        expiry = datetime.fromtimestamp(int(expiry.timestamp() * 1000) / 1000)
+        if not self._track_expiries:
+            return {'id': id, 'expiry': expiry, 'token': token}
+        with self._lock:
+            self._expiries[id] = expiry
+            heapq.heappush(self._expiry_heap, (expiry, id))
+            # Drop entries superseded by extensions once they dominate the heap
+            if len(self._expiry_heap) > 2 * len(self._expiries) + 64:
+                self._expiry_heap = [(expiry, id) for id, expiry in self._expiries.items()]
+                heapq.heapify(self._expiry_heap)
+        return {'id': id, 'expiry': expiry, 'token': token}
+
+    def _authenticated_id(self, session_details):
+        """
+        :param dict session_details: As returned by new_session, or a SessionContext
+
+        :return UUID: id of the session, once its token has been checked
+
+        :raises session.InvalidSessionError: If the token is not valid, has expired or
+            the session has been destroyed
+        """
+        id, expiry = self._parse_session_token(session_details)
+        if datetime.now() > expiry:
+            raise session.InvalidSessionError('Session has expired')
+        if id in self._revoked:
+            raise session.InvalidSessionError('Session has been destroyed')
+        return id
+
+    def _prune_revocations(self, now):
+        """
+        Must be called with the lock held
+        """
+        while self._revoked_heap and self._revoked_heap[0][0] < now:
+            forget_after, id = heapq.heappop(self._revoked_heap)
+            if self._revoked.get(id) == forget_after:
+                del self._revoked[id]
+
+    #### SessionManager ####
+
+    def resolve_session(self, session_details):
+        """
+        Checks the token's signature once, taking the session id from it. The context
+        carries the checked token, so later calls with it don't check the signature again.
+
+        Overrides SessionManager.resolve_session
+        """
+        id, expiry = self._parse_session_token(session_details)
+        return session.SessionContext(id, session_details, (id, expiry))
+
+    def new_session(self, credentials):
+        """
+        Creates new session. Signs a token for a new session id *without any
+        authentication*.
+
+        Overrides SessionManager.new_session
+        """
+        return self._issue(
+            uuid.uuid4(), datetime.now() + timedelta(seconds=self.config['expiry_timeout_s'])
+        )
+
+    def authenticate_session(self, session_details):
+        """
+        Authenticates session. Checks the token's signature and expiry, and that the
+        session has not been destroyed. Raises session.InvalidSessionError if any check
+        fails.
+
+        Overrides SessionManager.authenticate_session
+        """
+        self._authenticated_id(session_details)
+
+    def extend_session(self, session_details):
+        """
+        Extends session. Authenticates it, then signs a new token expiring
+        'expiry_sliding_window_s' from now.
+
+        Overrides SessionManager.extend_session
+        """
+        return self._issue(
+            self._authenticated_id(session_details),
+            datetime.now() + timedelta(seconds=self.config['expiry_sliding_window_s'])
+        )
+
+    def touch_session(self, session_details):
+        """
+        extend_session already authenticates, checking the token's signature once.
+
+        Overrides SessionManager.touch_session
+        """
+        return self.extend_session(session_details)
+
+    def destroy_session(self, session_details):
+        """
+        Destroys session. Revokes its id until every token issued for it has expired.
+        Raises session.InvalidSessionError if the token is not valid.
+
+        Overrides SessionManager.destroy_session
+        """
+        id, expiry = self._parse_session_token(session_details)
+        now = datetime.now()
+        forget_after = now + self._max_token_lifetime
+        with self._lock:
+            self._prune_revocations(now)
+            self._revoked[id] = forget_after
+            heapq.heappush(self._revoked_heap, (forget_after, id))
+            if self._track_expiries:
+                # Report the session as expired on the next sweep
+                self._expiries[id] = now
+                heapq.heappush(self._expiry_heap, (now, id))
+
+    def count_sessions(self):
+        """
+        Counts the sessions this manager created or extended that have not been swept.
+        Raises NotImplementedError unless 'token_track_expiries' is set.
+
+        Overrides SessionManager.count_sessions
+        """
+        if not self._track_expiries:
+            return super().count_sessions()
+        return len(self._expiries)
+
+    def check_expired_sessions(self):
+        """
+        Returns the sessions this manager created or extended whose latest expiry has
+        passed since the last call to check_expired_sessions, or none unless
+        'token_track_expiries' is set. Also forgets revocations that have outlived every
+        token they cover.
+
+        Overrides SessionManager.check_expired_sessions
+        """
+        now = datetime.now()
+        expired = {}
+        with self._lock:
+            self._prune_revocations(now)
+            heap = self._expiry_heap
+            while heap and heap[0][0] < now:
+                expiry, id = heapq.heappop(heap)
+                # Stale entry: session already swept or its expiry has since moved
+                if self._expiries.get(id) != expiry:
+                    continue
+                del self._expiries[id]
+                expired[id] = {'id': id, 'expiry': expiry}
+        return expired
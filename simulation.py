@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+
+import heapq
+import json
+import math
+import random
+import sys
+import time
+import uuid
+
+from benchmark.harness import percentile
+from clock import ManualClock, SECOND_NS, seconds_to_ns
+from expiry_reaper import ExpiryReaper
+from game_state import InvalidUserActionError, UserAlreadyExistsError, UserDoesntExistError
+from session import InvalidSessionError
+from stateful_game_state import API_NAME, API_VERSION, StatefulGameState
+from stateful_ticket_session import StatefulTicketSessionManager
+
+# Offline game simulation for capacity planning. A Simulation drives a game state and a
+# StatefulTicketSessionManager with a synthetic player population on a virtual
+# clock.ManualClock, so hours of play run in seconds, and reports alert dynamics, state
+# size and the real cost of each operation. Simulations can record the actions they
+# take as an action log, which replay drives against any game state backend.
+
+# Action logs are JSON lines shaped like event_log events: 'time', 'event' and fields.
+# 'user_action' events logged by StatefulGameState itself can be replayed too; their
+# users are added on first sight.
+ACTION_LOG_EVENTS = ('add_user', 'remove_user', 'user_action')
+GAME_ERRORS = (InvalidUserActionError, UserAlreadyExistsError, UserDoesntExistError)
+
+RATE_DISTRIBUTIONS = ('constant', 'exponential', 'lognormal')
+
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': API_NAME,
+            'version': API_VERSION
+        },
+        'action': {'code': code}
+    }
+
+
+def draw_rate(rng, distribution, mean, sigma):
+    """
+    Draws one player's action rate
+
+    :param random.Random rng:
+    :param string distribution: one of RATE_DISTRIBUTIONS
+    :param float mean: mean rate across players
+    :param float sigma: spread of the lognormal distribution
+
+    :return float: actions per second
+
+    :raises ValueError: If distribution is unknown
+    """
+    if distribution == 'constant':
+        return mean
+    if distribution == 'exponential':
+        return rng.expovariate(1 / mean)
+    if distribution == 'lognormal':
+        return rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+    raise ValueError('unknown rate distribution {}'.format(distribution))
+
+
+def percentiles(values):
+    """
+    :param list values:
+
+    :return dict: count, mean, p50 and p99 of values, None where there are none
+    """
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else None,
+        'p50': percentile(values, 0.5),
+        'p99': percentile(values, 0.99)
+    }
+
+
+def estimate_state_bytes(game_state):
+    """
+    Estimates the memory held by a StatefulGameState, or the rooms of a
+    game_rooms.GameRoomManager: its state dictionary, user records and alert index
+
+    :param game_state.GameState game_state:
+
+    :return int: bytes, or None for other backends
+    """
+    rooms = getattr(game_state, 'rooms', None)
+    if rooms is not None:
+        sizes = [estimate_state_bytes(room) for room in list(rooms.values())]
+        return None if None in sizes else sum(sizes)
+    state = getattr(game_state, 'state', None)
+    if not isinstance(state, dict):
+        return None
+    getsizeof = sys.getsizeof
+    return (
+        getsizeof(state) + sum(getsizeof(record) for record in state.values())
+        + game_state.alert_index.size_bytes()
+    )
+
+
+class Player:
+    """
+    One simulated player: their session and how often they act
+    """
+    __slots__ = ('session', 'rate_per_s', 'leave_ns')
+
+    def __init__(self, session, rate_per_s, leave_ns):
+        self.session = session
+        self.rate_per_s = rate_per_s
+        self.leave_ns = leave_ns
+
+
+class Simulation:
+    """
+    Simulates a population of players on a virtual clock.
+
+    'users' players log in at the start and further players arrive at
+    'login_rate_per_s'. Each player acts at their own rate, drawn from
+    'rate_distribution' around 'mean_action_rate_per_s', and plays for an exponentially
+    distributed time averaging 'mean_session_s', or forever if None. Every action
+    extends the player's session and checks whether they are alerted: alerted players
+    press the button, others take an action drawn from 'idle_action_weights'. Players
+    whose session expired while they were away log in again. Departed players' sessions
+    expire and an ExpiryReaper removes their users every 'sweep_interval_s'.
+
+    Every 'sample_interval_s' the user, session and alerted counts, alerts and presses
+    since the last sample and the estimated state size are sampled. The real time taken
+    by every game state and session manager call is recorded by operation.
+    """
+    DEFAULT_CONFIG = {
+        'users': 1000,
+        'duration_s': 600,
+        'rate_distribution': 'exponential',
+        'mean_action_rate_per_s': 0.5,
+        'rate_sigma': 1.0,
+        'idle_action_weights': {
+            'CHECK_IF_ALERTED': 90, 'BUTTON_PRESS': 8, 'START': 1.5, 'STOP': 0.5
+        },
+        'login_rate_per_s': 0,
+        'mean_session_s': None,
+        'expiry_timeout_s': 100,
+        'expiry_sliding_window_s': 60,
+        'sweep_interval_s': 5,
+        'sample_interval_s': 10,
+        'seed': 0,
+        'game_config': {'alert_chance_of_multiply': 0.2}
+    }
+
+    def __init__(self, config, game_state=None, record=None):
+        """
+        :param dict config:
+        :param game_state.GameState game_state: backend to drive, by default a
+            StatefulGameState from 'game_config', seeded from 'seed'
+        :param callable record: called with each action log event the simulation takes
+        """
+        self.config = dict(self.__class__.DEFAULT_CONFIG, **config)
+        if self.config['rate_distribution'] not in RATE_DISTRIBUTIONS:
+            raise ValueError('unknown rate distribution {}'.format(
+                self.config['rate_distribution']
+            ))
+        self.rng = random.Random(self.config['seed'])
+        self.clock = ManualClock(wall_offset_ns=0)
+        self.session_manager = StatefulTicketSessionManager({
+            'expiry_timeout_s': self.config['expiry_timeout_s'],
+            'expiry_sliding_window_s': self.config['expiry_sliding_window_s'],
+            'clock': self.clock
+        })
+        if game_state is None:
+            game_state = StatefulGameState(dict(
+                self.config['game_config'], rng_seed=self.rng.getrandbits(64)
+            ))
+        self.game_state = game_state
+        self.game_state.add_alert_listener(self._on_alerted)
+        self.reaper = ExpiryReaper(self.session_manager, self.game_state, None)
+        self.record = record
+        codes, weights = zip(*self.config['idle_action_weights'].items())
+        self._idle_codes, self._idle_weights = list(codes), list(weights)
+        self._actions = {code: create_user_action(code) for code in (
+            'CHECK_IF_ALERTED', 'BUTTON_PRESS', 'START', 'STOP'
+        )}
+        self._events = []
+        self._sequence = 0
+        # User id -> virtual time they were last alerted, until they press or STOP
+        self._alerted_at = {}
+        self.operations = {}
+        self.samples = []
+        self.alert_dismissal_s = []
+        self.totals = dict.fromkeys((
+            'logins', 'relogins', 'expired_sessions', 'actions', 'presses', 'alerts', 'stops'
+        ), 0)
+        self._interval = {'alerts': 0, 'presses': 0}
+
+    #### Event queue ####
+
+    def _schedule(self, at_ns, kind, player=None):
+        self._sequence += 1
+        heapq.heappush(self._events, (at_ns, self._sequence, kind, player))
+
+    def _timed(self, name, operation, *args):
+        start = time.perf_counter_ns()
+        try:
+            return operation(*args)
+        finally:
+            self.operations.setdefault(name, []).append(time.perf_counter_ns() - start)
+
+    def _record(self, event, **fields):
+        if self.record is not None:
+            self.record(dict(
+                {'time': self.clock.now_ns() / SECOND_NS, 'event': event}, **fields
+            ))
+
+    def _on_alerted(self, user_id):
+        self._alerted_at[user_id] = self.clock.now_ns()
+        self.totals['alerts'] += 1
+        self._interval['alerts'] += 1
+
+    #### Players ####
+
+    def _log_in(self):
+        """
+        :return dict: new session, whose user has been added to the game
+        """
+        session = self._timed('login', self.session_manager.new_session, {})
+        self._timed('add_user', self.game_state.add_user, session['id'])
+        self._record('add_user', user_id=str(session['id']))
+        self.totals['logins'] += 1
+        return session
+
+    def _next_action_ns(self, player):
+        return self.clock.now_ns() + seconds_to_ns(self.rng.expovariate(player.rate_per_s))
+
+    def _arrive(self):
+        config = self.config
+        rate = draw_rate(
+            self.rng, config['rate_distribution'], config['mean_action_rate_per_s'],
+            config['rate_sigma']
+        )
+        leave_ns = None
+        if config['mean_session_s'] is not None:
+            leave_ns = self.clock.now_ns() + seconds_to_ns(
+                self.rng.expovariate(1 / config['mean_session_s'])
+            )
+        player = Player(self._log_in(), rate, leave_ns)
+        self._schedule(self._next_action_ns(player), 'act', player)
+
+    def _user_action(self, user_id, code):
+        result = self._timed(code, self.game_state.user_action, user_id, self._actions[code])
+        self._record('user_action', user_id=str(user_id), code=code)
+        self.totals['actions'] += 1
+        return result
+
+    def _act(self, player):
+        if player.leave_ns is not None and self.clock.now_ns() >= player.leave_ns:
+            # Gone: their session is left to expire
+            return
+        try:
+            player.session = self._timed(
+                'touch_session', self.session_manager.touch_session, player.session
+            )
+        except InvalidSessionError:
+            player.session = self._log_in()
+            self.totals['relogins'] += 1
+        user_id = player.session['id']
+        result = self._user_action(user_id, 'CHECK_IF_ALERTED')
+        if result['response']['alerted']:
+            code = 'BUTTON_PRESS'
+        else:
+            code = self.rng.choices(self._idle_codes, self._idle_weights)[0]
+        if code == 'BUTTON_PRESS':
+            alerted_at = self._alerted_at.pop(user_id, None)
+            if alerted_at is not None:
+                self.alert_dismissal_s.append((self.clock.now_ns() - alerted_at) / SECOND_NS)
+            self.totals['presses'] += 1
+            self._interval['presses'] += 1
+        elif code == 'STOP':
+            self._alerted_at.clear()
+            self.totals['stops'] += 1
+        if code != 'CHECK_IF_ALERTED':
+            self._user_action(user_id, code)
+        self._schedule(self._next_action_ns(player), 'act', player)
+
+    #### Periodic events ####
+
+    def _sweep(self):
+        expired = self._timed('sweep', self.reaper.reap)
+        for user_id in expired:
+            self._alerted_at.pop(user_id, None)
+            self._record('remove_user', user_id=str(user_id))
+        self.totals['expired_sessions'] += len(expired)
+        self._schedule(
+            self.clock.now_ns() + seconds_to_ns(self.config['sweep_interval_s']), 'sweep'
+        )
+
+    def _sample(self):
+        alerted_users = self.game_state.count_alerted_users()
+        users = self.game_state.count_users()
+        self.samples.append(dict({
+            't_s': self.clock.now_ns() / SECOND_NS,
+            'users': users,
+            'sessions': self.session_manager.count_sessions(),
+            'alerted_users': alerted_users,
+            'alerted_fraction': alerted_users / users if users else 0,
+            'state_bytes': estimate_state_bytes(self.game_state)
+        }, **self._interval))
+        self._interval = {'alerts': 0, 'presses': 0}
+        self._schedule(
+            self.clock.now_ns() + seconds_to_ns(self.config['sample_interval_s']), 'sample'
+        )
+
+    def _login(self):
+        self._arrive()
+        self._schedule(
+            self.clock.now_ns()
+            + seconds_to_ns(self.rng.expovariate(self.config['login_rate_per_s'])),
+            'login'
+        )
+
+    def run(self):
+        """
+        Runs the simulation for 'duration_s' virtual seconds
+
+        :return dict: virtual_s, wall_s, speedup, totals, samples, alert_dismissal_s
+            percentiles and operations, the real latencies of each operation in ns
+        """
+        wall_start = time.perf_counter()
+        end_ns = seconds_to_ns(self.config['duration_s'])
+        for i in range(self.config['users']):
+            self._arrive()
+        self._sample()
+        self._schedule(seconds_to_ns(self.config['sweep_interval_s']), 'sweep')
+        if self.config['login_rate_per_s']:
+            self._schedule(
+                seconds_to_ns(self.rng.expovariate(self.config['login_rate_per_s'])), 'login'
+            )
+        handlers = {
+            'act': self._act, 'sweep': self._sweep, 'sample': self._sample,
+            'login': self._login
+        }
+        events = self._events
+        while events and events[0][0] <= end_ns:
+            at_ns, sequence, kind, player = heapq.heappop(events)
+            self.clock.advance_to(at_ns)
+            if player is None:
+                handlers[kind]()
+            else:
+                handlers[kind](player)
+        wall_s = time.perf_counter() - wall_start
+        return {
+            'virtual_s': self.config['duration_s'],
+            'wall_s': wall_s,
+            'speedup': self.config['duration_s'] / wall_s if wall_s else None,
+            'totals': dict(self.totals),
+            'samples': self.samples,
+            'alert_dismissal_s': percentiles(self.alert_dismissal_s),
+            'operations': self.operations
+        }
+
+
+#### Replay ####
+
+def read_action_log(path):
+    """
+    Reads an action log, skipping events other than ACTION_LOG_EVENTS, e.g. the
+    'alerted' events of a game's event log
+
+    :param string path: JSON lines file
+
+    :return generator: event dicts
+    """
+    with open(path) as log_file:
+        for line in log_file:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event.get('event') in ACTION_LOG_EVENTS:
+                yield event
+
+
+def replay(events, game_state):
+    """
+    Applies action log events to a game state as fast as it takes them, timing each.
+    Users acting before they have been added are added first.
+
+    :param iterable events: action log event dicts
+    :param game_state.GameState game_state:
+
+    :return dict: operations, the latencies of each operation in ns, errors, the number
+        of events the game state rejected, and elapsed_ns
+    """
+    perf_counter_ns = time.perf_counter_ns
+    operations = {}
+    actions = {}
+    known_users = set()
+    errors = 0
+    start = perf_counter_ns()
+    for event in events:
+        user_id = uuid.UUID(event['user_id'])
+        kind = event['event']
+        if kind == 'user_action':
+            if user_id not in known_users:
+                known_users.add(user_id)
+                try:
+                    game_state.add_user(user_id)
+                except UserAlreadyExistsError:
+                    pass
+            name = event['code']
+            if name not in actions:
+                actions[name] = create_user_action(name)
+            operation, args = game_state.user_action, (user_id, actions[name])
+        elif kind == 'add_user':
+            known_users.add(user_id)
+            name, operation, args = kind, game_state.add_user, (user_id,)
+        else:
+            known_users.discard(user_id)
+            name, operation, args = kind, game_state.remove_user, (user_id,)
+        op_start = perf_counter_ns()
+        try:
+            operation(*args)
+        except GAME_ERRORS:
+            errors += 1
+        operations.setdefault(name, []).append(perf_counter_ns() - op_start)
+    return {
+        'operations': operations,
+        'errors': errors,
+        'elapsed_ns': perf_counter_ns() - start
+    }
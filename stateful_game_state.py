@@ -1,23 +1,90 @@
 #!/usr/bin/env python3
 
 from datetime import datetime
-import random
 import uuid
 
+from alert_index import AlertIndex
+from event_log import EventLog
+from game_random import DEFAULT_RNG_CONFIG, create_game_rng
+from game_stats import GameStats
+from helpers import get_id_key_codec
 from game_state import (
     GameState, InvalidUserActionError, UserAlreadyExistsError, UserDoesntExistError
 )
+from user_record import get_user_record_factory
 
 API_NAME = 'stateful'
 API_VERSION = 1
 
+def validate_user_action_api(user_action):
+    """
+    Checks a schema-valid user_action is addressed to this API name and version
+
+    :param dict user_action:
+
+    :return None:
+
+    :raises InvalidUserActionError:
+    """
+    if user_action['api']['name'] != API_NAME:
+        raise InvalidUserActionError(
+            '{} is a different API name to the one offered'.format(user_action['api']['name'])
+        )
+    if user_action['api']['version'] != API_VERSION:
+        raise InvalidUserActionError(
+            '{} is a different API version to the one offered'.format(
+                user_action['api']['version']
+            )
+        )
+
 class StatefulGameState(GameState):
     """
     Locally stateful implementation of game_state.GameState.
+
+    Alongside the per-user state dictionary an AlertIndex partitions users by alert
+    state, so alerts can be handed to random users without scanning the whole game.
+    User alert states must therefore only be changed through this class.
+
+    STOP does not visit user records. Instead it bumps a game-wide alert epoch and each
+    record remembers the epoch its alert_state was set in; find_state resets records
+    from earlier epochs to unalerted as they are next looked up.
+
+    User records are dictionaries by default. Setting the 'user_records' config item to
+    'slots' stores them as compact user_record.UserRecord objects instead, which support
+    the same item access.
+
+    Users are keyed by UUID by default. Setting the 'id_keys' config item to 'int' keys
+    state and the alert index by the UUID's 128-bit integer instead, which is cheaper to
+    hash. Methods still take UUIDs and listeners are still notified with UUIDs.
+
+    Game events are emitted to an event_log.EventLog, sampled at 'event_sample_rate'.
+
+    Alerts are handed out with the game's own random number generator, seeded by the
+    'rng_seed' config item, see game_random.create_game_rng.
+
+    Statistics are kept incrementally in a game_stats.GameStats, the 'stats' config
+    item if set, updated once per call.
+
+    Not thread safe on its own: game_rooms.GameRoomManager serialises calls per room.
     """
+    DEFAULT_CONFIG = dict(DEFAULT_RNG_CONFIG, **{
+        'alert_chance_of_multiply': 0.2,
+        'user_records': 'dict',
+        'id_keys': 'uuid',
+        'event_sample_rate': 1.0,
+        'stats': None
+    })
+
     def __init__(self, config):
         self.state = {}
-        super().__init__(config)
+        self.alert_index = AlertIndex()
+        self.alert_epoch = 0
+        super().__init__(dict(self.__class__.DEFAULT_CONFIG, **config))
+        self._create_user_record = get_user_record_factory(self.config['user_records'])
+        self._to_key, self._from_key = get_id_key_codec(self.config['id_keys'])
+        self.events = EventLog('stateful_game_state', self.config['event_sample_rate'])
+        self.stats = self.config['stats'] or GameStats()
+        self.rng = create_game_rng(self.config)
 
     @staticmethod
     def _convert_uuid(id):
@@ -36,7 +103,7 @@ class StatefulGameState(GameState):
             raise UserDoesntExistError('invalid user uuid') from error
         return id
     
-    def user_action(self, user_id, user_action):
+    def user_action(self, user_id, user_action, validated=False):
         """
         Handle user action. Updates internal state and responds with user response.
         Raises UserDoesntExistError if user is already added to game
@@ -44,19 +111,15 @@ class StatefulGameState(GameState):
 
         Overrides GameState.user_action
         """
-        print({k:v['alert_state'] for k,v in self.state.items()})
         result = None
-        self.__class__.validate_user_action(user_action)
+        if not validated:
+            self.__class__.validate_user_action(user_action)
         user_id = self.__class__._convert_uuid(user_id)
-        if user_action['api']['name'] != API_NAME:
-            raise InvalidUserActionError(
-                '{} is a different API name to the one offered'.format(user_action['api']['name'])
-            )
-        if user_action['api']['version'] != API_VERSION:
-            raise InvalidUserActionError(
-                '{} is a different API version to the one offered'.format(
-                    user_action['api']['version']
-                )
+        validate_user_action_api(user_action)
+        if self.events.enabled:
+            self.events.event(
+                'user_action', user_id=user_id, code=user_action['action']['code'],
+                num_alerted=self.alert_index.num_alerted
             )
         if user_action['action']['code'] == 'BUTTON_PRESS':
             result = self.handle_button_press(user_id, user_action)
@@ -78,14 +141,13 @@ class StatefulGameState(GameState):
         Overrides GameState.add_user
         """
         user_id = self.__class__._convert_uuid(user_id)
-        if user_id in self.state.keys():
+        key = self._to_key(user_id)
+        if key in self.state:
             raise UserAlreadyExistsError()
 
-        self.state[user_id] = {
-            'user_id': user_id,
-            'last_pressed': None,
-            'alert_state': None
-        }
+        self.state[key] = self._create_user_record(user_id, self.alert_epoch)
+        self.alert_index.add(key)
+        self.stats.add_users(1)
 
     def remove_user(self, user_id):
         """
@@ -94,11 +156,14 @@ class StatefulGameState(GameState):
 
         Overrides GameState.remove_user
         """
-        user_id = self.__class__._convert_uuid(user_id)
+        key = self._to_key(self.__class__._convert_uuid(user_id))
         try:
-            del self.state[user_id]
+            del self.state[key]
         except KeyError as error:
             raise UserDoesntExistError() from error
+        num_alerted = self.alert_index.num_alerted
+        self.alert_index.remove(key)
+        self.stats.add_users(-1, self.alert_index.num_alerted - num_alerted)
 
     def clean_up(self):
         """
@@ -106,11 +171,48 @@ class StatefulGameState(GameState):
 
         Overrides GameState.clean_up
         """
+        self.stats.add_users(-len(self.state), -self.alert_index.num_alerted)
         self.state = {}
+        self.alert_index.clear()
+
+    def count_users(self):
+        """
+        Overrides GameState.count_users
+        """
+        return len(self.state)
+
+    def count_alerted_users(self):
+        """
+        Overrides GameState.count_alerted_users
+        """
+        return self.alert_index.num_alerted
+
+    def get_stats(self):
+        """
+        Overrides GameState.get_stats
+        """
+        return self.stats.to_dict()
+
+    def _set_alert_state(self, user_id, state, alert_state):
+        """
+        Sets a user's alert state, keeping the alert index in step. Callers update the
+        stats, once for all the alerts an action changes.
+
+        :param UUID user_id:
+        :param dict state: user's state, as returned by find_state
+        :param bool alert_state:
+
+        :return None:
+        """
+        state['alert_state'] = alert_state
+        state['alert_epoch'] = self.alert_epoch
+        self.alert_index.set_alerted(self._to_key(user_id), alert_state)
+        if alert_state and self.alert_listeners:
+            self.notify_alerted(user_id)
 
     def find_state(self, user_id):
         """
-        Searches for state for user_id
+        Searches for state for user_id. Clears any alert set before the last STOP.
         :param UUID user_id:
 
         :return state dict:
@@ -119,9 +221,12 @@ class StatefulGameState(GameState):
         """
         state = None
         try:
-            state = self.state[user_id]
+            state = self.state[self._to_key(user_id)]
         except KeyError as error:
             raise UserDoesntExistError() from error
+        if state['alert_epoch'] != self.alert_epoch:
+            state['alert_state'] = False
+            state['alert_epoch'] = self.alert_epoch
         return state
 
     def handle_button_press(self, user_id, user_action):
@@ -138,19 +243,21 @@ class StatefulGameState(GameState):
         """
         state = self.find_state(user_id)
         state['last_pressed'] = datetime.now()
-        state['alert_state'] = False
+        num_alerted = self.alert_index.num_alerted
+        self._set_alert_state(user_id, state, False)
         # Alerts can be passed from the current user to one other user
         # OR to two users, based on the 'alert_chance_of_multiply' config item
-        num_ids_to_alert = 1 + (random.random() > (1 - self.config['alert_chance_of_multiply']))
-        other_users_state = [
-            state for (id, state) in self.state.items()
-            if id != user_id and not state['alert_state']
-        ]
-        if num_ids_to_alert > len(other_users_state):
-            num_ids_to_alert = len(other_users_state)
-        for other_user_state in random.sample(other_users_state, num_ids_to_alert):
-            other_user_state['alert_state'] = True
-            print('{} {}'.format(other_user_state['user_id'], 'alerted'))
+        num_ids_to_alert = 1 + (self.rng.random() > (1 - self.config['alert_chance_of_multiply']))
+        events_enabled = self.events.enabled
+        for other_key in self.alert_index.sample_unalerted(
+                num_ids_to_alert, self._to_key(user_id), self.rng
+        ):
+            other_state = self.state[other_key]
+            other_id = other_state['user_id']
+            self._set_alert_state(other_id, other_state, True)
+            if events_enabled:
+                self.events.event('alerted', user_id=other_id, by=user_id)
+        self.stats.record_press(self.alert_index.num_alerted - num_alerted)
         return self.__class__.create_user_button_press_response(user_id, user_action, True)
 
     def handle_check_if_alerted(self, user_id, user_action):
@@ -174,34 +281,41 @@ class StatefulGameState(GameState):
     def handle_start(self, user_id, user_action):
         """
         Handles 'start' user action press. Updates internal state, setting an alert
-        on one random user
+        on one random user. Unsuccessful if there are no other users to alert.
 
         :param UUID user_id:
         :param dict user_action:
 
         :return dict: user action response
         """
-        user_id = self.__class__._convert_uuid(user_id)
-        other_ids = [id for id in self.state.keys() if id != user_id];
-        id_pos = random.randint(0, len(other_ids) - 1)
-        self.state[other_ids[id_pos]]['alert_state'] = True
+        other_key = self.alert_index.random_user(self._to_key(user_id), self.rng)
+        if other_key is not None:
+            other_state = self.state[other_key]
+            num_alerted = self.alert_index.num_alerted
+            self._set_alert_state(other_state['user_id'], other_state, True)
+            self.stats.add_alerted_users(self.alert_index.num_alerted - num_alerted)
+            if self.events.enabled:
+                self.events.event('alerted', user_id=other_state['user_id'], by=user_id)
         return self.__class__.create_user_start_stop_response(
             user_id,
             user_action,
-            True
+            other_key is not None
         )
 
     def handle_stop(self, user_id, user_action):
         """
-        Handles 'stop' user action press. Updates internal state, removing all user alerts
+        Handles 'stop' user action press. Updates internal state, removing all user alerts.
+        O(1): starts a new alert epoch, invalidating every earlier alert, rather than
+        visiting user records.
 
         :param UUID user_id:
         :param dict user_action:
 
         :return dict: user action response
         """
-        for id, state in self.state.items():
-            state['alert_state'] = False
+        self.alert_epoch += 1
+        self.stats.add_alerted_users(-self.alert_index.num_alerted)
+        self.alert_index.clear_alerts()
         return self.__class__.create_user_start_stop_response(
             user_id,
             user_action,
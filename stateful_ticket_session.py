@@ -1,31 +1,109 @@
 #!/usr/bin/env python3
 
-from datetime import datetime, timedelta
+import heapq
+import threading
+from types import MappingProxyType
 import uuid
 
+from clock import MonotonicClock, seconds_to_ns
+from helpers import get_id_key_codec
 import session
 
+class SessionStripe:
+    """
+    One lock-protected shard of a StatefulTicketSessionManager's sessions, holding the
+    sessions themselves, their expiry as clock timestamps and a min-heap of (expiry, id)
+    entries indexing them.
+    """
+    __slots__ = ('lock', 'sessions', 'expiries', 'expiry_heap')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.expiries = {}
+        self.expiry_heap = []
+
 class StatefulTicketSessionManager(session.SessionManager):
     """
     Session manager that creates unauthenticated session tickets and stores the state
     of these locally. 
+
+    Sessions are sharded by id across 'lock_stripes' SessionStripes so that threads
+    working on different sessions rarely contend for the same lock. Alongside each
+    stripe's sessions an expiry index is kept: a min-heap of (expiry, id) entries. Every
+    expiry change pushes a new entry and superseded entries are lazily discarded when
+    they reach the top of the heap, so check_expired_sessions only touches sessions
+    that have actually expired.
+
+    Sessions are keyed by UUID by default. Setting the 'id_keys' config item to 'int'
+    keys them by the UUID's 128-bit integer instead, which is cheaper to hash. Methods
+    still take and return UUIDs.
+
+    touch_session can coalesce extensions: with 'extend_coalesce_ms' set, a session
+    whose expiry would move on by less than that is left as it is, sparing the expiry
+    heap an entry per request for sessions in constant use.
+
+    Expiry is tracked as integer nanosecond timestamps from the 'clock' config item, a
+    clock.Clock defaulting to a clock.MonotonicClock, so it is unaffected by wall clock
+    changes. Only the 'expiry' of the sessions handed out is a wall clock datetime.
     """
+    DEFAULT_CONFIG = {
+        'lock_stripes': 16,
+        'id_keys': 'uuid',
+        'clock': None,
+        'extend_coalesce_ms': 0
+    }
+    # Rebuild a stripe's expiry heap when it holds this many times more entries than
+    # there are live sessions, bounding the memory used by superseded entries
+    EXPIRY_HEAP_COMPACTION_FACTOR = 4
+
     def __init__(self, config):
-        self.sessions = {}
-        super().__init__(config)
-
-    @staticmethod
-    def _extract_session_id_from_session_obj(session):
-        id = None
-        try:
-            id = session['id']
-            id = uuid.UUID(id)
-        except (KeyError, TypeError) as error:
-            raise session.InvalidSessionError('no id field in session object') from error
-        except Value as error:
-            raise session.InvalidSessionError('invalid id field in session object') from error
-        return id
-    
+        super().__init__(dict(self.__class__.DEFAULT_CONFIG, **config))
+        self._stripes = tuple(SessionStripe() for i in range(self.config['lock_stripes']))
+        self._to_key, self._from_key = get_id_key_codec(self.config['id_keys'])
+        self.clock = self.config['clock'] or MonotonicClock()
+        self._now_ns = self.clock.now_ns
+
+    @property
+    def sessions(self):
+        """
+        :return Mapping: Read-only copy of the sessions of every stripe, keyed by id key,
+            see 'id_keys'
+        """
+        sessions = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                sessions.update(stripe.sessions)
+        return MappingProxyType(sessions)
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _index_expiry(self, stripe, key, expiry):
+        """
+        Records a session's new expiry time and pushes it on its stripe's expiry heap.
+        Any earlier entry for the same session becomes stale and is skipped by
+        check_expired_sessions. Must be called with the stripe's lock held.
+
+        :param SessionStripe stripe:
+        :param key: session id key
+        :param int expiry: clock timestamp
+
+        :return None:
+        """
+        stripe.expiries[key] = expiry
+        heapq.heappush(stripe.expiry_heap, (expiry, key))
+        if len(stripe.expiry_heap) > (
+                self.__class__.EXPIRY_HEAP_COMPACTION_FACTOR * (len(stripe.sessions) + 1)
+        ):
+            stripe.expiry_heap = [
+                (session_expiry, session_key)
+                for (session_key, session_expiry) in stripe.expiries.items()
+            ]
+            heapq.heapify(stripe.expiry_heap)
+
+    _extract_session_id_from_session_obj = staticmethod(session.extract_session_id)
+
     def new_session(self, credentials):
         """
         Creates new session. Creates new session ticket in local dictionary 
@@ -33,14 +111,16 @@ class StatefulTicketSessionManager(session.SessionManager):
 
         Overrides SessionManager.new_session
         """
+        expiry = self._now_ns() + seconds_to_ns(self.config['expiry_timeout_s'])
         session_result = {
             'id': uuid.uuid4(),
-            'expiry': (
-                datetime.now()
-                + timedelta(seconds=self.config['expiry_timeout_s'])
-            )
+            'expiry': self.clock.to_datetime(expiry)
         }
-        self.sessions[session_result['id']] = session_result
+        key = self._to_key(session_result['id'])
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.sessions[key] = session_result
+            self._index_expiry(stripe, key, expiry)
         return session_result
     
     def extend_session(self, session_details):
@@ -51,38 +131,42 @@ class StatefulTicketSessionManager(session.SessionManager):
 
         Overrides SessionManager.extend_session
         """
-        id = self.__class__._extract_session_id_from_session_obj(session_details) 
-
-        try: 
-            current_expiry = self.sessions[id]['expiry']
-            now = datetime.now()
+        key = self._to_key(self.__class__._extract_session_id_from_session_obj(session_details))
+        stripe = self._stripe(key)
+
+        with stripe.lock:
+            try: 
+                current_expiry = stripe.expiries[key]
+            except KeyError as error:
+                raise session.InvalidSessionError('Unknown session') from error
+            now = self._now_ns()
             if now > current_expiry:
                 raise session.InvalidSessionError('Session has expired')
-            self.sessions[id]['expiry'] = (
-                datetime.now()
-                + timedelta(seconds=self.config['expiry_sliding_window_s'])
-            )
-        except KeyError as error:
-            raise session.InvalidSessionError('Unknown session') from error
-
-        return self.sessions[id]
+            expiry = now + seconds_to_ns(self.config['expiry_sliding_window_s'])
+            session_result = stripe.sessions[key]
+            session_result['expiry'] = self.clock.to_datetime(expiry)
+            self._index_expiry(stripe, key, expiry)
+            return session_result
     
     def destroy_session(self, session_details):
         """
         Destroys existing session. Checks local dictionary and updates
-        stored existing session with in-the-past expiry time if it exists. Raises
+        stored existing session with an expiry time just past if it exists. Raises
         session.InvalidSessionError if it does not.
 
         Overrides SessionManager.extend_session
         """
-        id = self.__class__._extract_session_id_from_session_obj(session_details) 
-
-        try: 
-            self.sessions[id]['expiry'] = (
-                datetime.now()
-            )
-        except KeyError as error:
-            raise session.InvalidSessionError('Unknown session') from error
+        key = self._to_key(self.__class__._extract_session_id_from_session_obj(session_details))
+        stripe = self._stripe(key)
+
+        with stripe.lock:
+            try: 
+                session_result = stripe.sessions[key]
+            except KeyError as error:
+                raise session.InvalidSessionError('Unknown session') from error
+            expiry = self._now_ns() - 1
+            session_result['expiry'] = self.clock.to_datetime(expiry)
+            self._index_expiry(stripe, key, expiry)
 
     def authenticate_session(self, session_details):
         """
@@ -92,28 +176,72 @@ class StatefulTicketSessionManager(session.SessionManager):
 
         Overrides SessionManager.authenticate_session
         """
-        id = self.__class__._extract_session_id_from_session_obj(session_details) 
+        key = self._to_key(self.__class__._extract_session_id_from_session_obj(session_details))
+        stripe = self._stripe(key)
+
+        with stripe.lock:
+            try: 
+                current_expiry = stripe.expiries[key]
+            except KeyError as error:
+                raise session.InvalidSessionError('Unknown session') from error
+        if self._now_ns() > current_expiry:
+            raise session.InvalidSessionError('Session has expired')
+
+    def touch_session(self, session_details):
+        """
+        Authenticates and extends existing session with a single lookup under its
+        stripe's lock. Skips the extension if it would move the expiry by no more than
+        'extend_coalesce_ms'. Raises session.InvalidSessionError if the session does not
+        exist or has expired.
 
-        try: 
-            current_expiry = self.sessions[id]['expiry']
-            now = datetime.now()
+        Overrides SessionManager.touch_session
+        """
+        key = self._to_key(self.__class__._extract_session_id_from_session_obj(session_details))
+        stripe = self._stripe(key)
+
+        with stripe.lock:
+            try: 
+                current_expiry = stripe.expiries[key]
+            except KeyError as error:
+                raise session.InvalidSessionError('Unknown session') from error
+            now = self._now_ns()
             if now > current_expiry:
                 raise session.InvalidSessionError('Session has expired')
-        except KeyError as error:
-            raise session.InvalidSessionError('Unknown session') from error
+            expiry = now + seconds_to_ns(self.config['expiry_sliding_window_s'])
+            session_result = stripe.sessions[key]
+            if abs(expiry - current_expiry) > self.config['extend_coalesce_ms'] * 1000000:
+                session_result['expiry'] = self.clock.to_datetime(expiry)
+                self._index_expiry(stripe, key, expiry)
+            return session_result
+
+    def count_sessions(self):
+        """
+        Overrides SessionManager.count_sessions
+        """
+        return sum(len(stripe.sessions) for stripe in self._stripes)
 
     def check_expired_sessions(self):
         """
         Returns all sessions that have expired since the last call to
-        check_expired_sessions. Removes them from the local session list
+        check_expired_sessions. Removes them from the local session list.
+        Only pops heap entries whose expiry has passed, so the cost is proportional
+        to the number of expired (and superseded) entries rather than all sessions.
+        Each stripe is locked in turn rather than all at once.
 
         Overrides SessionManager.check_expired_sessions
         """
-        now = datetime.now()
-        expired = {
-            id: session for (id, session) in self.sessions.items() if session['expiry'] < now
-        }
-        for id in expired.keys():
-            del self.sessions[id]
+        now = self._now_ns()
+        expired = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                heap = stripe.expiry_heap
+                while heap and heap[0][0] < now:
+                    expiry, key = heapq.heappop(heap)
+                    # Stale entry: session already removed or its expiry has since moved
+                    if stripe.expiries.get(key) != expiry:
+                        continue
+                    del stripe.expiries[key]
+                    session = stripe.sessions.pop(key)
+                    expired[session['id']] = session
         return expired
 
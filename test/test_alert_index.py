@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import nose
+from nose.tools import raises
+import os
+import random
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from alert_index import AlertIndex
+
+
+#### Helper functions ####
+def create_index(num_users):
+    index = AlertIndex()
+    ids = [gen_id() for i in range(num_users)]
+    for id in ids:
+        index.add(id)
+    return index, ids
+
+def check_consistent(index):
+    for pos, id in enumerate(index._ids):
+        nose.tools.ok_(index._pos[id] == pos)
+    nose.tools.ok_(len(index._pos) == len(index._ids))
+    nose.tools.ok_(0 <= index.num_alerted <= len(index))
+
+
+#### Tests ####
+def test_add_user_unalerted():
+    index, ids = create_index(3)
+    nose.tools.ok_(len(index) == 3)
+    nose.tools.ok_(index.num_alerted == 0)
+    for id in ids:
+        nose.tools.ok_(id in index)
+        nose.tools.ok_(not index.is_alerted(id))
+
+def test_set_alerted():
+    index, ids = create_index(5)
+    index.set_alerted(ids[3], True)
+    index.set_alerted(ids[3], True)
+    index.set_alerted(ids[1], True)
+    nose.tools.ok_(index.num_alerted == 2)
+    nose.tools.ok_(set(index.alerted_ids()) == {ids[1], ids[3]})
+    index.set_alerted(ids[3], False)
+    nose.tools.ok_(index.alerted_ids() == [ids[1]])
+    check_consistent(index)
+
+def test_remove_keeps_partitions():
+    index, ids = create_index(6)
+    for id in ids[:3]:
+        index.set_alerted(id, True)
+    index.remove(ids[0])
+    index.remove(ids[5])
+    nose.tools.ok_(ids[0] not in index)
+    nose.tools.ok_(set(index.alerted_ids()) == {ids[1], ids[2]})
+    nose.tools.ok_(not index.is_alerted(ids[4]))
+    check_consistent(index)
+
+@raises(KeyError)
+def test_remove_unknown_user():
+    index, ids = create_index(2)
+    index.remove(gen_id())
+
+def test_clear_alerts():
+    index, ids = create_index(4)
+    index.set_alerted(ids[0], True)
+    index.set_alerted(ids[2], True)
+    index.clear_alerts()
+    nose.tools.ok_(index.alerted_ids() == [])
+    nose.tools.ok_(index.num_alerted == 0)
+    check_consistent(index)
+
+def test_sample_unalerted():
+    index, ids = create_index(10)
+    for id in ids[:4]:
+        index.set_alerted(id, True)
+    for i in range(200):
+        picked = index.sample_unalerted(2, ids[5])
+        nose.tools.ok_(len(picked) == 2)
+        nose.tools.ok_(len(set(picked)) == 2)
+        for id in picked:
+            nose.tools.ok_(id in ids[4:])
+            nose.tools.ok_(id != ids[5])
+
+def test_sample_unalerted_too_few():
+    index, ids = create_index(3)
+    index.set_alerted(ids[0], True)
+    nose.tools.ok_(index.sample_unalerted(2, ids[1]) == [ids[2]])
+    nose.tools.ok_(len(index.sample_unalerted(5)) == 2)
+    index.set_alerted(ids[2], True)
+    nose.tools.ok_(index.sample_unalerted(1, ids[1]) == [])
+
+def test_sample_unalerted_covers_all_candidates():
+    index, ids = create_index(5)
+    rng = random.Random(0)
+    seen = set()
+    for i in range(200):
+        seen.update(index.sample_unalerted(1, ids[0], rng))
+    nose.tools.ok_(seen == set(ids[1:]))
+
+def test_random_user():
+    index, ids = create_index(3)
+    index.set_alerted(ids[2], True)
+    seen = set()
+    for i in range(200):
+        seen.add(index.random_user(ids[1]))
+    nose.tools.ok_(seen == {ids[0], ids[2]})
+
+def test_random_user_no_other_users():
+    index, ids = create_index(1)
+    nose.tools.ok_(index.random_user(ids[0]) is None)
+    nose.tools.ok_(AlertIndex().random_user() is None)
+
+def test_size_bytes_grows_with_users():
+    small, ids = create_index(1)
+    large, ids = create_index(1000)
+    nose.tools.ok_(0 < small.size_bytes() < large.size_bytes())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+import nose
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import api
+from game_state import GameFullError, GameState
+from session import InvalidSessionError
+from signed_token_session import SignedTokenSessionManager
+
+
+#### Helper functions ####
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def login(client):
+    res = client.post('/login', json={})
+    nose.tools.ok_(res.status_code == 200)
+    return {'id': res.get_json()['id']}
+
+def post_actions(client, items):
+    res = client.post('/actions', json=items)
+    nose.tools.ok_(res.status_code == 200)
+    return res.get_json()['results']
+
+def with_session_manager(session_manager, test):
+    original = api.session_manager
+    api.session_manager = session_manager
+    try:
+        test()
+    finally:
+        api.session_manager = original
+
+def token_expiry(session_manager, session):
+    return session_manager.parse_token(session['token'])[1]
+
+
+#### Tests ####
+def test_action_invalid_user_action():
+    client = api.app.test_client()
+    session = login(client)
+    res = client.post('/action', json={
+        'session': session, 'user_action': create_user_action('HELLO')
+    })
+    nose.tools.ok_(res.status_code == 400)
+    nose.tools.ok_(res.get_json()['msg'].startswith('invalid user action'))
+
+def test_action_unknown_session():
+    client = api.app.test_client()
+    res = client.post('/action', json={
+        'session': {'id': str(gen_id())}, 'user_action': create_user_action('START')
+    })
+    nose.tools.ok_(res.status_code == 401)
+
+def test_action_big_int_data():
+    client = api.app.test_client()
+    session = login(client)
+    user_action = create_user_action('CHECK_IF_ALERTED')
+    user_action['action']['data'] = {'n': 2 ** 70}
+    res = client.post('/action', json={'session': session, 'user_action': user_action})
+    nose.tools.ok_(res.status_code == 200)
+    nose.tools.ok_(res.get_json()['user_action']['action']['data'] == {'n': 2 ** 70})
+    results = post_actions(client, [{'session': session, 'user_action': user_action}])
+    nose.tools.ok_(results[0]['status'] == 200)
+    nose.tools.ok_(results[0]['body']['user_action']['action']['data'] == {'n': 2 ** 70})
+
+def test_action_validated_once():
+    client = api.app.test_client()
+    session = login(client)
+    validate = GameState.__dict__['validate_user_action']
+    calls = []
+    def counting_validate(user_action):
+        calls.append(user_action)
+        return validate.__func__(user_action)
+    GameState.validate_user_action = staticmethod(counting_validate)
+    try:
+        res = client.post('/action', json={
+            'session': session, 'user_action': create_user_action('CHECK_IF_ALERTED')
+        })
+    finally:
+        GameState.validate_user_action = validate
+    nose.tools.ok_(res.status_code == 200)
+    nose.tools.ok_(len(calls) == 1)
+
+def test_action_returns_reissued_token():
+    sm = SignedTokenSessionManager({'expiry_timeout_s': 1, 'expiry_sliding_window_s': 60})
+    def test():
+        client = api.app.test_client()
+        session = client.post('/login', json={}).get_json()
+        res = client.post('/action', json={
+            'session': session, 'user_action': create_user_action('CHECK_IF_ALERTED')
+        })
+        nose.tools.ok_(res.status_code == 200)
+        reissued = res.get_json()['session']
+        nose.tools.ok_(reissued['id'] == session['id'])
+        nose.tools.ok_(
+            (token_expiry(sm, reissued) - token_expiry(sm, session)).total_seconds() > 30
+        )
+        results = post_actions(client, [
+            {'session': reissued, 'user_action': create_user_action('CHECK_IF_ALERTED')}
+        ])
+        nose.tools.ok_(results[0]['status'] == 200)
+        reissued_again = results[0]['body']['session']
+        nose.tools.ok_(token_expiry(sm, reissued_again) >= token_expiry(sm, reissued))
+    with_session_manager(sm, test)
+
+def test_action_leaves_out_unchanged_session():
+    client = api.app.test_client()
+    session = login(client)
+    res = client.post('/action', json={
+        'session': session, 'user_action': create_user_action('CHECK_IF_ALERTED')
+    })
+    nose.tools.ok_('session' not in res.get_json())
+    results = post_actions(client, [
+        {'session': session, 'user_action': create_user_action('CHECK_IF_ALERTED')}
+    ])
+    nose.tools.ok_('session' not in results[0]['body'])
+
+def test_actions_applied_in_order():
+    client = api.app.test_client()
+    session = login(client)
+    results = post_actions(client, [
+        {'session': session, 'user_action': create_user_action(code)}
+        for code in ['CHECK_IF_ALERTED', 'BUTTON_PRESS', 'CHECK_IF_ALERTED']
+    ])
+    nose.tools.ok_([result['status'] for result in results] == [200, 200, 200])
+    nose.tools.ok_(results[0]['body']['response'] == {'alerted': False})
+    nose.tools.ok_(results[1]['body']['response'] == {'success': True})
+    nose.tools.ok_(results[2]['body']['user_id'] == session['id'])
+
+def test_actions_several_sessions():
+    client = api.app.test_client()
+    sessions = [login(client) for i in range(3)]
+    results = post_actions(client, [
+        {'session': session, 'user_action': create_user_action('CHECK_IF_ALERTED')}
+        for session in sessions * 2
+    ])
+    nose.tools.ok_(
+        [result['body']['user_id'] for result in results]
+        == [session['id'] for session in sessions * 2]
+    )
+
+def test_actions_per_item_errors():
+    client = api.app.test_client()
+    session = login(client)
+    results = post_actions(client, [
+        {'session': {'id': str(gen_id())}, 'user_action': create_user_action('START')},
+        {'session': session, 'user_action': create_user_action('HELLO')},
+        {'session': session},
+        'baguette',
+        {'session': session, 'user_action': create_user_action('CHECK_IF_ALERTED')}
+    ])
+    nose.tools.ok_([result['status'] for result in results] == [401, 400, 400, 400, 200])
+    nose.tools.ok_(results[0]['body'] == {'msg': 'cant take user action'})
+    nose.tools.ok_(results[1]['body']['msg'].startswith('invalid user action'))
+    nose.tools.ok_(results[2]['body'] == {'msg': 'invalid request'})
+
+def test_actions_not_a_list():
+    client = api.app.test_client()
+    res = client.post('/actions', json={'session': login(client)})
+    nose.tools.ok_(res.status_code == 400)
+
+def test_metrics():
+    client = api.app.test_client()
+    session = login(client)
+    before = api.actions_total.value(('START',))
+    res = client.post('/action', json={
+        'session': session, 'user_action': create_user_action('START')
+    })
+    nose.tools.ok_(res.status_code == 200)
+    nose.tools.ok_(api.actions_total.value(('START',)) == before + 1)
+    res = client.get('/metrics')
+    nose.tools.ok_(res.status_code == 200)
+    nose.tools.ok_(res.content_type.startswith('text/plain'))
+    text = res.get_data(as_text=True)
+    nose.tools.ok_('useless_machine_action_phase_seconds_count{phase="validate"}' in text)
+    nose.tools.ok_('useless_machine_action_phase_seconds_count{phase="game"}' in text)
+    nose.tools.ok_('useless_machine_request_seconds_count{route="/action",status="200"}' in text)
+    nose.tools.ok_('useless_machine_users ' in text)
+    nose.tools.ok_('useless_machine_alerted_users ' in text)
+    nose.tools.ok_('useless_machine_sessions ' in text)
+
+def test_stats():
+    client = api.app.test_client()
+    session = login(client)
+    res = client.post('/action', json={
+        'session': session, 'user_action': create_user_action('BUTTON_PRESS')
+    })
+    nose.tools.ok_(res.status_code == 200)
+    res = client.get('/stats')
+    nose.tools.ok_(res.status_code == 200)
+    stats = res.get_json()
+    nose.tools.ok_(stats['users'] == api.game_state.count_users())
+    nose.tools.ok_(stats['presses'] >= 1)
+    nose.tools.ok_(stats['seconds_since_last_press'] >= 0)
+
+
+def test_login_game_full():
+    client = api.app.test_client()
+    sessions = []
+    new_session = api.session_manager.new_session
+    def recording_new_session(credentials):
+        sessions.append(new_session(credentials))
+        return sessions[-1]
+    def add_user(user_id):
+        raise GameFullError()
+    api.session_manager.new_session = recording_new_session
+    api.game_state.add_user = add_user
+    try:
+        res = client.post('/login', json={})
+    finally:
+        del api.session_manager.new_session
+        del api.game_state.add_user
+    nose.tools.ok_(res.status_code == 503)
+    nose.tools.assert_raises(
+        InvalidSessionError, api.session_manager.authenticate_session, sessions[0]
+    )
+
+def test_check_backends_shared_game_needs_shared_sessions():
+    api.check_backends({'backend': 'stateful_ticket'}, {'backend': 'rooms'})
+    api.check_backends({'backend': 'mongo'}, {'backend': 'shared_memory'})
+    for session_config in [
+            {'backend': 'stateful_ticket'}, {'backend': 'journaled'},
+            {'backend': 'signed_token', 'token_secret': 'secret'},
+            {'backend': 'signed_token', 'token_secret': 'secret', 'token_track_expiries': True}
+    ]:
+        try:
+            api.check_backends(session_config, {'backend': 'shared_memory'})
+        except ValueError:
+            continue
+        raise AssertionError('{} sessions accepted'.format(session_config['backend']))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import nose
+import os
+import sys
+import threading
+import uuid
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import api
+import game_state
+from game_rooms import GameRoomManager
+
+THREADS = 16
+REQUESTS_PER_THREAD = 100
+CHURN_ROUNDS = 10
+ACTION_CODES = ['BUTTON_PRESS', 'CHECK_IF_ALERTED', 'BUTTON_PRESS', 'START', 'STOP']
+
+
+#### Helper functions ####
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def login(client):
+    res = client.post('/login', json={})
+    nose.tools.ok_(res.status_code == 200)
+    return {'id': res.get_json()['id']}
+
+def hammer_action(errors, barrier, all_sessions):
+    client = api.app.test_client()
+    try:
+        sessions = [login(client) for i in range(3)]
+        all_sessions.extend(sessions)
+        barrier.wait()
+        for i in range(REQUESTS_PER_THREAD):
+            res = client.post('/action', json={
+                'session': sessions[i % len(sessions)],
+                'user_action': create_user_action(ACTION_CODES[i % len(ACTION_CODES)])
+            })
+            if res.status_code != 200:
+                errors.append(res.status_code)
+        # Churn sessions while other threads keep acting
+        for session in sessions:
+            res = client.post('/signout', json=session)
+            if res.status_code != 200:
+                errors.append(res.status_code)
+    except Exception as error:
+        errors.append(error)
+
+
+#### Tests ####
+def test_concurrent_actions():
+    # Small rooms so threads share some rooms and contend on their locks
+    max_room_size = api.game_state.config['max_room_size']
+    api.game_state.config['max_room_size'] = 8
+    # Switch threads as often as possible to shake out races
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    errors = []
+    sessions = []
+    barrier = threading.Barrier(THREADS)
+    threads = [
+        threading.Thread(target=hammer_action, args=(errors, barrier, sessions))
+        for i in range(THREADS)
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+        api.game_state.config['max_room_size'] = max_room_size
+    nose.tools.ok_(errors == [], errors[:5])
+    api.check_expired_sessions()
+    nose.tools.ok_(len(sessions) == THREADS * 3)
+    for session in sessions:
+        nose.tools.ok_(uuid.UUID(session['id']) not in api.session_manager.sessions)
+        nose.tools.assert_raises(
+            game_state.UserDoesntExistError, api.game_state.find_room, session['id']
+        )
+
+def churn_game_state(gs, errors, barrier):
+    try:
+        ids = [str(uuid.uuid4()) for i in range(20)]
+        barrier.wait()
+        for i in range(CHURN_ROUNDS):
+            for id in ids:
+                gs.add_user(id)
+            for id in ids:
+                gs.user_action(id, create_user_action(ACTION_CODES[i % len(ACTION_CODES)]))
+            gs.remove_users(ids[::2])
+            for id in ids[1::2]:
+                gs.remove_user(id)
+    except Exception as error:
+        errors.append(error)
+
+def test_concurrent_game_state_churn():
+    gs = GameRoomManager({'max_room_size': 1000})
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    errors = []
+    barrier = threading.Barrier(THREADS)
+    threads = [
+        threading.Thread(target=churn_game_state, args=(gs, errors, barrier))
+        for i in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(switch_interval)
+    nose.tools.ok_(errors == [], errors[:5])
+    nose.tools.ok_(gs.rooms == {})
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import asyncio
+import nose
+import os
+import sys
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+try:
+    from aiohttp.test_utils import TestClient, TestServer
+    from alert_client import read_events
+    import async_api
+except ImportError:
+    raise nose.SkipTest('aiohttp is not installed')
+from game_rooms import GameRoomManager
+from signed_token_session import SignedTokenSessionManager
+from stateful_ticket_session import StatefulTicketSessionManager
+
+
+#### Helper functions ####
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def run_with_client(test, session_manager=None):
+    async def run():
+        app = async_api.create_app(
+            session_manager or StatefulTicketSessionManager({
+                'expiry_timeout_s': 100,
+                'expiry_sliding_window_s': 60
+            }),
+            GameRoomManager({}),
+            {'long_poll_timeout_s': 5, 'stream_keepalive_s': 0.05}
+        )
+        async with TestClient(TestServer(app)) as client:
+            await test(client)
+    asyncio.run(run())
+
+async def login(client):
+    res = await client.post('/login', json={})
+    nose.tools.ok_(res.status == 200)
+    return {'id': (await res.json())['id']}
+
+async def action(client, session, code):
+    res = await client.post('/action', json={
+        'session': session, 'user_action': create_user_action(code)
+    })
+    nose.tools.ok_(res.status == 200)
+    return await res.json()
+
+
+#### Tests ####
+def test_action():
+    async def test(client):
+        session = await login(client)
+        result = await action(client, session, 'CHECK_IF_ALERTED')
+        nose.tools.ok_(result['user_id'] == session['id'])
+        nose.tools.ok_(result['response']['alerted'] is False)
+    run_with_client(test)
+
+def test_action_returns_reissued_token():
+    sm = SignedTokenSessionManager({'expiry_timeout_s': 1, 'expiry_sliding_window_s': 60})
+    async def test(client):
+        res = await client.post('/login', json={})
+        session = await res.json()
+        result = await action(client, session, 'CHECK_IF_ALERTED')
+        reissued = result['session']
+        nose.tools.ok_(reissued['id'] == session['id'])
+        expiry = sm.parse_token(reissued['token'])[1]
+        nose.tools.ok_((expiry - sm.parse_token(session['token'])[1]).total_seconds() > 30)
+        res = await client.post('/alerts/wait', json={'session': reissued, 'timeout_s': 0})
+        nose.tools.ok_(res.status == 200)
+        nose.tools.ok_(sm.parse_token((await res.json())['session']['token'])[1] >= expiry)
+    run_with_client(test, sm)
+
+def test_stats():
+    async def test(client):
+        session = await login(client)
+        await action(client, session, 'BUTTON_PRESS')
+        res = await client.get('/stats')
+        nose.tools.ok_(res.status == 200)
+        stats = await res.json()
+        nose.tools.ok_(stats['users'] == 1)
+        nose.tools.ok_(stats['presses'] == 1)
+    run_with_client(test)
+
+def test_wait_for_alert_wakes_on_alert():
+    async def test(client):
+        session = await login(client)
+        other_session = await login(client)
+        wait = asyncio.ensure_future(
+            client.post('/alerts/wait', json={'session': other_session})
+        )
+        await asyncio.sleep(0.1)
+        nose.tools.ok_(not wait.done())
+        await action(client, session, 'START')
+        res = await asyncio.wait_for(wait, 5)
+        nose.tools.ok_(res.status == 200)
+        result = await res.json()
+        nose.tools.ok_(result['user_id'] == other_session['id'])
+        nose.tools.ok_(result['response']['alerted'] is True)
+    run_with_client(test)
+
+def test_wait_for_alert_already_alerted():
+    async def test(client):
+        session = await login(client)
+        other_session = await login(client)
+        await action(client, session, 'START')
+        res = await client.post('/alerts/wait', json={'session': other_session})
+        nose.tools.ok_((await res.json())['response']['alerted'] is True)
+    run_with_client(test)
+
+def test_wait_for_alert_times_out():
+    async def test(client):
+        session = await login(client)
+        res = await client.post('/alerts/wait', json={'session': session, 'timeout_s': 0.05})
+        nose.tools.ok_(res.status == 200)
+        nose.tools.ok_((await res.json())['response']['alerted'] is False)
+        nose.tools.ok_(client.app[async_api.ALERT_HUB]._waiters == {})
+    run_with_client(test)
+
+def test_wait_for_alert_unknown_session():
+    async def test(client):
+        res = await client.post('/alerts/wait', json={
+            'session': {'id': '2f1d5f1c-1d4f-4f86-8d4b-6f3c2c6b2b10'}
+        })
+        nose.tools.ok_(res.status == 401)
+    run_with_client(test)
+
+def test_stream_alerts():
+    async def test(client):
+        session = await login(client)
+        other_session = await login(client)
+        res = await client.get('/alerts/stream', params={'session': other_session['id']})
+        nose.tools.ok_(res.status == 200)
+        nose.tools.ok_(res.headers['Content-Type'] == 'text/event-stream')
+        events = read_events(res)
+        for i in range(2):
+            await action(client, session, 'START')
+            event, data = await asyncio.wait_for(events.__anext__(), 5)
+            nose.tools.ok_(event == 'alerted')
+            nose.tools.ok_(data == {'user_id': other_session['id'], 'alerted': True})
+            await action(client, other_session, 'BUTTON_PRESS')
+        res.close()
+    run_with_client(test)
+
+def test_stream_alerts_signed_token():
+    sm = SignedTokenSessionManager({'expiry_timeout_s': 100, 'expiry_sliding_window_s': 60})
+    async def test(client):
+        session = await (await client.post('/login', json={})).json()
+        other_session = await (await client.post('/login', json={})).json()
+        res = await client.get('/alerts/stream', params={
+            'session': other_session['id'], 'token': other_session['token']
+        })
+        nose.tools.ok_(res.status == 200)
+        await action(client, session, 'START')
+        event, data = await asyncio.wait_for(read_events(res).__anext__(), 5)
+        nose.tools.ok_(data == {'user_id': other_session['id'], 'alerted': True})
+        res.close()
+        res = await client.get('/alerts/stream', params={'session': other_session['id']})
+        nose.tools.ok_(res.status == 401)
+    run_with_client(test, sm)
+
+def test_stream_alerts_already_alerted():
+    async def test(client):
+        session = await login(client)
+        other_session = await login(client)
+        await action(client, session, 'START')
+        res = await client.get('/alerts/stream', params={'session': other_session['id']})
+        event, data = await asyncio.wait_for(read_events(res).__anext__(), 5)
+        nose.tools.ok_(data['user_id'] == other_session['id'])
+        res.close()
+    run_with_client(test)
+
+def test_stream_alerts_ends_with_session():
+    async def test(client):
+        session = await login(client)
+        res = await client.get('/alerts/stream', params={'session': session['id']})
+        await client.post('/signout', json=session)
+        events = [event async for event in read_events(res)]
+        nose.tools.ok_(events == [])
+        nose.tools.ok_(client.app[async_api.ALERT_HUB]._subscribers == {})
+    run_with_client(test)
+
+def test_stream_alerts_unknown_session():
+    async def test(client):
+        res = await client.get('/alerts/stream', params={
+            'session': '2f1d5f1c-1d4f-4f86-8d4b-6f3c2c6b2b10'
+        })
+        nose.tools.ok_(res.status == 401)
+        res = await client.get('/alerts/stream')
+        nose.tools.ok_(res.status == 400)
+    run_with_client(test)
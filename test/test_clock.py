@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import nose
+from nose.tools import raises
+import os
+import sys
+import time
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import clock
+
+
+#### Tests ####
+def test_seconds_to_ns():
+    nose.tools.ok_(clock.seconds_to_ns(1.5) == 1500000000)
+    nose.tools.ok_(clock.seconds_to_ns(-1) == -clock.SECOND_NS)
+
+def test_monotonic_clock_does_not_go_backwards():
+    monotonic_clock = clock.MonotonicClock()
+    first = monotonic_clock.now_ns()
+    nose.tools.ok_(monotonic_clock.now_ns() >= first)
+
+def test_monotonic_clock_tracks_wall_clock():
+    monotonic_clock = clock.MonotonicClock()
+    difference = monotonic_clock.to_timestamp(monotonic_clock.now_ns()) - time.time()
+    nose.tools.ok_(abs(difference) < 1)
+
+def test_manual_clock_advance():
+    manual_clock = clock.ManualClock(start_ns=5)
+    nose.tools.ok_(manual_clock.now_ns() == 5)
+    nose.tools.ok_(manual_clock.advance(3600) == 5 + 3600 * clock.SECOND_NS)
+    nose.tools.ok_(manual_clock.now_ns() == 5 + 3600 * clock.SECOND_NS)
+
+def test_manual_clock_advance_to():
+    manual_clock = clock.ManualClock(start_ns=5)
+    manual_clock.advance_to(10)
+    nose.tools.ok_(manual_clock.now_ns() == 10)
+    manual_clock.advance_to(10)
+    nose.tools.ok_(manual_clock.now_ns() == 10)
+
+@raises(ValueError)
+def test_manual_clock_advance_to_cannot_go_backwards():
+    clock.ManualClock(start_ns=5).advance_to(4)
+
+def test_wall_clock_conversions():
+    manual_clock = clock.ManualClock(wall_offset_ns=1000 * clock.SECOND_NS)
+    nose.tools.ok_(manual_clock.to_timestamp(clock.SECOND_NS) == 1001)
+    nose.tools.ok_(manual_clock.from_timestamp(1001) == clock.SECOND_NS)
+    nose.tools.ok_(manual_clock.to_datetime(0) == datetime.fromtimestamp(1000))
+
+@raises(NotImplementedError)
+def test_base_clock_now_ns_not_implemented():
+    clock.Clock(0).now_ns()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import logging
+import nose
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from event_log import EventLog, start_event_log, stop_event_log
+import stateful_game_state
+
+
+#### Helper functions ####
+def capture_events(func, level=logging.DEBUG):
+    stream = io.StringIO()
+    listener = start_event_log(level, logging.StreamHandler(stream))
+    try:
+        func()
+    finally:
+        stop_event_log(listener)
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+
+#### Tests ####
+def test_disabled_by_default():
+    nose.tools.ok_(not EventLog('test').enabled)
+
+def test_event_fields():
+    log = EventLog('test')
+    id = gen_id()
+    events = capture_events(lambda: log.event('alerted', user_id=id, count=2))
+    nose.tools.ok_(len(events) == 1)
+    nose.tools.ok_(events[0]['event'] == 'alerted')
+    nose.tools.ok_(events[0]['source'] == 'useless_machine.events.test')
+    nose.tools.ok_(events[0]['user_id'] == str(id))
+    nose.tools.ok_(events[0]['count'] == 2)
+    nose.tools.ok_(not log.enabled)
+
+def test_level_gated():
+    log = EventLog('test')
+    events = capture_events(lambda: log.event('alerted'), level=logging.INFO)
+    nose.tools.ok_(events == [])
+
+def test_sampled():
+    log = EventLog('test', sample_rate=0.0)
+    events = capture_events(lambda: [log.event('alerted') for i in range(100)])
+    nose.tools.ok_(events == [])
+
+def test_game_events():
+    gs = stateful_game_state.StatefulGameState({})
+    ids = [gen_id() for i in range(2)]
+    for id in ids:
+        gs.add_user(id)
+    events = capture_events(
+        lambda: gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+    )
+    nose.tools.ok_([event['event'] for event in events] == ['user_action', 'alerted'])
+    nose.tools.ok_(events[1]['user_id'] == str(ids[1]))
+    nose.tools.ok_(events[1]['by'] == str(ids[0]))
+
+def test_game_events_skipped_when_disabled():
+    gs = stateful_game_state.StatefulGameState({})
+    ids = [gen_id() for i in range(2)]
+    for id in ids:
+        gs.add_user(id)
+    calls = []
+    gs.events.event = lambda name, **fields: calls.append(name)
+    for code in ['START', 'BUTTON_PRESS', 'CHECK_IF_ALERTED']:
+        gs.user_action(ids[0], create_user_action(code))
+    nose.tools.ok_(calls == [])
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import nose
+import os
+import sys
+import time
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from expiry_reaper import ExpiryReaper
+import stateful_game_state
+import stateful_ticket_session
+
+
+#### Helper functions ####
+def create_reaper(expiry_timeout_s, interval_s=0.01):
+    sm = stateful_ticket_session.StatefulTicketSessionManager({
+        'expiry_timeout_s': expiry_timeout_s,
+        'expiry_sliding_window_s': 60
+    })
+    gs = stateful_game_state.StatefulGameState({'alert_chance_of_multiply': 0.2})
+    return ExpiryReaper(sm, gs, interval_s), sm, gs
+
+def login(sm, gs):
+    session = sm.new_session({})
+    gs.add_user(session['id'])
+    return session
+
+
+#### Tests ####
+def test_reap_removes_expired_users():
+    reaper, sm, gs = create_reaper(expiry_timeout_s=-1)
+    sessions = [login(sm, gs) for i in range(3)]
+    expired = reaper.reap()
+    nose.tools.ok_(set(expired.keys()) == {s['id'] for s in sessions})
+    nose.tools.ok_(gs.state == {})
+
+def test_reap_keeps_live_users():
+    reaper, sm, gs = create_reaper(expiry_timeout_s=100)
+    session = login(sm, gs)
+    nose.tools.ok_(reaper.reap() == {})
+    nose.tools.ok_(session['id'] in gs.state)
+
+def test_reap_skips_users_already_removed():
+    reaper, sm, gs = create_reaper(expiry_timeout_s=100)
+    session = login(sm, gs)
+    # As on /signout: the session is destroyed and the user removed straight away
+    sm.destroy_session({'id': str(session['id'])})
+    gs.remove_user(session['id'])
+    nose.tools.ok_(list(reaper.reap().keys()) == [session['id']])
+
+def test_start_stop():
+    reaper, sm, gs = create_reaper(expiry_timeout_s=-1)
+    # Logged in before the reaper starts, so it can't sweep the session before the user
+    # is added
+    login(sm, gs)
+    nose.tools.ok_(not reaper.is_running)
+    reaper.start()
+    nose.tools.ok_(reaper.is_running)
+    deadline = time.time() + 5
+    while gs.state and time.time() < deadline:
+        time.sleep(0.01)
+    reaper.stop()
+    nose.tools.ok_(not reaper.is_running)
+    nose.tools.ok_(gs.state == {})
+    nose.tools.ok_(sm.sessions == {})
+
+def test_stopped_reaper_does_not_sweep():
+    reaper, sm, gs = create_reaper(expiry_timeout_s=-1)
+    reaper.start()
+    reaper.stop()
+    session = login(sm, gs)
+    time.sleep(0.05)
+    nose.tools.ok_(session['id'] in gs.state)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+from collections import Counter
+import nose
+import os
+import random
+import sys
+import uuid
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import game_random
+from game_rooms import GameRoomManager
+from stateful_game_state import StatefulGameState
+
+
+#### Helper functions ####
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def play(gs, seed, num_users=50, num_actions=500):
+    """
+    Plays a fixed sequence of actions
+
+    :return list: alert state of every user after each action
+    """
+    rng = random.Random(seed)
+    ids = [uuid.UUID(int=rng.getrandbits(128)) for i in range(num_users)]
+    for id in ids:
+        gs.add_user(id)
+    history = []
+    for i in range(num_actions):
+        code = rng.choice(['BUTTON_PRESS', 'BUTTON_PRESS', 'START', 'STOP'])
+        gs.user_action(rng.choice(ids), create_user_action(code))
+        history.append([gs.find_state(id)['alert_state'] for id in ids])
+    return history
+
+
+#### Tests ####
+def test_create_game_rng_is_seeded():
+    first = game_random.create_game_rng({'rng_seed': 1})
+    second = game_random.create_game_rng({'rng_seed': 1})
+    nose.tools.ok_([first.random() for i in range(10)] == [second.random() for i in range(10)])
+
+def test_batched_random_is_seeded():
+    first = game_random.BatchedRandom(1, batch_size=16)
+    second = game_random.BatchedRandom(1, batch_size=16)
+    draws = [first.random() for i in range(100)]
+    nose.tools.ok_(draws == [second.random() for i in range(100)])
+    nose.tools.ok_(all(0 <= draw < 1 for draw in draws))
+    nose.tools.ok_(len(set(draws)) == 100)
+    first.seed(1)
+    nose.tools.ok_(draws[:5] == [first.random() for i in range(5)])
+
+def test_batched_random_distributions():
+    rng = game_random.BatchedRandom(2, batch_size=7)
+    nose.tools.ok_(0 <= rng.randrange(10) < 10)
+    nose.tools.ok_(len(set(rng.sample(range(100), 10))) == 10)
+
+def test_random_index_in_range():
+    rng = random.Random(0)
+    counts = Counter(game_random.random_index(rng, 4) for i in range(4000))
+    nose.tools.ok_(set(counts) == {0, 1, 2, 3})
+    nose.tools.ok_(min(counts.values()) > 800)
+
+def test_sample_range_sparse_and_dense():
+    rng = random.Random(0)
+    for start, stop, count in ((10, 1000, 3), (10, 14, 3), (0, 3, 3), (5, 5, 0)):
+        for i in range(100):
+            picked = game_random.sample_range(rng, start, stop, count)
+            nose.tools.ok_(len(picked) == count)
+            nose.tools.ok_(len(set(picked)) == count)
+            nose.tools.ok_(all(start <= value < stop for value in picked))
+
+def test_sample_range_is_uniform():
+    rng = random.Random(0)
+    counts = Counter()
+    for i in range(3000):
+        counts.update(game_random.sample_range(rng, 0, 6, 2))
+    nose.tools.ok_(set(counts) == set(range(6)))
+    nose.tools.ok_(min(counts.values()) > 800)
+
+def test_seeded_games_are_reproducible():
+    configs = [{'rng_seed': 3}]
+    if game_random.numpy is not None:
+        configs.append({'rng_seed': 3, 'rng_batch_size': 64})
+    for config in configs:
+        nose.tools.ok_(
+            play(StatefulGameState(dict(config)), 0) == play(StatefulGameState(dict(config)), 0)
+        )
+    nose.tools.ok_(
+        play(StatefulGameState({'rng_seed': 3}), 0) != play(StatefulGameState({'rng_seed': 4}), 0)
+    )
+
+def test_batch_size_needs_numpy():
+    if game_random.numpy is not None:
+        raise nose.SkipTest('numpy is installed')
+    nose.tools.assert_raises(
+        ValueError, game_random.create_game_rng, {'rng_batch_size': 64}
+    )
+
+def test_seeded_rooms_are_reproducible_and_distinct():
+    first = GameRoomManager({'rng_seed': 5, 'max_room_size': 10})
+    second = GameRoomManager({'rng_seed': 5, 'max_room_size': 10})
+    nose.tools.ok_(play(first, 0) == play(second, 0))
+    seeds = {room.config['rng_seed'] for room in first.rooms.values()}
+    nose.tools.ok_(len(seeds) == len(first.rooms))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import nose
+from nose.tools import raises
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import game_state
+from game_rooms import GameRoomManager
+
+
+#### Helper functions ####
+def create_rooms(max_room_size=3):
+    return GameRoomManager({'max_room_size': max_room_size})
+
+def add_users(rooms, count):
+    ids = [gen_id() for i in range(count)]
+    for id in ids:
+        rooms.add_user(id)
+    return ids
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+
+#### Tests ####
+def test_users_fill_rooms_in_order():
+    rooms = create_rooms(3)
+    ids = add_users(rooms, 7)
+    nose.tools.ok_(len(rooms.rooms) == 3)
+    nose.tools.ok_(sorted(rooms.room_sizes.values()) == [1, 3, 3])
+    nose.tools.ok_(rooms.find_room(ids[0])[0] == rooms.find_room(ids[2])[0])
+    nose.tools.ok_(rooms.find_room(ids[2])[0] != rooms.find_room(ids[3])[0])
+
+def test_remove_user_reopens_room():
+    rooms = create_rooms(2)
+    ids = add_users(rooms, 4)
+    room_id = rooms.find_room(ids[0])[0]
+    rooms.remove_user(ids[0])
+    new_id = add_users(rooms, 1)[0]
+    nose.tools.ok_(rooms.find_room(new_id)[0] == room_id)
+    nose.tools.ok_(len(rooms.rooms) == 2)
+
+def test_empty_room_is_closed():
+    rooms = create_rooms(2)
+    ids = add_users(rooms, 3)
+    rooms.remove_user(str(ids[2]))
+    nose.tools.ok_(len(rooms.rooms) == 1)
+    nose.tools.ok_(len(rooms.room_sizes) == 1)
+
+@raises(game_state.UserAlreadyExistsError)
+def test_add_user_twice():
+    rooms = create_rooms()
+    id = add_users(rooms, 1)[0]
+    rooms.add_user(str(id))
+
+@raises(game_state.UserDoesntExistError)
+def test_remove_unknown_user():
+    rooms = create_rooms()
+    add_users(rooms, 1)
+    rooms.remove_user(gen_id())
+
+@raises(game_state.UserDoesntExistError)
+def test_user_action_unknown_user():
+    rooms = create_rooms()
+    add_users(rooms, 1)
+    rooms.user_action(gen_id(), create_user_action('CHECK_IF_ALERTED'))
+
+@raises(game_state.InvalidUserActionError)
+def test_invalid_user_action_unknown_user():
+    rooms = create_rooms()
+    rooms.user_action(gen_id(), create_user_action('CHECK_IF_ALERTIFIED'))
+
+def test_alerts_stay_within_room():
+    rooms = create_rooms(2)
+    ids = add_users(rooms, 4)
+    for i in range(10):
+        rooms.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+    nose.tools.ok_(rooms.find_state(ids[1])['alert_state'] is True)
+    for id in ids[2:]:
+        res = rooms.user_action(id, create_user_action('CHECK_IF_ALERTED'))
+        nose.tools.ok_(res['response']['alerted'] is False)
+
+def test_stop_only_affects_room():
+    rooms = create_rooms(2)
+    ids = add_users(rooms, 4)
+    rooms.user_action(ids[0], create_user_action('START'))
+    rooms.user_action(ids[2], create_user_action('START'))
+    rooms.user_action(ids[0], create_user_action('STOP'))
+    nose.tools.ok_(rooms.find_state(ids[1])['alert_state'] is False)
+    nose.tools.ok_(rooms.find_state(ids[3])['alert_state'] is True)
+
+@raises(game_state.UserDoesntExistError)
+def test_clean_up():
+    rooms = create_rooms()
+    id = add_users(rooms, 1)[0]
+    rooms.clean_up()
+    rooms.remove_user(id)
+
+def test_stats_are_game_wide():
+    rooms = create_rooms(3)
+    ids = add_users(rooms, 7)
+    for id in ids:
+        rooms.user_action(id, create_user_action('BUTTON_PRESS'))
+    stats = rooms.get_stats()
+    nose.tools.ok_(stats['users'] == 7)
+    nose.tools.ok_(stats['alerted_users'] == rooms.count_alerted_users())
+    nose.tools.ok_(stats['presses'] == 7)
+    rooms.remove_user(ids[0])
+    nose.tools.ok_(rooms.get_stats()['users'] == 6)
+    nose.tools.ok_(rooms.get_stats()['alerted_users'] == rooms.count_alerted_users())
+    rooms.clean_up()
+    nose.tools.ok_(rooms.get_stats()['users'] == 0)
+    nose.tools.ok_(rooms.get_stats()['presses'] == 7)
+
+def test_rooms_keep_stats_of_their_own():
+    rooms = create_rooms(2)
+    ids = add_users(rooms, 4)
+    room_stats = [rooms.find_room(id)[1].stats for id in ids]
+    nose.tools.ok_(room_stats[0] is room_stats[1])
+    nose.tools.ok_(room_stats[0] is not room_stats[2])
+    for id in ids:
+        rooms.user_action(id, create_user_action('BUTTON_PRESS'))
+    nose.tools.ok_(room_stats[0].presses == 2)
+    nose.tools.ok_(room_stats[0].parent is rooms.stats)
+    rooms.remove_users(ids[:2])
+    nose.tools.ok_(len(rooms.rooms) == 1)
+    stats = rooms.get_stats()
+    nose.tools.ok_(stats['users'] == 2)
+    nose.tools.ok_(stats['presses'] == 4)
+    nose.tools.ok_(stats['alerted_users'] == rooms.count_alerted_users())
+
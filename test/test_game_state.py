@@ -9,7 +9,11 @@ from .helper import gen_id
 
 # Allow relative imports of the parent modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
-from game_state import GameState, InvalidUserActionError
+from jsonschema.exceptions import ValidationError
+from game_state import (
+    GameState, InvalidUserActionError, USER_ACTION_CODES, USER_ACTION_VALIDATOR,
+    is_valid_user_action
+)
 
 
 #### Helper functions ####
@@ -132,3 +136,59 @@ def test_create_user_check_if_alerted_response():
     nose.tools.ok_(result['user_id'] == user_id)
     nose.tools.ok_(result['user_action'] == user_action)
     nose.tools.ok_(result['response']['alerted'] == alerted)
+
+#### Differential tests against USER_ACTION_VALIDATOR ####
+SAMPLE_VALUES = [
+    None, True, False, 0, 1, -3, 2**70, 1.0, 1.5, '', 'stateful', 'START', 'BUTTON_PRESS',
+    'start', [], ['START'], {}, {'code': 'STOP'}
+]
+
+def mutations(value):
+    """
+    Yields value with, in turn, each nested key removed or replaced by each sample value
+    """
+    yield value
+    if isinstance(value, dict):
+        for key in value:
+            removed = dict(value)
+            del removed[key]
+            yield removed
+            for sample in SAMPLE_VALUES:
+                yield dict(value, **{key: sample})
+            for mutated in mutations(value[key]):
+                yield dict(value, **{key: mutated})
+        yield dict(value, data={})
+        yield dict(value, data=[])
+
+def check_same_validity(action):
+    expected = USER_ACTION_VALIDATOR.is_valid(action)
+    nose.tools.ok_(is_valid_user_action(action) == expected, action)
+    try:
+        GameState.validate_user_action(action)
+        nose.tools.ok_(expected, action)
+    except InvalidUserActionError:
+        nose.tools.ok_(not expected, action)
+
+def test_is_valid_user_action_matches_validator():
+    checked = 0
+    for code in USER_ACTION_CODES + ['HELLO']:
+        action = create_user_action(code)
+        action['action']['data'] = {'colour': 'red'}
+        for mutated in mutations(action):
+            check_same_validity(mutated)
+            checked += 1
+    nose.tools.ok_(checked > 500)
+
+def test_is_valid_user_action_matches_validator_non_objects():
+    for sample in SAMPLE_VALUES:
+        check_same_validity(sample)
+
+def test_validate_user_action_keeps_validation_error_cause():
+    action = create_user_action_check_if_alerted()
+    action['api']['version'] = True
+    try:
+        GameState.validate_user_action(action)
+    except InvalidUserActionError as error:
+        nose.tools.ok_(isinstance(error.__cause__, ValidationError))
+    else:
+        nose.tools.ok_(False)
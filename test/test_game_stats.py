@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import nose
+import os
+import random
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from clock import ManualClock
+from game_stats import GameStats
+from stateful_game_state import StatefulGameState
+
+
+#### Helper functions ####
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def scan_stats(gs):
+    """
+    Counts users and alerted users the slow way, visiting every user
+    """
+    states = [gs.find_state(record['user_id']) for record in list(gs.state.values())]
+    return len(states), sum(1 for state in states if state['alert_state'])
+
+
+#### Tests ####
+def test_initial_stats():
+    stats = GameStats(ManualClock()).to_dict()
+    nose.tools.ok_(stats == {
+        'users': 0,
+        'alerted_users': 0,
+        'presses': 0,
+        'presses_per_s': 0,
+        'last_press': None,
+        'seconds_since_last_press': None
+    })
+
+def test_presses_per_s_covers_window():
+    clock = ManualClock()
+    stats = GameStats(clock, rate_window_s=10)
+    for second in range(20):
+        for i in range(second):
+            stats.record_press()
+        clock.advance(1)
+    # Seconds 10 to 19 are in the window, the current second 20 has no presses yet
+    nose.tools.ok_(stats.presses_per_s() == sum(range(11, 20)) / 10)
+    clock.advance(100)
+    nose.tools.ok_(stats.presses_per_s() == 0)
+    nose.tools.ok_(stats.presses == sum(range(20)))
+
+def test_time_since_last_press():
+    clock = ManualClock(wall_offset_ns=0)
+    stats = GameStats(clock)
+    clock.advance(5)
+    stats.record_press()
+    clock.advance(2.5)
+    result = stats.to_dict()
+    nose.tools.ok_(result['last_press'] == datetime.fromtimestamp(5))
+    nose.tools.ok_(result['seconds_since_last_press'] == 2.5)
+
+def test_clear_users_keeps_presses():
+    stats = GameStats(ManualClock())
+    stats.add_users(3)
+    stats.add_alerted_users(2)
+    stats.record_press()
+    stats.clear_users()
+    nose.tools.ok_((stats.users, stats.alerted_users, stats.presses) == (0, 0, 1))
+
+def test_parent_totals_children():
+    clock = ManualClock()
+    parent = GameStats(clock)
+    children = [GameStats(parent=parent) for i in range(2)]
+    nose.tools.ok_(children[0].clock is clock)
+    children[0].add_users(3, 1)
+    children[1].add_users(2)
+    children[1].add_alerted_users(2)
+    children[0].record_press(-1)
+    clock.advance(1)
+    children[1].record_press()
+    nose.tools.ok_((parent.users, parent.alerted_users, parent.presses) == (5, 2, 2))
+    nose.tools.ok_((children[0].users, children[0].presses) == (3, 1))
+    nose.tools.ok_(parent.presses_per_s() == 2 / 10)
+    nose.tools.ok_(parent.last_press_ns == clock.now_ns())
+
+def test_game_stats_match_scans():
+    rng = random.Random(0)
+    gs = StatefulGameState({})
+    ids = []
+    for i in range(2000):
+        choice = rng.random()
+        if choice < 0.2 or len(ids) < 2:
+            ids.append(gen_id())
+            gs.add_user(ids[-1])
+        elif choice < 0.3:
+            gs.remove_user(ids.pop(rng.randrange(len(ids))))
+        else:
+            code = rng.choice(['BUTTON_PRESS', 'BUTTON_PRESS', 'START', 'STOP'])
+            gs.user_action(rng.choice(ids), create_user_action(code))
+        stats = gs.get_stats()
+        nose.tools.ok_((stats['users'], stats['alerted_users']) == scan_stats(gs))
+    gs.clean_up()
+    nose.tools.ok_(gs.get_stats()['users'] == 0)
+    nose.tools.ok_(gs.get_stats()['alerted_users'] == 0)
+
+def test_game_stats_count_presses():
+    gs = StatefulGameState({})
+    id = gen_id()
+    gs.add_user(id)
+    for i in range(3):
+        gs.user_action(id, create_user_action('BUTTON_PRESS'))
+    gs.user_action(id, create_user_action('CHECK_IF_ALERTED'))
+    stats = gs.get_stats()
+    nose.tools.ok_(stats['presses'] == 3)
+    nose.tools.ok_(stats['seconds_since_last_press'] >= 0)
+
+def test_button_press_updates_stats_once():
+    stats = GameStats()
+    gs = StatefulGameState({'stats': stats, 'alert_chance_of_multiply': 1})
+    ids = [gen_id() for i in range(4)]
+    for id in ids:
+        gs.add_user(id)
+    calls = []
+    lock = stats._lock
+    class CountingLock:
+        def __enter__(self):
+            calls.append(None)
+            return lock.__enter__()
+        def __exit__(self, *args):
+            return lock.__exit__(*args)
+    stats._lock = CountingLock()
+    gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+    nose.tools.ok_(len(calls) == 1)
+    nose.tools.ok_(stats.alerted_users == gs.count_alerted_users() == 2)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import nose
+import os
+import shutil
+import sys
+import tempfile
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import journaled_game_state
+
+
+#### Helper functions ####
+def create_config(directory, **config):
+    return dict({
+        'journal_path': os.path.join(directory, 'game_state.journal'),
+        'snapshot_path': os.path.join(directory, 'game_state.snapshot')
+    }, **config)
+
+def restart(gs):
+    gs.close()
+    return journaled_game_state.JournaledGameState(gs.config)
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def states(gs):
+    return {id: dict(gs.find_state(id)) for id in list(gs.state)}
+
+
+#### Tests ####
+def test_recover_from_journal():
+    directory = tempfile.mkdtemp()
+    try:
+        gs = journaled_game_state.JournaledGameState(create_config(directory))
+        ids = [gen_id() for i in range(6)]
+        for id in ids:
+            gs.add_user(id)
+        gs.remove_user(ids[5])
+        for i in range(5):
+            gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+        gs.user_action(ids[1], create_user_action('START'))
+        before = states(gs)
+        recovered = restart(gs)
+        nose.tools.ok_(states(recovered) == before)
+        nose.tools.ok_(
+            set(recovered.alert_index.alerted_ids())
+            == {id for id, state in before.items() if state['alert_state']}
+        )
+        stats = recovered.get_stats()
+        nose.tools.ok_(stats['users'] == 5)
+        nose.tools.ok_(stats['alerted_users'] == recovered.count_alerted_users())
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_recover_after_stop():
+    directory = tempfile.mkdtemp()
+    try:
+        gs = journaled_game_state.JournaledGameState(create_config(directory))
+        ids = [gen_id() for i in range(3)]
+        for id in ids:
+            gs.add_user(id)
+        gs.user_action(ids[0], create_user_action('START'))
+        gs.user_action(ids[0], create_user_action('STOP'))
+        recovered = restart(gs)
+        for id in ids:
+            nose.tools.ok_(not recovered.find_state(id)['alert_state'])
+        nose.tools.ok_(recovered.alert_index.num_alerted == 0)
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_snapshot_empties_journal():
+    directory = tempfile.mkdtemp()
+    try:
+        gs = journaled_game_state.JournaledGameState(
+            create_config(directory, snapshot_every=10)
+        )
+        ids = [gen_id() for i in range(25)]
+        for id in ids:
+            gs.add_user(id)
+        gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+        # Snapshots are written in the background
+        gs.snapshot_writer.wait()
+        nose.tools.ok_(gs.journal.num_records < 26)
+        nose.tools.ok_(os.path.exists(gs.config['snapshot_path']))
+        nose.tools.ok_(not os.path.exists(gs.journal.rotated_path))
+        before = states(gs)
+        recovered = restart(gs)
+        nose.tools.ok_(states(recovered) == before)
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_recover_rotated_journal_without_snapshot():
+    directory = tempfile.mkdtemp()
+    try:
+        gs = journaled_game_state.JournaledGameState(create_config(directory))
+        ids = [gen_id() for i in range(6)]
+        for id in ids[:3]:
+            gs.add_user(id)
+        # As if the process died after rotating twice, before writing either snapshot
+        gs.journal.rotate()
+        gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+        gs.journal.rotate()
+        for id in ids[3:]:
+            gs.add_user(id)
+        gs.remove_user(ids[1])
+        before = states(gs)
+        recovered = restart(gs)
+        nose.tools.ok_(states(recovered) == before)
+        recovered.snapshot()
+        nose.tools.ok_(not os.path.exists(recovered.journal.rotated_path))
+        again = restart(recovered)
+        nose.tools.ok_(states(again) == before)
+        again.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_replay_over_newer_snapshot():
+    directory = tempfile.mkdtemp()
+    try:
+        gs = journaled_game_state.JournaledGameState(create_config(directory))
+        ids = [gen_id() for i in range(4)]
+        for id in ids:
+            gs.add_user(id)
+        gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+        gs.user_action(ids[1], create_user_action('STOP'))
+        gs.user_action(ids[2], create_user_action('START'))
+        gs.remove_user(ids[3])
+        gs.journal.flush()
+        # As if the process died between writing a snapshot and emptying the journal
+        journal_path = gs.config['journal_path']
+        shutil.copy(journal_path, journal_path + '.old')
+        gs.snapshot()
+        before = states(gs)
+        gs.close()
+        shutil.copy(journal_path + '.old', journal_path)
+        recovered = journaled_game_state.JournaledGameState(gs.config)
+        nose.tools.ok_(states(recovered) == before)
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_torn_journal_record_dropped():
+    directory = tempfile.mkdtemp()
+    try:
+        gs = journaled_game_state.JournaledGameState(create_config(directory))
+        id = gen_id()
+        gs.add_user(id)
+        gs.close()
+        with open(gs.config['journal_path'], 'ab') as journal_file:
+            journal_file.write(b'\x01\x02\x03')
+        recovered = journaled_game_state.JournaledGameState(gs.config)
+        nose.tools.ok_(list(recovered.state) == [id])
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import nose
+import os
+import shutil
+import sys
+import tempfile
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import journaled_session
+import session
+
+
+#### Helper functions ####
+def create_config(directory, **config):
+    return dict({
+        'expiry_timeout_s': 100,
+        'expiry_sliding_window_s': 60,
+        'journal_path': os.path.join(directory, 'sessions.journal'),
+        'snapshot_path': os.path.join(directory, 'sessions.snapshot')
+    }, **config)
+
+def restart(sm):
+    sm.close()
+    return journaled_session.JournaledSessionManager(sm.config)
+
+
+#### Tests ####
+def test_recover_sessions():
+    directory = tempfile.mkdtemp()
+    try:
+        sm = journaled_session.JournaledSessionManager(create_config(directory))
+        live = [sm.new_session({}) for i in range(3)]
+        sm.extend_session(live[0])
+        destroyed = sm.new_session({})
+        sm.destroy_session(destroyed)
+        before = dict(sm.sessions)
+        recovered = restart(sm)
+        nose.tools.ok_(dict(recovered.sessions) == before)
+        for s in live:
+            recovered.authenticate_session(s)
+        nose.tools.assert_raises(
+            session.InvalidSessionError, recovered.authenticate_session, destroyed
+        )
+        nose.tools.ok_(set(recovered.check_expired_sessions()) == {destroyed['id']})
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_expired_sessions_stay_removed():
+    directory = tempfile.mkdtemp()
+    try:
+        sm = journaled_session.JournaledSessionManager(
+            create_config(directory, expiry_timeout_s=-1)
+        )
+        expired = sm.new_session({})
+        nose.tools.ok_(set(sm.check_expired_sessions()) == {expired['id']})
+        recovered = restart(sm)
+        nose.tools.ok_(len(recovered.sessions) == 0)
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_recover_from_snapshot():
+    directory = tempfile.mkdtemp()
+    try:
+        sm = journaled_session.JournaledSessionManager(
+            create_config(directory, snapshot_every=5)
+        )
+        for i in range(12):
+            sm.new_session({})
+        # Snapshots are written in the background
+        sm.snapshot_writer.wait()
+        nose.tools.ok_(sm.journal.num_records < 12)
+        nose.tools.ok_(os.path.exists(sm.config['snapshot_path']))
+        before = dict(sm.sessions)
+        recovered = restart(sm)
+        nose.tools.ok_(dict(recovered.sessions) == before)
+        recovered.close()
+    finally:
+        shutil.rmtree(directory)
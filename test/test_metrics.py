@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import nose
+import os
+import sys
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import metrics
+
+
+#### Tests ####
+def test_counter_render():
+    registry = metrics.Registry()
+    counter = registry.counter('actions_total', 'Actions', ('code',))
+    counter.inc(('START',))
+    counter.inc(('START',))
+    counter.inc(('STOP',), 3)
+    lines = registry.render().splitlines()
+    nose.tools.ok_(lines[:2] == ['# HELP actions_total Actions', '# TYPE actions_total counter'])
+    nose.tools.ok_('actions_total{code="START"} 2' in lines)
+    nose.tools.ok_('actions_total{code="STOP"} 3' in lines)
+
+def test_gauge_callback():
+    registry = metrics.Registry()
+    values = [5]
+    gauge = registry.gauge('users', 'Users', callback=lambda: values[0])
+    nose.tools.ok_('users 5' in registry.render().splitlines())
+    values[0] = 7
+    nose.tools.ok_(gauge.value() == 7)
+    nose.tools.ok_('users 7' in registry.render().splitlines())
+
+def test_gauge_not_implemented():
+    def count():
+        raise NotImplementedError()
+    registry = metrics.Registry()
+    registry.gauge('users', 'Users', callback=metrics.not_implemented_as_none(count))
+    nose.tools.ok_(registry.render().splitlines() == ['# HELP users Users', '# TYPE users gauge'])
+
+def test_histogram_buckets_cumulative():
+    registry = metrics.Registry()
+    histogram = registry.histogram('sweep', 'Sweep sizes', buckets=(1, 10))
+    for value in (0, 1, 5, 50):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    nose.tools.ok_('sweep_bucket{le="1"} 2' in lines)
+    nose.tools.ok_('sweep_bucket{le="10"} 3' in lines)
+    nose.tools.ok_('sweep_bucket{le="+Inf"} 4' in lines)
+    nose.tools.ok_('sweep_sum 56.0' in lines)
+    nose.tools.ok_('sweep_count 4' in lines)
+
+def test_histogram_time():
+    histogram = metrics.Histogram('latency', 'Latency', ('phase',))
+    with histogram.time(('game',)):
+        pass
+    nose.tools.ok_(histogram.count(('game',)) == 1)
+
+def test_label_escaping():
+    counter = metrics.Counter('c', 'C', ('path',))
+    counter.inc(('a"b\\c',))
+    nose.tools.ok_(counter.render()[-1] == 'c{path="a\\"b\\\\c"} 1')
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import nose
+from nose.tools import raises
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+try:
+    import mongomock
+    import mongo_game_state
+except ImportError:
+    raise nose.SkipTest('pymongo or mongomock is not installed')
+import game_state
+
+
+#### Helper functions ####
+def create_gs():
+    return mongo_game_state.MongoGameState({}, client=mongomock.MongoClient())
+
+def add_users(gs, count):
+    ids = [gen_id() for i in range(count)]
+    for id in ids:
+        gs.add_user(id)
+    return ids
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+
+#### Tests ####
+def test_add_find_remove_user():
+    gs = create_gs()
+    id = add_users(gs, 1)[0]
+    state = gs.find_state(id)
+    nose.tools.ok_(state == {'user_id': id, 'last_pressed': None, 'alert_state': None})
+    gs.remove_user(str(id))
+    nose.tools.assert_raises(game_state.UserDoesntExistError, gs.find_state, id)
+
+@raises(game_state.UserAlreadyExistsError)
+def test_add_user_twice():
+    gs = create_gs()
+    id = add_users(gs, 1)[0]
+    gs.add_user(str(id))
+
+@raises(game_state.UserDoesntExistError)
+def test_remove_unknown_user():
+    create_gs().remove_user(gen_id())
+
+def test_remove_users():
+    gs = create_gs()
+    ids = add_users(gs, 3)
+    gs.remove_users([ids[0], gen_id(), ids[2]])
+    nose.tools.ok_(gs.find_state(ids[1])['user_id'] == ids[1])
+    nose.tools.ok_(gs.collection.find_one({'_id': str(ids[0])}) is None)
+
+@raises(game_state.UserDoesntExistError)
+def test_user_action_unknown_user():
+    gs = create_gs()
+    add_users(gs, 1)
+    gs.user_action(gen_id(), create_user_action('BUTTON_PRESS'))
+
+@raises(game_state.InvalidUserActionError)
+def test_user_action_wrong_api_name():
+    gs = create_gs()
+    id = add_users(gs, 1)[0]
+    action = create_user_action('START')
+    action['api']['name'] = 'giraffe'
+    gs.user_action(id, action)
+
+def test_button_press_alerts_others():
+    gs = create_gs()
+    ids = add_users(gs, 6)
+    alerted = []
+    gs.add_alert_listener(alerted.append)
+    for i in range(10):
+        res = gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+        nose.tools.ok_(res['response']['success'] is True)
+    nose.tools.ok_(gs.find_state(ids[0])['alert_state'] is False)
+    nose.tools.ok_(gs.find_state(ids[0])['last_pressed'] is not None)
+    for id in ids[1:]:
+        nose.tools.ok_(gs.find_state(id)['alert_state'] is True)
+    nose.tools.ok_(set(alerted) == set(ids[1:]))
+
+def test_start_and_stop():
+    gs = create_gs()
+    ids = add_users(gs, 2)
+    res = gs.user_action(ids[0], create_user_action('START'))
+    nose.tools.ok_(res['response']['success'] is True)
+    res = gs.user_action(ids[1], create_user_action('CHECK_IF_ALERTED'))
+    nose.tools.ok_(res['response']['alerted'] is True)
+    gs.user_action(ids[0], create_user_action('STOP'))
+    res = gs.user_action(ids[1], create_user_action('CHECK_IF_ALERTED'))
+    nose.tools.ok_(res['response']['alerted'] is False)
+
+def test_start_no_other_users():
+    gs = create_gs()
+    id = add_users(gs, 1)[0]
+    res = gs.user_action(id, create_user_action('START'))
+    nose.tools.ok_(res['response']['success'] is False)
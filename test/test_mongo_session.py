@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timedelta, timezone
+import nose
+from nose.tools import raises
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+try:
+    import mongomock
+    import mongo_session
+except ImportError:
+    raise nose.SkipTest('pymongo or mongomock is not installed')
+from session import InvalidSessionError
+
+
+#### Helper functions ####
+def create_sm(expiry_timeout_s=100, expiry_sliding_window_s=60):
+    return mongo_session.MongoSessionManager({
+        'expiry_timeout_s': expiry_timeout_s,
+        'expiry_sliding_window_s': expiry_sliding_window_s
+    }, client=mongomock.MongoClient())
+
+def session_obj(session):
+    return {'id': str(session['id'])}
+
+def update_one_claim(sm, session, claimed):
+    sm.collection.update_one(
+        {'_id': str(session['id'])}, {'$set': {'reaper': str(gen_id()), 'claimed': claimed}}
+    )
+
+
+#### Tests ####
+def test_new_authenticate_extend():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.authenticate_session(session_obj(s))
+    extended = sm.extend_session(session_obj(s))
+    nose.tools.ok_(extended['id'] == s['id'])
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+
+@raises(InvalidSessionError)
+def test_touch_expired_session():
+    sm = create_sm(expiry_timeout_s=-1)
+    sm.touch_session(session_obj(sm.new_session({})))
+
+@raises(InvalidSessionError)
+def test_authenticate_unknown_session():
+    create_sm().authenticate_session({'id': str(gen_id())})
+
+@raises(InvalidSessionError)
+def test_extend_expired_session():
+    sm = create_sm(expiry_timeout_s=-1)
+    sm.extend_session(session_obj(sm.new_session({})))
+
+@raises(InvalidSessionError)
+def test_extend_unknown_session():
+    create_sm().extend_session({'id': str(gen_id())})
+
+@raises(InvalidSessionError)
+def test_destroy_unknown_session():
+    create_sm().destroy_session({'id': str(gen_id())})
+
+def test_check_expired_sessions():
+    sm = create_sm(expiry_timeout_s=-1)
+    sessions = [sm.new_session({}) for i in range(3)]
+    sm.config['expiry_timeout_s'] = 100
+    live = sm.new_session({})
+    expired = sm.check_expired_sessions()
+    nose.tools.ok_(set(expired.keys()) == {s['id'] for s in sessions})
+    for s in sessions:
+        nose.tools.ok_(expired[s['id']]['id'] == s['id'])
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+    sm.authenticate_session(session_obj(live))
+
+def test_check_expired_sessions_after_destroy():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.destroy_session(session_obj(s))
+    nose.tools.ok_(list(sm.check_expired_sessions().keys()) == [s['id']])
+
+def test_expiry_stored_as_utc():
+    sm = create_sm()
+    s = sm.new_session({})
+    stored = sm.collection.find_one({'_id': str(s['id'])})['expiry']
+    if stored.tzinfo is None:
+        stored = stored.replace(tzinfo=timezone.utc)
+    expected = datetime.now(timezone.utc) + timedelta(seconds=100)
+    nose.tools.ok_(abs((stored - expected).total_seconds()) < 5)
+    nose.tools.ok_(s['expiry'].tzinfo is not None)
+
+def test_tz_aware_client():
+    sm = mongo_session.MongoSessionManager({
+        'expiry_timeout_s': 100, 'expiry_sliding_window_s': 60
+    }, client=mongomock.MongoClient(tz_aware=True))
+    s = sm.new_session({})
+    sm.authenticate_session(session_obj(s))
+    sm.touch_session(session_obj(s))
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+
+def test_check_expired_sessions_skips_sessions_claimed_meanwhile():
+    sm = create_sm(expiry_timeout_s=-1)
+    claimed, expired = sm.new_session({}), sm.new_session({})
+    update_many = sm.collection.update_many
+    def claim_then_update_many(*args, **kwargs):
+        # Another process claims the session first
+        update_one_claim(sm, claimed, datetime.now(timezone.utc))
+        return update_many(*args, **kwargs)
+    sm.collection.update_many = claim_then_update_many
+    try:
+        nose.tools.ok_(list(sm.check_expired_sessions().keys()) == [expired['id']])
+    finally:
+        sm.collection.update_many = update_many
+    nose.tools.ok_(sm.collection.find_one({'_id': str(claimed['id'])}) is not None)
+
+def test_check_expired_sessions_reclaims_abandoned_claims():
+    sm = create_sm(expiry_timeout_s=-1)
+    s = sm.new_session({})
+    update_one_claim(sm, s, datetime.now(timezone.utc) - timedelta(seconds=120))
+    nose.tools.ok_(list(sm.check_expired_sessions().keys()) == [s['id']])
+    nose.tools.ok_(sm.count_sessions() == 0)
+
+def test_check_expired_sessions_uses_bulk_writes():
+    sm = create_sm(expiry_timeout_s=-1)
+    sessions = [sm.new_session({}) for i in range(5)]
+    sm.collection.find_one_and_delete = None
+    sm.collection.delete_one = None
+    nose.tools.ok_(set(sm.check_expired_sessions().keys()) == {s['id'] for s in sessions})
+    nose.tools.ok_(sm.count_sessions() == 0)
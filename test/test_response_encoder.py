@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import json
+import nose
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from game_state import GameState
+from response_encoder import ResponseEncoder, orjson
+
+
+#### Helper functions ####
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def encoders(**config):
+    libraries = ['json', 'orjson'] if orjson is not None else ['json']
+    return [ResponseEncoder(dict(config, json_library=library)) for library in libraries]
+
+def expected_json(response):
+    # As Flask's jsonify would send it
+    return json.loads(json.dumps(response, default=str))
+
+
+#### Tests ####
+def test_encode_uuid_and_datetime():
+    id = gen_id()
+    for encoder in encoders():
+        body = json.loads(encoder.encode({'id': id, 'expiry': datetime(2017, 1, 2, 3, 4, 5)}))
+        nose.tools.ok_(body == {'id': str(id), 'expiry': 'Mon, 02 Jan 2017 03:04:05 GMT'})
+
+def test_action_responses_match_generic_encoding():
+    id = gen_id()
+    responses = [
+        GameState.create_user_button_press_response(id, create_user_action('BUTTON_PRESS'), True),
+        GameState.create_user_check_if_alerted_response(
+            id, create_user_action('CHECK_IF_ALERTED'), False
+        ),
+        GameState.create_user_start_stop_response(id, create_user_action('START'), False),
+        GameState.create_user_start_stop_response(id, create_user_action('STOP'), True)
+    ]
+    for encoder in encoders():
+        for response in responses:
+            body = json.loads(encoder.encode_action_response(response))
+            nose.tools.ok_(body == expected_json(response))
+
+def test_action_response_without_user_action():
+    id = gen_id()
+    response = GameState.create_user_check_if_alerted_response(
+        id, create_user_action('CHECK_IF_ALERTED'), True
+    )
+    for encoder in encoders(echo_user_action=False):
+        body = json.loads(encoder.encode_action_response(response))
+        nose.tools.ok_(body == {'user_id': str(id), 'response': {'alerted': True}})
+
+def test_unknown_action_response_shape():
+    id = gen_id()
+    response = {'user_id': id, 'user_action': create_user_action('STOP'), 'response': {}}
+    for encoder in encoders(echo_user_action=False):
+        body = json.loads(encoder.encode_action_response(response))
+        nose.tools.ok_(body == {'user_id': str(id), 'response': {}})
+
+def test_encode_big_int():
+    user_action = create_user_action('BUTTON_PRESS')
+    user_action['action']['data'] = {'n': 2 ** 70}
+    response = GameState.create_user_button_press_response(gen_id(), user_action, True)
+    for encoder in encoders():
+        nose.tools.ok_(json.loads(encoder.encode(response)) == expected_json(response))
+        nose.tools.ok_(
+            json.loads(encoder.encode_action_response(response)) == expected_json(response)
+        )
+
+@nose.tools.raises(ValueError)
+def test_unknown_json_library():
+    ResponseEncoder({'json_library': 'giraffe'})
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import nose
+from nose.tools import raises
+import os
+import sys
+import tempfile
+import uuid
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+try:
+    import shared_memory_game_state
+except ImportError:
+    raise nose.SkipTest('multiprocessing.shared_memory needs Python 3.8+')
+import game_state
+
+
+#### Helper functions ####
+def create_config(capacity=64):
+    name = 'um_test_' + uuid.uuid4().hex[:12]
+    return {
+        'shm_name': name,
+        'shm_capacity': capacity,
+        'shm_lock_path': os.path.join(tempfile.gettempdir(), name + '.lock')
+    }
+
+def create_gs(capacity=64):
+    return shared_memory_game_state.SharedMemoryGameState(create_config(capacity))
+
+def destroy_gs(gs):
+    gs.close()
+    gs.unlink()
+    os.remove(gs.lock.path)
+    os.remove(gs.lock.path + '.attached')
+
+def add_users(gs, count):
+    ids = [gen_id() for i in range(count)]
+    for id in ids:
+        gs.add_user(id)
+    return ids
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+def press_repeatedly(config, ids, count):
+    gs = shared_memory_game_state.SharedMemoryGameState(config)
+    for i in range(count):
+        for id in ids:
+            gs.user_action(id, create_user_action('BUTTON_PRESS'))
+    gs.close()
+
+def churn_users(config, count):
+    gs = shared_memory_game_state.SharedMemoryGameState(config)
+    for i in range(count):
+        id = gen_id()
+        gs.add_user(id)
+        gs.user_action(id, create_user_action('BUTTON_PRESS'))
+        gs.remove_user(id)
+    gs.close()
+
+
+#### Tests ####
+def test_add_find_remove_user():
+    gs = create_gs()
+    try:
+        id = add_users(gs, 1)[0]
+        state = gs.find_state(id)
+        nose.tools.ok_(state == {'user_id': id, 'last_pressed': None, 'alert_state': None})
+        gs.remove_user(str(id))
+        nose.tools.assert_raises(game_state.UserDoesntExistError, gs.find_state, id)
+    finally:
+        destroy_gs(gs)
+
+def test_add_user_twice():
+    gs = create_gs()
+    try:
+        id = add_users(gs, 1)[0]
+        nose.tools.assert_raises(game_state.UserAlreadyExistsError, gs.add_user, str(id))
+    finally:
+        destroy_gs(gs)
+
+def test_add_user_when_full():
+    gs = create_gs(capacity=4)
+    try:
+        add_users(gs, 4)
+        nose.tools.assert_raises(shared_memory_game_state.GameFullError, gs.add_user, gen_id())
+    finally:
+        destroy_gs(gs)
+
+def test_slots_reused_after_removal():
+    gs = create_gs(capacity=4)
+    try:
+        for i in range(50):
+            ids = add_users(gs, 4)
+            gs.remove_users(ids + [gen_id()])
+        ids = add_users(gs, 4)
+        for id in ids:
+            nose.tools.ok_(gs.find_state(id)['user_id'] == id)
+    finally:
+        destroy_gs(gs)
+
+def test_button_press_alerts_others():
+    gs = create_gs()
+    try:
+        ids = add_users(gs, 6)
+        alerted = []
+        gs.add_alert_listener(alerted.append)
+        for i in range(10):
+            res = gs.user_action(ids[0], create_user_action('BUTTON_PRESS'))
+            nose.tools.ok_(res['response']['success'] is True)
+        nose.tools.ok_(gs.find_state(ids[0])['alert_state'] is False)
+        nose.tools.ok_(gs.find_state(ids[0])['last_pressed'] is not None)
+        for id in ids[1:]:
+            nose.tools.ok_(gs.find_state(id)['alert_state'] is True)
+        nose.tools.ok_(set(alerted) == set(ids[1:]))
+    finally:
+        destroy_gs(gs)
+
+def test_start_and_stop():
+    gs = create_gs()
+    try:
+        ids = add_users(gs, 2)
+        res = gs.user_action(ids[0], create_user_action('START'))
+        nose.tools.ok_(res['response']['success'] is True)
+        res = gs.user_action(ids[1], create_user_action('CHECK_IF_ALERTED'))
+        nose.tools.ok_(res['response']['alerted'] is True)
+        gs.user_action(ids[0], create_user_action('STOP'))
+        res = gs.user_action(ids[1], create_user_action('CHECK_IF_ALERTED'))
+        nose.tools.ok_(res['response']['alerted'] is False)
+        nose.tools.ok_(gs.find_state(ids[1])['alert_state'] is False)
+    finally:
+        destroy_gs(gs)
+
+def test_start_no_other_users():
+    gs = create_gs()
+    try:
+        id = add_users(gs, 1)[0]
+        res = gs.user_action(id, create_user_action('START'))
+        nose.tools.ok_(res['response']['success'] is False)
+    finally:
+        destroy_gs(gs)
+
+def test_second_instance_shares_state():
+    gs = create_gs()
+    try:
+        other = shared_memory_game_state.SharedMemoryGameState(gs.config)
+        ids = add_users(gs, 2)
+        other.user_action(ids[0], create_user_action('START'))
+        nose.tools.ok_(gs.find_state(ids[1])['alert_state'] is True)
+        other.close()
+    finally:
+        destroy_gs(gs)
+
+def test_processes_share_one_game():
+    gs = create_gs(capacity=256)
+    try:
+        ids = add_users(gs, 8)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=press_repeatedly, args=(gs.config, ids[i::2], 50))
+            for i in range(2)
+        ] + [
+            context.Process(target=churn_users, args=(gs.config, 100))
+            for i in range(2)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            nose.tools.ok_(process.exitcode == 0)
+        # Only the original users remain, each still findable through the shared table
+        nose.tools.ok_(gs._header[shared_memory_game_state.HEADER_NUM_USERS] == 8)
+        for id in ids:
+            nose.tools.ok_(gs.find_state(id)['last_pressed'] is not None)
+    finally:
+        destroy_gs(gs)
+
+def test_users_kept_while_another_process_is_attached():
+    gs = create_gs()
+    ids = add_users(gs, 3)
+    other = shared_memory_game_state.SharedMemoryGameState(gs.config)
+    nose.tools.ok_(other.count_users() == 3)
+    other.close()
+    destroy_gs(gs)
+
+def test_stale_users_cleared_on_first_attach():
+    config = create_config()
+    gs = shared_memory_game_state.SharedMemoryGameState(config)
+    add_users(gs, 3)
+    gs.close()
+    restarted = shared_memory_game_state.SharedMemoryGameState(config)
+    nose.tools.ok_(restarted.count_users() == 0)
+    add_users(restarted, 2)
+    restarted.close()
+    kept = shared_memory_game_state.SharedMemoryGameState(
+        dict(config, shm_clear_stale_users=False)
+    )
+    nose.tools.ok_(kept.count_users() == 2)
+    destroy_gs(kept)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import nose
+from nose.tools import raises
+import os
+import sys
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import session
+import signed_token_session
+
+
+#### Helper functions ####
+def create_sm(expiry_timeout_s=100, expiry_sliding_window_s=60, token_secret='secret',
+              token_track_expiries=True):
+    return signed_token_session.SignedTokenSessionManager({
+        'expiry_timeout_s': expiry_timeout_s,
+        'expiry_sliding_window_s': expiry_sliding_window_s,
+        'token_secret': token_secret,
+        'token_track_expiries': token_track_expiries
+    })
+
+def session_obj(session):
+    return {'id': str(session['id']), 'token': session['token']}
+
+def tamper(token):
+    payload, signature = token.split('.')
+    return payload + '.' + ('A' if signature[0] != 'A' else 'B') + signature[1:]
+
+
+#### Tests ####
+def test_new_session_authenticates():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.authenticate_session(session_obj(s))
+    sm.authenticate_session({'token': s['token']})
+
+def test_token_round_trip():
+    sm = create_sm()
+    s = sm.new_session({})
+    nose.tools.ok_(sm.parse_token(s['token']) == (s['id'], s['expiry']))
+
+def test_other_manager_with_same_secret_authenticates():
+    s = create_sm().new_session({})
+    create_sm().authenticate_session(session_obj(s))
+
+@raises(session.InvalidSessionError)
+def test_other_secret_rejected():
+    s = create_sm().new_session({})
+    create_sm(token_secret='other').authenticate_session(session_obj(s))
+
+@raises(session.InvalidSessionError)
+def test_tampered_token_rejected():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.authenticate_session({'token': tamper(s['token'])})
+
+@raises(session.InvalidSessionError)
+def test_malformed_token_rejected():
+    create_sm().authenticate_session({'token': 'not a token'})
+
+@raises(session.InvalidSessionError)
+def test_missing_token_rejected():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.authenticate_session({'id': str(s['id'])})
+
+@raises(session.InvalidSessionError)
+def test_mismatched_id_rejected():
+    sm = create_sm()
+    s = sm.new_session({})
+    other = sm.new_session({})
+    sm.authenticate_session({'id': str(other['id']), 'token': s['token']})
+
+@raises(session.InvalidSessionError)
+def test_expired_token_rejected():
+    sm = create_sm(expiry_timeout_s=-1)
+    sm.authenticate_session(session_obj(sm.new_session({})))
+
+def test_extend_session_resigns():
+    sm = create_sm(expiry_timeout_s=1, expiry_sliding_window_s=100)
+    s = sm.new_session({})
+    extended = sm.extend_session(session_obj(s))
+    nose.tools.ok_(extended['id'] == s['id'])
+    nose.tools.ok_(extended['expiry'] > s['expiry'])
+    nose.tools.ok_(extended['token'] != s['token'])
+    sm.authenticate_session(session_obj(extended))
+
+def test_touch_session_resigns():
+    sm = create_sm(expiry_timeout_s=1, expiry_sliding_window_s=100)
+    s = sm.new_session({})
+    touched = sm.touch_session(sm.resolve_session(session_obj(s)))
+    nose.tools.ok_(touched['expiry'] > s['expiry'])
+    sm.authenticate_session(session_obj(touched))
+
+@raises(session.InvalidSessionError)
+def test_destroyed_session_rejected():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.destroy_session(session_obj(s))
+    sm.authenticate_session(session_obj(s))
+
+@raises(session.InvalidSessionError)
+def test_destroyed_session_cannot_extend():
+    sm = create_sm()
+    s = sm.new_session({})
+    extended = sm.extend_session(session_obj(s))
+    sm.destroy_session(session_obj(s))
+    sm.extend_session(session_obj(extended))
+
+def test_revocations_are_forgotten():
+    sm = create_sm(expiry_timeout_s=-1, expiry_sliding_window_s=-1)
+    s = sm.new_session({})
+    sm.destroy_session(session_obj(s))
+    sm.check_expired_sessions()
+    nose.tools.ok_(sm._revoked == {})
+
+def test_check_expired_sessions():
+    sm = create_sm(expiry_timeout_s=-1)
+    expiring = sm.new_session({})
+    sm.config['expiry_timeout_s'] = 100
+    live = sm.new_session({})
+    destroyed = sm.new_session({})
+    sm.destroy_session(session_obj(destroyed))
+    expired = sm.check_expired_sessions()
+    nose.tools.ok_(set(expired.keys()) == {expiring['id'], destroyed['id']})
+    nose.tools.ok_(sm.count_sessions() == 1)
+    # Expired sessions are only reported once
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+
+def test_check_expired_sessions_after_extend():
+    sm = create_sm(expiry_timeout_s=-1, expiry_sliding_window_s=100)
+    s = sm.new_session({})
+    # Extending before the sweep supersedes the original expiry
+    sm._issue(s['id'], datetime(3000, 1, 1))
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+    nose.tools.ok_(sm.count_sessions() == 1)
+
+def test_expiry_heap_is_compacted():
+    sm = create_sm()
+    s = sm.new_session({})
+    for i in range(1000):
+        s = sm.extend_session(session_obj(s))
+    nose.tools.ok_(len(sm._expiry_heap) <= 2 * sm.count_sessions() + 65)
+
+def test_resolve_session_takes_id_from_token():
+    sm = create_sm()
+    s = sm.new_session({})
+    context = sm.resolve_session({'token': s['token']})
+    nose.tools.ok_(context.id == s['id'])
+    nose.tools.ok_(sm.extend_session(context)['id'] == s['id'])
+
+def test_resolved_session_signature_checked_once():
+    sm = create_sm()
+    s = sm.new_session({})
+    context = sm.resolve_session(session_obj(s))
+    signatures = []
+    sign = sm._sign
+    sm._sign = lambda payload: signatures.append(payload) or sign(payload)
+    extended = sm.touch_session(context)
+    # Only the new token is signed
+    nose.tools.ok_(len(signatures) == 1)
+    nose.tools.ok_(extended['id'] == s['id'])
+
+def test_expiries_not_tracked_by_default():
+    sm = create_sm(expiry_timeout_s=-1, token_track_expiries=False)
+    s = sm.new_session({})
+    sm.destroy_session(session_obj(sm.new_session({})))
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+    nose.tools.ok_(sm._expiries == {} and sm._expiry_heap == [])
+
+@raises(NotImplementedError)
+def test_count_sessions_needs_tracked_expiries():
+    create_sm(token_track_expiries=False).count_sessions()
+
+@raises(session.InvalidSessionError)
+def test_resolve_session_rejects_tampered_token():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.resolve_session({'token': tamper(s['token'])})
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import json
+import nose
+from nose.tools import raises
+import os
+import sys
+import tempfile
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+from game_rooms import GameRoomManager
+import simulation
+from stateful_game_state import StatefulGameState
+
+
+#### Helper functions ####
+def run_simulation(record=None, **config):
+    config = dict({'users': 50, 'duration_s': 60, 'mean_action_rate_per_s': 1}, **config)
+    return simulation.Simulation(config, record=record).run()
+
+def write_log(events):
+    log_file = tempfile.NamedTemporaryFile('w', suffix='.log', delete=False)
+    with log_file:
+        for event in events:
+            log_file.write(json.dumps(event) + '\n')
+    return log_file.name
+
+
+#### Tests ####
+def test_simulation_samples_population():
+    result = run_simulation()
+    nose.tools.ok_(result['virtual_s'] == 60)
+    nose.tools.ok_([sample['t_s'] for sample in result['samples']] == [
+        0, 10, 20, 30, 40, 50, 60
+    ])
+    for sample in result['samples']:
+        nose.tools.ok_(sample['users'] == 50)
+        nose.tools.ok_(sample['sessions'] == 50)
+        nose.tools.ok_(sample['state_bytes'] > 0)
+    nose.tools.ok_(result['totals']['logins'] == 50)
+    nose.tools.ok_(result['totals']['actions'] > 0)
+
+def test_simulation_alerts_are_dismissed():
+    result = run_simulation(game_config={'alert_chance_of_multiply': 0.5})
+    nose.tools.ok_(result['totals']['alerts'] > 0)
+    nose.tools.ok_(result['totals']['presses'] > 0)
+    nose.tools.ok_(result['alert_dismissal_s']['count'] > 0)
+    nose.tools.ok_(result['alert_dismissal_s']['p50'] >= 0)
+    nose.tools.ok_(sum(sample['alerts'] for sample in result['samples'])
+                   == result['totals']['alerts'])
+
+def test_simulation_times_operations():
+    result = run_simulation()
+    operations = result['operations']
+    nose.tools.ok_(len(operations['login']) == 50)
+    nose.tools.ok_(len(operations['touch_session']) == len(operations['CHECK_IF_ALERTED']))
+    nose.tools.ok_(len(operations['sweep']) > 0)
+
+def test_simulation_is_reproducible():
+    first = run_simulation(seed=3)
+    second = run_simulation(seed=3)
+    nose.tools.ok_(first['totals'] == second['totals'])
+    nose.tools.ok_(first['alert_dismissal_s'] == second['alert_dismissal_s'])
+
+def test_simulation_churn_expires_departed_players():
+    result = run_simulation(
+        duration_s=300, mean_session_s=30, login_rate_per_s=1, expiry_timeout_s=20,
+        expiry_sliding_window_s=20, sweep_interval_s=1
+    )
+    nose.tools.ok_(result['totals']['logins'] > 50)
+    nose.tools.ok_(result['totals']['expired_sessions'] > 0)
+    last_sample = result['samples'][-1]
+    nose.tools.ok_(last_sample['users'] == last_sample['sessions'])
+
+def test_simulation_relogs_in_players_whose_session_expired():
+    result = run_simulation(
+        duration_s=120, mean_action_rate_per_s=0.05, rate_distribution='constant',
+        expiry_timeout_s=5, expiry_sliding_window_s=5
+    )
+    nose.tools.ok_(result['totals']['relogins'] > 0)
+    nose.tools.ok_(result['totals']['logins'] == 50 + result['totals']['relogins'])
+
+def test_simulation_drives_given_game_state():
+    game_state = GameRoomManager({'alert_chance_of_multiply': 0.2, 'max_room_size': 10})
+    result = simulation.Simulation(
+        {'users': 30, 'duration_s': 20}, game_state=game_state
+    ).run()
+    nose.tools.ok_(game_state.count_users() == 30)
+    nose.tools.ok_(result['samples'][-1]['state_bytes'] > 0)
+
+@raises(ValueError)
+def test_simulation_unknown_rate_distribution():
+    simulation.Simulation({'rate_distribution': 'uniform'})
+
+def test_draw_rate():
+    rng = simulation.random.Random(0)
+    nose.tools.ok_(simulation.draw_rate(rng, 'constant', 2, 1) == 2)
+    rates = [simulation.draw_rate(rng, 'lognormal', 2, 0.5) for i in range(10000)]
+    nose.tools.ok_(abs(sum(rates) / len(rates) - 2) < 0.1)
+
+def test_replay_reproduces_recorded_game():
+    events = []
+    run_simulation(record=events.append, seed=5)
+    simulated = StatefulGameState({'alert_chance_of_multiply': 0.2})
+    result = simulation.replay(events, simulated)
+    nose.tools.ok_(result['errors'] == 0)
+    nose.tools.ok_(simulated.count_users() == 50)
+    nose.tools.ok_(sum(len(latencies) for latencies in result['operations'].values())
+                   == len(events))
+
+def test_replay_adds_unseen_users_and_counts_errors():
+    user_id = gen_id()
+    events = [
+        {'time': 0, 'event': 'user_action', 'user_id': str(user_id), 'code': 'BUTTON_PRESS'},
+        {'time': 1, 'event': 'remove_user', 'user_id': str(user_id)},
+        {'time': 2, 'event': 'remove_user', 'user_id': str(user_id)}
+    ]
+    game_state = StatefulGameState({'alert_chance_of_multiply': 0.2})
+    result = simulation.replay(events, game_state)
+    nose.tools.ok_(result['errors'] == 1)
+    nose.tools.ok_(len(result['operations']['BUTTON_PRESS']) == 1)
+    nose.tools.ok_(game_state.count_users() == 0)
+
+def test_read_action_log_skips_other_events():
+    user_id = str(gen_id())
+    path = write_log([
+        {'time': 0, 'event': 'add_user', 'user_id': user_id},
+        {'time': 1, 'source': 'game', 'event': 'alerted', 'user_id': user_id},
+        {'time': 2, 'event': 'user_action', 'user_id': user_id, 'code': 'START'}
+    ])
+    try:
+        events = list(simulation.read_action_log(path))
+    finally:
+        os.remove(path)
+    nose.tools.ok_([event['event'] for event in events] == ['add_user', 'user_action'])
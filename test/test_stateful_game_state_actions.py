@@ -146,3 +146,88 @@ def test_user_action_button_press():
     # Likelihood of False is 1/2^1000 per user
     for other_id in other_ids:
         nose.tools.ok_(gs.find_state(other_id)['alert_state'] is True)
+
+def test_user_action_start():
+    gs, id = create_gs_and_add_user({})
+    other_id = add_user(gs)
+    res = gs.user_action(id, create_user_action({'code': 'START'}))
+    nose.tools.ok_(res['response']['success'] is True)
+    nose.tools.ok_(gs.find_state(other_id)['alert_state'] is True)
+    nose.tools.ok_(not gs.find_state(id)['alert_state'])
+
+def test_user_action_start_no_other_users():
+    gs, id = create_gs_and_add_user({})
+    res = gs.user_action(id, create_user_action({'code': 'START'}))
+    nose.tools.ok_(res['response']['success'] is False)
+
+def test_user_action_stop():
+    gs, id = create_gs_and_add_user({})
+    other_ids = [add_user(gs) for i in range(10)]
+    for i in range(5):
+        gs.user_action(id, create_user_action({'code': 'BUTTON_PRESS'}))
+    res = gs.user_action(id, create_user_action({'code': 'STOP'}))
+    nose.tools.ok_(res['response']['success'] is True)
+    nose.tools.ok_(gs.alert_index.num_alerted == 0)
+    action = create_user_action({'code': 'CHECK_IF_ALERTED'})
+    for other_id in other_ids:
+        validate_check_if_alerted_response(
+            other_id, gs.user_action(other_id, action), action, False
+        )
+
+def test_user_action_button_press_tracks_alert_index():
+    gs, id = create_gs_and_add_user({})
+    other_ids = [add_user(gs) for i in range(20)]
+    for i in range(10):
+        gs.user_action(id, create_user_action({'code': 'BUTTON_PRESS'}))
+    alerted = {other_id for other_id in other_ids if gs.find_state(other_id)['alert_state']}
+    nose.tools.ok_(set(gs.alert_index.alerted_ids()) == alerted)
+    gs.remove_user(next(iter(alerted)))
+    nose.tools.ok_(gs.alert_index.num_alerted == len(alerted) - 1)
+
+def test_user_action_stop_does_not_touch_records():
+    gs, id = create_gs_and_add_user({})
+    other_id = add_user(gs)
+    gs.user_action(id, create_user_action({'code': 'START'}))
+    gs.user_action(id, create_user_action({'code': 'STOP'}))
+    # The stale alert is only cleared once the record is looked up
+    nose.tools.ok_(gs.state[other_id]['alert_state'] is True)
+    nose.tools.ok_(gs.find_state(other_id)['alert_state'] is False)
+    nose.tools.ok_(gs.find_state(other_id)['alert_epoch'] == gs.alert_epoch)
+
+def test_user_action_alert_after_stop():
+    gs, id = create_gs_and_add_user({})
+    other_id = add_user(gs)
+    action = create_user_action({'code': 'CHECK_IF_ALERTED'})
+    gs.user_action(id, create_user_action({'code': 'START'}))
+    gs.user_action(id, create_user_action({'code': 'STOP'}))
+    validate_check_if_alerted_response(other_id, gs.user_action(other_id, action), action, False)
+    gs.user_action(id, create_user_action({'code': 'BUTTON_PRESS'}))
+    validate_check_if_alerted_response(other_id, gs.user_action(other_id, action), action, True)
+
+def test_alert_listener():
+    gs, id = create_gs_and_add_user({})
+    other_id = add_user(gs)
+    alerted = []
+    gs.add_alert_listener(alerted.append)
+    gs.user_action(id, create_user_action({'code': 'START'}))
+    gs.user_action(other_id, create_user_action({'code': 'BUTTON_PRESS'}))
+    nose.tools.ok_(alerted == [other_id, id])
+    gs.remove_alert_listener(alerted.append)
+    gs.user_action(id, create_user_action({'code': 'BUTTON_PRESS'}))
+    nose.tools.ok_(len(alerted) == 2)
+
+def test_int_id_keys():
+    gs = stateful_game_state.StatefulGameState({'id_keys': 'int'})
+    id, other_id = add_user(gs), add_user(gs)
+    nose.tools.ok_(set(gs.state.keys()) == {id.int, other_id.int})
+    alerted = []
+    gs.add_alert_listener(alerted.append)
+    gs.user_action(str(id), create_user_action({'code': 'START'}))
+    nose.tools.ok_(alerted == [other_id])
+    action = create_user_action({'code': 'CHECK_IF_ALERTED'})
+    validate_check_if_alerted_response(other_id, gs.user_action(other_id, action), action, True)
+    gs.user_action(other_id, create_user_action({'code': 'BUTTON_PRESS'}))
+    nose.tools.ok_(alerted == [other_id, id])
+    nose.tools.ok_(gs.find_state(other_id)['alert_state'] is False)
+    gs.remove_user(str(id))
+    nose.tools.ok_(list(gs.state.keys()) == [other_id.int])
@@ -99,3 +99,12 @@ def test_find_state_no_match():
 def test_find_state_no_states():
     gs = create_gs({})
     nose.tools.ok_(gs.find_state(gen_id()))
+
+def test_remove_users():
+    gs = create_gs({})
+    ids = [gen_id() for i in range(3)]
+    for id in ids:
+        gs.add_user(id)
+    # Unknown users are skipped rather than raising
+    gs.remove_users([ids[0], gen_id(), str(ids[2])])
+    nose.tools.ok_(list(gs.state.keys()) == [ids[1]])
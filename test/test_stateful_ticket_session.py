@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+import nose
+from nose.tools import raises
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import clock
+import session
+import stateful_ticket_session
+
+
+#### Helper functions ####
+def create_sm(expiry_timeout_s=100, expiry_sliding_window_s=60, clock=None,
+              extend_coalesce_ms=0):
+    return stateful_ticket_session.StatefulTicketSessionManager({
+        'expiry_timeout_s': expiry_timeout_s,
+        'expiry_sliding_window_s': expiry_sliding_window_s,
+        'clock': clock,
+        'extend_coalesce_ms': extend_coalesce_ms
+    })
+
+def session_obj(session):
+    return {'id': str(session['id'])}
+
+
+#### Tests ####
+def test_check_expired_sessions_none_expired():
+    sm = create_sm()
+    sm.new_session({})
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+    nose.tools.ok_(len(sm.sessions) == 1)
+
+@raises(TypeError)
+def test_sessions_is_read_only():
+    sm = create_sm()
+    sm.sessions[gen_id()] = {}
+
+def test_check_expired_sessions_returns_expired():
+    sm = create_sm(expiry_timeout_s=-1)
+    sessions = [sm.new_session({}) for i in range(5)]
+    expired = sm.check_expired_sessions()
+    nose.tools.ok_(set(expired.keys()) == {s['id'] for s in sessions})
+    for s in sessions:
+        nose.tools.ok_(expired[s['id']] is s)
+    nose.tools.ok_(sm.sessions == {})
+    # Expired sessions are only reported once
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+
+def test_check_expired_sessions_only_expired():
+    sm = create_sm(expiry_timeout_s=-1)
+    expiring = sm.new_session({})
+    sm.config['expiry_timeout_s'] = 100
+    live = sm.new_session({})
+    expired = sm.check_expired_sessions()
+    nose.tools.ok_(list(expired.keys()) == [expiring['id']])
+    nose.tools.ok_(list(sm.sessions.keys()) == [live['id']])
+
+def test_check_expired_sessions_after_extend():
+    sm = create_sm(expiry_timeout_s=100, expiry_sliding_window_s=-1)
+    s = sm.new_session({})
+    # Sliding window in the past: the extension supersedes the original expiry
+    sm.extend_session(session_obj(s))
+    nose.tools.ok_(list(sm.check_expired_sessions().keys()) == [s['id']])
+
+def test_check_expired_sessions_extend_supersedes_earlier_expiry():
+    sm = create_sm(expiry_timeout_s=-1, expiry_sliding_window_s=100)
+    s = sm.new_session({})
+    # Force the session back to life past its original heap entry
+    sm._stripe(s['id']).expiries[s['id']] = sm.clock.now_ns() + 10**18
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+    nose.tools.ok_(s['id'] in sm.sessions)
+
+def test_check_expired_sessions_after_destroy():
+    sm = create_sm()
+    s = sm.new_session({})
+    sm.destroy_session(session_obj(s))
+    expired = sm.check_expired_sessions()
+    nose.tools.ok_(list(expired.keys()) == [s['id']])
+    nose.tools.ok_(sm.sessions == {})
+
+def test_expiry_heap_is_compacted():
+    sm = create_sm()
+    s = sm.new_session({})
+    for i in range(100):
+        sm.extend_session(session_obj(s))
+    stripe = sm._stripe(s['id'])
+    nose.tools.ok_(
+        len(stripe.expiry_heap) <= sm.EXPIRY_HEAP_COMPACTION_FACTOR * (len(stripe.sessions) + 1)
+    )
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+
+@raises(stateful_ticket_session.session.InvalidSessionError)
+def test_authenticate_expired_session():
+    sm = create_sm(expiry_timeout_s=-1)
+    s = sm.new_session({})
+    sm.authenticate_session(session_obj(s))
+
+@raises(stateful_ticket_session.session.InvalidSessionError)
+def test_authenticate_no_session_id():
+    create_sm().authenticate_session({})
+
+@raises(stateful_ticket_session.session.InvalidSessionError)
+def test_authenticate_invalid_session_id():
+    create_sm().authenticate_session({'id': 'baguette'})
+
+def test_extend_session_uuid_id():
+    sm = create_sm()
+    s = sm.new_session({})
+    nose.tools.ok_(sm.extend_session(s)['id'] == s['id'])
+
+def test_session_context():
+    sm = create_sm()
+    s = sm.new_session({})
+    context = sm.resolve_session(session_obj(s))
+    nose.tools.ok_(context.id == s['id'])
+    nose.tools.ok_(context['id'] == s['id'])
+    sm.authenticate_session(context)
+    nose.tools.ok_(sm.extend_session(context) is s)
+
+@raises(session.InvalidSessionError)
+def test_resolve_invalid_session_id():
+    create_sm().resolve_session({'id': 'giraffe'})
+
+def test_int_id_keys():
+    sm = stateful_ticket_session.StatefulTicketSessionManager({
+        'expiry_timeout_s': 100, 'expiry_sliding_window_s': 60, 'id_keys': 'int'
+    })
+    s = sm.new_session({})
+    nose.tools.ok_(list(sm.sessions.keys()) == [s['id'].int])
+    sm.authenticate_session(session_obj(s))
+    nose.tools.ok_(sm.extend_session(session_obj(s)) is s)
+    sm.destroy_session(session_obj(s))
+    nose.tools.ok_(sm.check_expired_sessions() == {s['id']: s})
+
+def test_manual_clock_expires_sessions():
+    manual_clock = clock.ManualClock()
+    sm = create_sm(expiry_timeout_s=100, expiry_sliding_window_s=60, clock=manual_clock)
+    s = sm.new_session({})
+    manual_clock.advance(100)
+    # Still valid at exactly its expiry
+    sm.authenticate_session(session_obj(s))
+    nose.tools.ok_(sm.check_expired_sessions() == {})
+    manual_clock.advance(0.001)
+    nose.tools.assert_raises(
+        session.InvalidSessionError, sm.authenticate_session, session_obj(s)
+    )
+    nose.tools.ok_(list(sm.check_expired_sessions().keys()) == [s['id']])
+
+def test_manual_clock_extend_slides_expiry():
+    manual_clock = clock.ManualClock()
+    sm = create_sm(expiry_timeout_s=100, expiry_sliding_window_s=60, clock=manual_clock)
+    s = sm.new_session({})
+    # Hours of simulated time, extending every 50 seconds
+    for i in range(500):
+        manual_clock.advance(50)
+        sm.extend_session(session_obj(s))
+        nose.tools.ok_(sm.check_expired_sessions() == {})
+    manual_clock.advance(61)
+    nose.tools.ok_(list(sm.check_expired_sessions().keys()) == [s['id']])
+
+def test_returned_expiry_is_wall_clock():
+    manual_clock = clock.ManualClock(wall_offset_ns=0)
+    sm = create_sm(expiry_timeout_s=100, clock=manual_clock)
+    s = sm.new_session({})
+    nose.tools.ok_(s['expiry'] == datetime.fromtimestamp(100))
+    manual_clock.advance(10)
+    nose.tools.ok_(sm.extend_session(session_obj(s))['expiry'] == datetime.fromtimestamp(70))
+
+def test_destroyed_session_expires_without_clock_moving():
+    sm = create_sm(clock=clock.ManualClock())
+    s = sm.new_session({})
+    sm.destroy_session(session_obj(s))
+    nose.tools.assert_raises(
+        session.InvalidSessionError, sm.authenticate_session, session_obj(s)
+    )
+    nose.tools.ok_(list(sm.check_expired_sessions().keys()) == [s['id']])
+
+def test_touch_session_extends():
+    manual_clock = clock.ManualClock()
+    sm = create_sm(expiry_timeout_s=10, expiry_sliding_window_s=60, clock=manual_clock)
+    s = sm.new_session({})
+    manual_clock.advance(5)
+    touched = sm.touch_session(sm.resolve_session(session_obj(s)))
+    nose.tools.ok_(touched['id'] == s['id'])
+    manual_clock.advance(60)
+    sm.authenticate_session(session_obj(s))
+
+def test_touch_session_expires_like_extend_session():
+    manual_clock = clock.ManualClock()
+    sm = create_sm(expiry_timeout_s=100, expiry_sliding_window_s=60, clock=manual_clock,
+                   extend_coalesce_ms=1000)
+    touched, extended = sm.new_session({}), sm.new_session({})
+    manual_clock.advance(1)
+    # Both move a fresh session's expiry from 100s to 61s
+    touched = sm.touch_session(session_obj(touched))
+    extended = sm.extend_session(session_obj(extended))
+    nose.tools.ok_(touched['expiry'] == extended['expiry'])
+    nose.tools.ok_(sm._stripe(touched['id']).expiries[touched['id']] == 61 * clock.SECOND_NS)
+
+@raises(session.InvalidSessionError)
+def test_touch_expired_session():
+    sm = create_sm(expiry_timeout_s=-1)
+    sm.touch_session(session_obj(sm.new_session({})))
+
+@raises(session.InvalidSessionError)
+def test_touch_unknown_session():
+    create_sm().touch_session({'id': str(gen_id())})
+
+def test_touch_session_coalesces_extensions():
+    manual_clock = clock.ManualClock()
+    sm = create_sm(expiry_timeout_s=60, expiry_sliding_window_s=60, clock=manual_clock,
+                   extend_coalesce_ms=1000)
+    s = sm.new_session({})
+    expiry = s['expiry']
+    stripe = sm._stripe(s['id'])
+    heap_size = len(stripe.expiry_heap)
+    manual_clock.advance(0.5)
+    nose.tools.ok_(sm.touch_session(session_obj(s))['expiry'] == expiry)
+    nose.tools.ok_(len(stripe.expiry_heap) == heap_size)
+    manual_clock.advance(0.6)
+    nose.tools.ok_(sm.touch_session(session_obj(s))['expiry'] > expiry)
+    nose.tools.ok_(len(stripe.expiry_heap) == heap_size + 1)
+
+def test_default_touch_session_authenticates_then_extends():
+    calls = []
+    class RecordingSessionManager(session.SessionManager):
+        def authenticate_session(self, session_details):
+            calls.append('authenticate')
+        def extend_session(self, session_details):
+            calls.append('extend')
+            return session_details
+    RecordingSessionManager({}).touch_session({})
+    nose.tools.ok_(calls == ['authenticate', 'extend'])
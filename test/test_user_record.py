@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import nose
+from nose.tools import raises
+import os
+import sys
+
+from .helper import gen_id
+
+# Allow relative imports of the parent modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+import game_state
+import stateful_game_state
+from user_record import UserRecord, create_dict_user_record, get_user_record_factory
+
+
+#### Helper functions ####
+def create_gs():
+    return stateful_game_state.StatefulGameState({'user_records': 'slots'})
+
+def create_user_action(code):
+    return {
+        'api': {
+            'name': 'stateful',
+            'version': 1
+        },
+        'action': {'code': code}
+    }
+
+
+#### Tests ####
+def test_record_matches_dict_record():
+    id = gen_id()
+    record = UserRecord(id, 3)
+    dict_record = create_dict_user_record(id, 3)
+    for key in dict_record.keys():
+        nose.tools.ok_(record[key] == dict_record[key])
+    nose.tools.ok_(set(record.keys()) == set(dict_record.keys()))
+
+def test_record_item_assignment():
+    record = UserRecord(gen_id(), 0)
+    record['alert_state'] = True
+    nose.tools.ok_(record.alert_state is True)
+    nose.tools.ok_(record['alert_state'] is True)
+
+@raises(KeyError)
+def test_record_unknown_key():
+    UserRecord(gen_id(), 0)['colour']
+
+@raises(KeyError)
+def test_record_attribute_is_not_a_key():
+    UserRecord(gen_id(), 0)['keys']
+
+@raises(KeyError)
+def test_record_unknown_key_assignment():
+    UserRecord(gen_id(), 0)['colour'] = 'blue'
+
+@raises(ValueError)
+def test_unknown_record_type():
+    get_user_record_factory('tuple')
+
+def test_slots_game_add_find_remove():
+    gs = create_gs()
+    id = gen_id()
+    gs.add_user(str(id))
+    nose.tools.ok_(isinstance(gs.find_state(id), UserRecord))
+    nose.tools.ok_(gs.find_state(id)['user_id'] == id)
+    gs.remove_user(id)
+    nose.tools.ok_(gs.state == {})
+
+@raises(game_state.UserDoesntExistError)
+def test_slots_game_find_removed_user():
+    gs = create_gs()
+    id = gen_id()
+    gs.add_user(id)
+    gs.remove_user(id)
+    gs.find_state(id)
+
+def test_slots_game_actions():
+    gs = create_gs()
+    id = gen_id()
+    other_id = gen_id()
+    gs.add_user(id)
+    gs.add_user(other_id)
+    gs.user_action(id, create_user_action('BUTTON_PRESS'))
+    nose.tools.ok_(gs.find_state(other_id)['alert_state'] is True)
+    nose.tools.ok_(gs.find_state(id)['last_pressed'] is not None)
+    gs.user_action(id, create_user_action('STOP'))
+    res = gs.user_action(other_id, create_user_action('CHECK_IF_ALERTED'))
+    nose.tools.ok_(res['response']['alerted'] is False)
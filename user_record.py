@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+class UserRecord:
+    """
+    Compact per-user game state record. Holds the same fields as the dictionary records
+    used by StatefulGameState, and supports the same item access, but stores them in
+    __slots__ to avoid a per-user dictionary.
+    """
+    __slots__ = ('user_id', 'last_pressed', 'alert_state', 'alert_epoch')
+
+    def __init__(self, user_id, alert_epoch):
+        self.user_id = user_id
+        self.last_pressed = None
+        self.alert_state = None
+        self.alert_epoch = alert_epoch
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def keys(self):
+        return self.__slots__
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__,
+            ', '.join('{}={!r}'.format(key, self[key]) for key in self.__slots__)
+        )
+
+
+def create_dict_user_record(user_id, alert_epoch):
+    """
+    Creates a dictionary user record
+
+    :param UUID user_id:
+    :param int alert_epoch: alert epoch the record is created in
+
+    :return dict:
+    """
+    return {
+        'user_id': user_id,
+        'last_pressed': None,
+        'alert_state': None,
+        'alert_epoch': alert_epoch
+    }
+
+
+# Selectable through the 'user_records' game config item
+USER_RECORD_FACTORIES = {
+    'dict': create_dict_user_record,
+    'slots': UserRecord
+}
+
+
+def get_user_record_factory(name):
+    """
+    :param string name: key of USER_RECORD_FACTORIES
+
+    :return callable: (user_id, alert_epoch) -> user record
+
+    :raises ValueError: If name is not a known record type
+    """
+    try:
+        return USER_RECORD_FACTORIES[name]
+    except KeyError as error:
+        raise ValueError('unknown user record type {}'.format(name)) from error